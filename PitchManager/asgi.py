@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PitchManager.settings')
+# settings.SERVING_ASGI: tắt kết nối DB lâu dài (CONN_MAX_AGE) khi chạy ASGI
+os.environ['PITCHMANAGER_ASGI'] = '1'
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Import sau khi Django đã setup (get_asgi_application gọi django.setup())
+from main import slot_events  # noqa: E402
+
+# SSE khung giờ phục vụ thẳng trên event loop, xem main/slot_events.py
+application = slot_events.route(django_application)
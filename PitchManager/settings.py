@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.RequestMetricsMiddleware',
+    'main.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,7 +61,8 @@ ROOT_URLCONF = 'PitchManager.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates + đo thời gian render cho RequestMetricsMiddleware
+        'BACKEND': 'main.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -79,6 +82,34 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'PitchManager.wsgi.application'
 
+# Request metrics (main.middleware.RequestMetricsMiddleware)
+# Ngân sách theo url name; request vượt ngân sách sẽ được log cảnh báo.
+VIEW_BUDGETS = {
+    'default': {'queries': 20, 'ms': 500},
+    'pitch_list': {'queries': 8, 'ms': 300},
+    'facility_detail': {'queries': 6, 'ms': 200},
+    'book_pitch': {'queries': 10, 'ms': 300},
+    'user_booking_create': {'queries': 15, 'ms': 400},
+    'ajax_time_slots': {'queries': 4, 'ms': 100},
+    'ajax_check_voucher': {'queries': 4, 'ms': 100},
+    'admin_booking_list': {'queries': 8, 'ms': 400},
+}
+# Chỉ cho phép scrape /dashboard/metrics từ các IP này
+METRICS_ALLOWED_IPS = config(
+    'METRICS_ALLOWED_IPS',
+    default='127.0.0.1,::1',
+    cast=lambda value: [ip.strip() for ip in value.split(',') if ip.strip()])
+# Và phải gửi "Authorization: Bearer <METRICS_TOKEN>": sau reverse proxy cùng
+# máy mọi request đều tới từ 127.0.0.1, lọc IP không đủ. Để trống = tắt
+# endpoint (404).
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Khi admin xác nhận một đơn, tự từ chối các đơn đang chờ trùng giờ
+# (main/booking_actions.py). Mặc định tắt để không đổi cách duyệt đơn
+# của bản đang chạy.
+BOOKING_AUTO_REJECT_CONFLICTS = config(
+    'BOOKING_AUTO_REJECT_CONFLICTS', default=False, cast=bool)
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
@@ -92,6 +123,74 @@ DATABASES = {
     }
 }
 
+# DB_PROFILE=production: SQLite cho nhiều worker ghi đồng thời.
+# - WAL: đọc không chặn ghi; synchronous=NORMAL đủ an toàn khi đã bật WAL
+# - busy_timeout: chờ lock thay vì lỗi "database is locked" ngay
+# - BEGIN IMMEDIATE: transaction ghi lấy write lock từ đầu, tránh lỗi khi
+#   nâng từ read lock lên write lock giữa chừng (busy_timeout không cứu được)
+# - CONN_MAX_AGE: giữ kết nối giữa các request, PRAGMA chỉ chạy khi mở mới.
+#   Chỉ dưới WSGI: ASGIHandler chạy phần sync của mỗi request trên một
+#   thread mới, kết nối giữ lại không bao giờ được dùng lại (rò một kết
+#   nối mỗi request), nên chạy qua asgi.py luôn là 0.
+SERVING_ASGI = config('PITCHMANAGER_ASGI', default=False, cast=bool)
+DB_PROFILE = config('DB_PROFILE', default='default')
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 0 if SERVING_ASGI else config('DB_CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            # Chạy mỗi lần mở kết nối mới
+            'init_command': ';'.join([
+                'PRAGMA journal_mode=WAL',
+                'PRAGMA synchronous=NORMAL',
+                f"PRAGMA busy_timeout={config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int)}",
+                f"PRAGMA mmap_size={config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)}",
+                # Số âm = KiB: -65536 ~ 64MB page cache mỗi kết nối
+                f"PRAGMA cache_size={config('SQLITE_CACHE_SIZE', default=-65536, cast=int)}",
+                'PRAGMA temp_store=MEMORY',
+            ]),
+        },
+    })
+
+# Read replica (main/db_router.py): DB_REPLICA_NAME trỏ tới bản sao của
+# DB chính (vd. file SQLite được đồng bộ bằng litestream/rsync). Chỉ các
+# view gắn @replica_reads đọc từ đây; sau khi user ghi, các request của
+# user đó đọc primary trong DATABASE_REPLICA_PIN_SECONDS giây.
+DATABASE_REPLICA_ALIAS = 'replica'
+DATABASE_REPLICA_PIN_SECONDS = config('DB_REPLICA_PIN_SECONDS', default=10, cast=int)
+DATABASE_REPLICA_PIN_COOKIE = 'db_primary'
+DB_REPLICA_NAME = config('DB_REPLICA_NAME', default='')
+if DB_REPLICA_NAME:
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA_NAME,
+        # Test: replica dùng chung DB test với default
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['main.db_router.ReplicaRouter']
+
+# Danh sách sân, chi tiết cơ sở, AJAX khung giờ / voucher dùng bản async
+# (main/async_views.py). Mặc định tắt, kể cả dưới ASGI: benchmark
+# (manage.py benchmark --asgi) chưa thấy lợi về throughput hay số thread.
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+
+# Cache dùng chung (dữ liệu tham chiếu, khung giờ trống, voucher). Mặc định
+# locmem; nhiều worker thì dùng file cache để cùng thấy version key:
+#   CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   CACHE_LOCATION=/var/tmp/pitchmanager_cache
+# Số worker (gunicorn / uvicorn cùng đọc WEB_CONCURRENCY): > 1 mà cache vẫn
+# nằm trong process thì check main.W001 cảnh báo (main/checks.py)
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='pitchmanager'),
+    }
+}
+
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -5,10 +5,10 @@ from django.contrib import messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (
     User, Facility, PitchType, TimeSlot, Pitch, PitchTimeSlot, Voucher,
-    Booking, Review, Comment, Favorite, BookingStatus
+    Booking, Review, Comment, Favorite, BookingStatus, EmailOutbox, ImageJob
 )
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from . import constants
+from . import booking_actions, constants
 
 
 class CustomUserAdmin(BaseUserAdmin):
@@ -81,6 +81,7 @@ class TimeSlotAdmin(admin.ModelAdmin):
         'name',
         'start_time',
         'end_time',
+        'duration_hours',
         'is_active',
         'created_at')
     search_fields = ('name',)
@@ -170,8 +171,9 @@ class PitchTimeSlotAdmin(admin.ModelAdmin):
     list_per_page = constants.ADMIN_LIST_PER_PAGE
 
     def get_price_per_slot(self, obj):
-        return f"{obj.get_price():,.0f}"
+        return f"{obj.price:,.0f}"
     get_price_per_slot.short_description = "Giá/Slot"
+    get_price_per_slot.admin_order_field = 'price'
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
@@ -217,6 +219,23 @@ class BookingAdmin(admin.ModelAdmin):
     readonly_fields = constants.BOOKING_READONLY_FIELDS
     raw_id_fields = ('user', 'pitch', 'voucher')
     list_per_page = constants.ADMIN_LIST_PER_PAGE
+    actions = ('approve_selected', 'reject_selected')
+
+    @admin.action(description="Duyệt các đơn đang chờ đã chọn")
+    def approve_selected(self, request, queryset):
+        changed, conflicts = booking_actions.bulk_update_status(queryset, 'approve')
+        self.message_user(
+            request, constants.MSG_BOOKING_BULK_APPROVED.format(count=len(changed)))
+        if conflicts:
+            self.message_user(
+                request,
+                constants.MSG_BOOKING_CONFLICTS_REJECTED.format(count=len(conflicts)))
+
+    @admin.action(description="Từ chối các đơn đang chờ đã chọn")
+    def reject_selected(self, request, queryset):
+        changed, _ = booking_actions.bulk_update_status(queryset, 'reject')
+        self.message_user(
+            request, constants.MSG_BOOKING_BULK_REJECTED.format(count=len(changed)))
 
     def time_slot_display(self, obj):
         return obj.time_slot.time_slot.name if obj.time_slot and obj.time_slot.time_slot else "N/A"
@@ -282,6 +301,36 @@ class FavoriteAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('user', 'pitch')
 
 
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'subject',
+        'status',
+        'attempts',
+        'next_attempt_at',
+        'sent_at',
+        'created_at')
+    search_fields = ('subject',)
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_at', 'sent_at', 'attempts', 'last_error')
+    list_per_page = constants.ADMIN_LIST_PER_PAGE
+
+
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'pitch',
+        'original',
+        'status',
+        'attempts',
+        'next_attempt_at',
+        'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_at', 'finished_at', 'attempts', 'last_error')
+    raw_id_fields = ('pitch',)
+    list_per_page = constants.ADMIN_LIST_PER_PAGE
+
+
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Facility, FacilityAdmin)
 admin.site.register(PitchType, PitchTypeAdmin)
@@ -293,3 +342,5 @@ admin.site.register(Booking, BookingAdmin)
 admin.site.register(Review, ReviewAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
+admin.site.register(ImageJob, ImageJobAdmin)
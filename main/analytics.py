@@ -0,0 +1,274 @@
+"""
+Rollup booking theo ngày cho dashboard doanh thu / công suất.
+
+Mỗi booking đóng góp vào đúng 1 dòng BookingDailyStat (khung giờ của sân,
+ngày). Khi booking được lưu, lấy hiệu "đóng góp mới - đóng góp cũ" và
+cộng vào rollup bằng UPDATE ... SET x = x + delta, nên dashboard chỉ đọc
+các dòng rollup trong khoảng ngày, không quét bảng Booking.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import (
+    Booking,
+    BookingDailyStat,
+    BookingStatus,
+    PitchTimeSlot,
+)
+
+STATUS_COUNT_FIELDS = {
+    BookingStatus.PENDING: 'pending_count',
+    BookingStatus.CONFIRMED: 'confirmed_count',
+    BookingStatus.CANCELLED: 'cancelled_count',
+    BookingStatus.REJECTED: 'rejected_count',
+}
+SUM_FIELDS = (
+    'pending_count', 'confirmed_count', 'cancelled_count', 'rejected_count',
+    'revenue', 'voucher_discount', 'voucher_count',
+)
+ZERO = Decimal('0')
+
+
+def _contribution(state, slot_price):
+    """Đóng góp của một trạng thái booking vào dòng rollup của nó"""
+    values = Counter()
+    if not state or not state.get('time_slot_id') or not state.get('booking_date'):
+        return values
+    status = state['status']
+    if status in STATUS_COUNT_FIELDS:
+        values[STATUS_COUNT_FIELDS[status]] += 1
+    if status == BookingStatus.CONFIRMED:
+        final_price = state['final_price'] or ZERO
+        values['revenue'] += final_price
+        if state['voucher_id']:
+            values['voucher_count'] += 1
+            values['voucher_discount'] += max(slot_price - final_price, ZERO)
+    return values
+
+
+def _key(state):
+    if not state or not state.get('time_slot_id') or not state.get('booking_date'):
+        return None
+    return state['time_slot_id'], state['booking_date']
+
+
+def _apply(pitch_time_slot, booking_date, deltas, create=True):
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    rows = BookingDailyStat.objects.filter(
+        pitch_time_slot=pitch_time_slot, date=booking_date)
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    if rows.update(**updates) or not create:
+        return
+    try:
+        with transaction.atomic():
+            BookingDailyStat.objects.create(
+                pitch_time_slot=pitch_time_slot,
+                pitch_id=pitch_time_slot.pitch_id,
+                facility_id=pitch_time_slot.pitch.facility_id,
+                time_slot_id=pitch_time_slot.time_slot_id,
+                date=booking_date,
+                **deltas)
+    except IntegrityError:
+        # Request khác vừa tạo dòng này
+        rows.update(**updates)
+
+
+def _pitch_time_slot(booking, time_slot_id):
+    if booking.time_slot_id == time_slot_id:
+        return booking.time_slot
+    return PitchTimeSlot.objects.select_related('pitch').get(pk=time_slot_id)
+
+
+def record_booking_change(booking, old_state=None, deleted=False):
+    """
+    Cập nhật rollup theo thay đổi của booking.
+
+    Args:
+        old_state: Booking.rollup_state() trước khi lưu (None nếu tạo mới)
+        deleted: booking vừa bị xoá -> chỉ trừ đóng góp cũ
+    """
+    new_state = None if deleted else booking.rollup_state()
+    if old_state == new_state:
+        return
+
+    old_key, new_key = _key(old_state), _key(new_state)
+    slots = {}
+    for key in filter(None, (old_key, new_key)):
+        if key[0] not in slots:
+            slots[key[0]] = _pitch_time_slot(booking, key[0])
+
+    old_values = _contribution(
+        old_state, slots[old_key[0]].price) if old_key else Counter()
+    new_values = _contribution(
+        new_state, slots[new_key[0]].price) if new_key else Counter()
+
+    if old_key == new_key:
+        deltas = {field: new_values[field] - old_values[field]
+                  for field in set(old_values) | set(new_values)}
+        _apply(slots[new_key[0]], new_key[1], deltas)
+        return
+    if old_key:
+        # Không tạo dòng mới chỉ để trừ (vd. đang xoá cascade cả khung giờ)
+        _apply(slots[old_key[0]], old_key[1],
+               {field: -value for field, value in old_values.items()}, create=False)
+    if new_key:
+        _apply(slots[new_key[0]], new_key[1], dict(new_values))
+
+
+def record_bulk_status_change(bookings, old_status):
+    """
+    Cập nhật rollup cho các booking vừa đổi trạng thái bằng một câu
+    QuerySet.update() (không qua save() nên không có signal).
+
+    Args:
+        bookings: booking đã load lại sau update, cần select_related
+            'time_slot__pitch'
+        old_status: trạng thái chung của các booking trước khi update
+    """
+    grouped = defaultdict(Counter)
+    slots = {}
+    for booking in bookings:
+        new_state = booking.rollup_state()
+        key = _key(new_state)
+        if key is None:
+            continue
+        slot = slots.setdefault(key[0], booking.time_slot)
+        grouped[key].update(_contribution(new_state, slot.price))
+        grouped[key].subtract(_contribution(dict(new_state, status=old_status), slot.price))
+    for (slot_id, booking_date), deltas in grouped.items():
+        _apply(slots[slot_id], booking_date, dict(deltas))
+
+
+def rebuild(date_from=None, date_to=None, batch_size=1000):
+    """
+    Dựng lại rollup từ bảng Booking (toàn bộ hoặc trong khoảng ngày).
+
+    Returns:
+        int: số dòng rollup đã tạo
+    """
+    bookings = Booking.objects.filter(time_slot__isnull=False)
+    stats = BookingDailyStat.objects.all()
+    if date_from:
+        bookings = bookings.filter(booking_date__gte=date_from)
+        stats = stats.filter(date__gte=date_from)
+    if date_to:
+        bookings = bookings.filter(booking_date__lte=date_to)
+        stats = stats.filter(date__lte=date_to)
+
+    confirmed = Q(status=BookingStatus.CONFIRMED)
+    confirmed_voucher = confirmed & Q(voucher__isnull=False)
+    money = DecimalField(max_digits=14, decimal_places=2)
+    rows = bookings.order_by().values(
+        'time_slot', 'time_slot__pitch', 'time_slot__pitch__facility',
+        'time_slot__time_slot', 'booking_date',
+    ).annotate(
+        pending=Count('id', filter=Q(status=BookingStatus.PENDING)),
+        confirmed=Count('id', filter=confirmed),
+        cancelled=Count('id', filter=Q(status=BookingStatus.CANCELLED)),
+        rejected=Count('id', filter=Q(status=BookingStatus.REJECTED)),
+        revenue_sum=Coalesce(Sum('final_price', filter=confirmed), ZERO, output_field=money),
+        discount_sum=Coalesce(Sum(
+            ExpressionWrapper(F('time_slot__price') - F('final_price'), output_field=money),
+            filter=confirmed_voucher), ZERO, output_field=money),
+        vouchers=Count('id', filter=confirmed_voucher),
+    )
+
+    created = 0
+    with transaction.atomic():
+        stats.delete()
+        batch = []
+        for row in rows.iterator():
+            batch.append(BookingDailyStat(
+                pitch_time_slot_id=row['time_slot'],
+                pitch_id=row['time_slot__pitch'],
+                facility_id=row['time_slot__pitch__facility'],
+                time_slot_id=row['time_slot__time_slot'],
+                date=row['booking_date'],
+                pending_count=row['pending'],
+                confirmed_count=row['confirmed'],
+                cancelled_count=row['cancelled'],
+                rejected_count=row['rejected'],
+                revenue=row['revenue_sum'],
+                voucher_discount=max(row['discount_sum'], ZERO),
+                voucher_count=row['vouchers'],
+            ))
+            if len(batch) >= batch_size:
+                created += len(BookingDailyStat.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            created += len(BookingDailyStat.objects.bulk_create(batch))
+    return created
+
+
+# ===== Dashboard =====
+
+def _sums(queryset):
+    totals = queryset.aggregate(**{field: Sum(field) for field in SUM_FIELDS})
+    return {field: value or 0 for field, value in totals.items()}
+
+
+def dashboard_summary(date_from, date_to, facility_id=None):
+    """
+    Số liệu cho trang analytics, chỉ đọc BookingDailyStat trong khoảng ngày.
+    Công suất = (Pending + Confirmed) / (số khung giờ đang mở x số ngày).
+    """
+    stats = BookingDailyStat.objects.filter(date__gte=date_from, date__lte=date_to)
+    open_slots = PitchTimeSlot.objects.filter(is_available=True, pitch__is_available=True)
+    if facility_id:
+        stats = stats.filter(facility_id=facility_id)
+        open_slots = open_slots.filter(pitch__facility_id=facility_id)
+    days = (date_to - date_from).days + 1
+
+    def with_occupancy(row, capacity):
+        row['booked'] = row['pending_count'] + row['confirmed_count']
+        row['occupancy'] = (
+            round(100 * row['booked'] / capacity, 1) if capacity else 0)
+        return row
+
+    sums = {field: Sum(field) for field in SUM_FIELDS}
+
+    facility_capacity = dict(
+        open_slots.values_list('pitch__facility').annotate(total=Count('id')))
+    by_facility = [
+        with_occupancy(row, facility_capacity.get(row['facility'], 0) * days)
+        for row in stats.values('facility', 'facility__name').annotate(**sums).order_by('-revenue')
+    ]
+
+    pitch_capacity = dict(open_slots.values_list('pitch').annotate(total=Count('id')))
+    by_pitch = [
+        with_occupancy(row, pitch_capacity.get(row['pitch'], 0) * days)
+        for row in stats.values('pitch', 'pitch__name', 'facility__name').annotate(
+            **sums).order_by('-revenue')[:20]
+    ]
+
+    slot_capacity = dict(open_slots.values_list('time_slot').annotate(total=Count('id')))
+    by_slot = [
+        with_occupancy(row, slot_capacity.get(row['time_slot'], 0) * days)
+        for row in stats.values(
+            'time_slot', 'time_slot__name', 'time_slot__start_time').annotate(
+            **sums).order_by('time_slot__start_time')
+    ]
+
+    daily = defaultdict(lambda: dict.fromkeys(SUM_FIELDS, 0))
+    for row in stats.values('date').annotate(**sums):
+        daily[row['date']] = row
+    by_day = [
+        dict(daily[date_from + timedelta(days=offset)], date=date_from + timedelta(days=offset))
+        for offset in range(days)
+    ]
+
+    totals = with_occupancy(_sums(stats), open_slots.count() * days)
+    return {
+        'totals': totals,
+        'by_facility': by_facility,
+        'by_pitch': by_pitch,
+        'by_slot': by_slot,
+        'by_day': by_day,
+    }
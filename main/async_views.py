@@ -0,0 +1,183 @@
+"""
+Bản async của các view chỉ đọc nhiều nhất: danh sách sân, chi tiết cơ sở,
+AJAX khung giờ và AJAX voucher (urls.py chọn theo settings.ASYNC_READ_VIEWS).
+
+- Dùng async ORM (afirst, acount, async for); các query độc lập của một
+  request chờ cùng lúc bằng asyncio.gather. Django chạy query của một
+  request trên cùng một thread DB nên SQL vẫn lần lượt, phần được lợi là
+  event loop không bị giữ trong lúc chờ và không tốn thread cho phần còn
+  lại của request (middleware, render).
+- Không được chạm ORM sync trong event loop (SynchronousOnlyOperation):
+  request.user resolve trước bằng auser(), quan hệ cần dùng trong template
+  lấy sẵn bằng select_related, queryset đưa vào template đã là list.
+"""
+import asyncio
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user, load_backend
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.cache import cache_control
+
+from . import constants, refdata
+from .availability import (
+    abuild_slots_data, aget_cached_slots, apitch_exists, aset_cached_slots, aslots_version,
+    in_booking_window,
+)
+from .decorators import replica_reads
+from .models import Facility, Favorite, Pitch
+from .views import (
+    _mark_favorites, _pitch_list_context, _pitch_list_queryset, _voucher_response,
+)
+from .vouchers import acheck_voucher
+
+
+async def _resolve_user(request):
+    """
+    request.user mặc định là lazy object đọc session / user đồng bộ; thay
+    bằng user đã load sẵn để context processor và template dùng được.
+    """
+    backend_path = await request.session.aget(BACKEND_SESSION_KEY)
+    if backend_path and not hasattr(load_backend(backend_path), 'aget_user'):
+        # Backend của social_django (đăng nhập Google/Facebook) chưa có API async
+        request.user = await sync_to_async(get_user)(request)
+    else:
+        request.user = await request.auser()
+    return request.user
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
+
+async def _favorite_pitch_ids(user):
+    if not user.is_authenticated:
+        return set()
+    return set(await _alist(
+        Favorite.objects.filter(user=user).values_list('pitch_id', flat=True)))
+
+
+def _guess_page(value):
+    """Số trang client yêu cầu, để query trang song song với COUNT"""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return 1
+    return number if number >= 1 else 1
+
+
+def _page_rows(pitches, number):
+    bottom = (number - 1) * constants.ITEMS_PER_PAGE
+    return _alist(pitches[bottom:bottom + constants.ITEMS_PER_PAGE])
+
+
+@replica_reads
+async def pitch_list(request):
+    user = await _resolve_user(request)
+    if request.GET.get('q'):
+        # Lần đầu search_pitches introspect bảng FTS ngay lúc dựng queryset (sync)
+        pitches, has_filters = await sync_to_async(_pitch_list_queryset)(request.GET)
+    else:
+        pitches, has_filters = _pitch_list_queryset(request.GET)
+    page_value = request.GET.get('page')
+    guess = _guess_page(page_value)
+
+    # COUNT, trang đang xem, sân yêu thích và loại sân không phụ thuộc nhau
+    count, rows, favorite_pitch_ids, pitch_types = await asyncio.gather(
+        pitches.acount(),
+        _page_rows(pitches, guess),
+        _favorite_pitch_ids(user),
+        sync_to_async(refdata.get_pitch_types)(),
+    )
+
+    # Phân trang giống pitch_list: trang không phải số -> 1, quá tầm -> trang cuối
+    paginator = Paginator(pitches, constants.ITEMS_PER_PAGE)
+    paginator.count = count
+    try:
+        number = paginator.validate_number(page_value)
+    except PageNotAnInteger:
+        number = 1
+    except EmptyPage:
+        number = paginator.num_pages
+    if number != guess:
+        rows = await _page_rows(pitches, number)
+    pitches_page = Page(rows, number, paginator)
+    _mark_favorites(pitches_page, favorite_pitch_ids)
+
+    context = _pitch_list_context(request, pitches_page, pitch_types, has_filters)
+    return render(request, 'user/pitch_list.html', context)
+
+
+@replica_reads
+async def facility_detail(request, facility_id):
+    user = await _resolve_user(request)
+    facility, pitches = await asyncio.gather(
+        Facility.objects.filter(id=facility_id).afirst(),
+        _alist(Pitch.objects.filter(
+            facility_id=facility_id, is_available=True).select_related('pitch_type')),
+    )
+    if facility is None:
+        raise Http404
+
+    context = {
+        'facility': facility,
+        'pitches': pitches,
+        'default_facility_image': constants.DEFAULT_FACILITY_IMAGE,
+        'default_pitch_image': constants.DEFAULT_PITCH_IMAGE,
+        'is_user': user.role == constants.ROLE_USER if user.is_authenticated else False,
+    }
+
+    return render(request, 'user/facility_detail.html', context)
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+@replica_reads
+@cache_control(no_cache=True)
+async def get_available_time_slots_ajax(request, pitch_id):
+    """
+    AJAX: Lấy available time slots cho ngày cụ thể (cache như bản sync).
+
+    Không dùng @condition: etag_func của nó chạy sync trong event loop.
+    Version đọc bằng cache.aget rồi tự xử lý If-None-Match / If-Modified-Since.
+    """
+    date_str = request.GET.get('date')
+    if not date_str:
+        return JsonResponse({'error': 'Missing date parameter'}, status=400)
+
+    booking_date = _parse_date(date_str)
+    if booking_date is None or not in_booking_window(booking_date):
+        return JsonResponse({'error': 'Invalid or out-of-range date'}, status=400)
+    if not await apitch_exists(pitch_id):
+        raise Http404
+
+    etag, last_modified = await aslots_version(pitch_id, booking_date)
+    last_modified = int(last_modified)
+    response = get_conditional_response(
+        request, etag=quote_etag(etag), last_modified=last_modified)
+    if response is None:
+        data = await aget_cached_slots(pitch_id, booking_date, etag)
+        if data is None:
+            data = await abuild_slots_data(pitch_id, booking_date)
+            await aset_cached_slots(pitch_id, booking_date, etag, data)
+        response = JsonResponse(data)
+
+    response.headers['ETag'] = quote_etag(etag)
+    response.headers['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+async def check_voucher_ajax(request):
+    """AJAX: Kiểm tra mã giảm giá"""
+    code = request.GET.get('code', '')
+    return _voucher_response(
+        await acheck_voucher(code, await _resolve_user(request)) if code else None)
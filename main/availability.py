@@ -0,0 +1,322 @@
+import asyncio
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import constants, db_router, refdata, slot_events
+from .models import ACTIVE_BOOKING_STATUSES, Booking, Pitch, PitchTimeSlot
+from .refdata import with_time_slots
+
+
+def get_taken_slot_ids(pitch, booking_date, exclude_booking_id=None):
+    """
+    Trả về set id PitchTimeSlot đã có booking active (Pending/Confirmed)
+    của một sân trong một ngày, chỉ với 1 query.
+    """
+    bookings = Booking.objects.filter(
+        pitch=pitch,
+        booking_date=booking_date,
+        status__in=ACTIVE_BOOKING_STATUSES,
+        time_slot__isnull=False,
+    )
+    if exclude_booking_id:
+        bookings = bookings.exclude(id=exclude_booking_id)
+    return set(bookings.values_list('time_slot_id', flat=True))
+
+
+def get_taken_slot_ids_for_range(pitch_ids, date_from, date_to):
+    """
+    Lấy booking active cho nhiều sân trong khoảng ngày bằng 1 query.
+
+    Returns:
+        dict: {(pitch_id, booking_date): set(time_slot_id)}
+    """
+    taken = defaultdict(set)
+    rows = Booking.objects.filter(
+        pitch_id__in=pitch_ids,
+        booking_date__gte=date_from,
+        booking_date__lte=date_to,
+        status__in=ACTIVE_BOOKING_STATUSES,
+        time_slot__isnull=False,
+    ).values_list('pitch_id', 'booking_date', 'time_slot_id')
+    for pitch_id, booking_date, time_slot_id in rows:
+        taken[(pitch_id, booking_date)].add(time_slot_id)
+    return taken
+
+
+def get_slot_availability(pitch, booking_date, pitch_time_slots=None):
+    """
+    Map PitchTimeSlot -> còn trống hay không vào ngày booking_date.
+
+    Nếu không truyền pitch_time_slots thì lấy các slot đang mở của sân
+    (time_slot lấy từ cache, sắp theo giờ bắt đầu). Tổng cộng tối đa 2 query
+    bất kể sân có bao nhiêu khung giờ.
+
+    Returns:
+        dict: {PitchTimeSlot: bool}, giữ nguyên thứ tự slot
+    """
+    if pitch_time_slots is None:
+        pitch_time_slots = with_time_slots(PitchTimeSlot.objects.filter(
+            pitch=pitch,
+            is_available=True
+        ))
+
+    taken_ids = get_taken_slot_ids(pitch, booking_date)
+    return {
+        pts: pts.is_available and pts.id not in taken_ids
+        for pts in pitch_time_slots
+    }
+
+
+def build_occupancy_bitmap(pitch_time_slots, date_from, date_to):
+    """
+    Dựng bitmask slot đã bị đặt cho từng (sân, ngày) từ 1 range query
+    trên index (pitch, booking_date, status).
+
+    Bit thứ i của mask tương ứng với slot thứ i của sân trong
+    pitch_time_slots (giữ thứ tự truyền vào). Bit = 1 nghĩa là đã có
+    booking Pending/Confirmed.
+
+    Returns:
+        dict: {pitch_id: {booking_date: mask}}
+    """
+    bit_positions = {}
+    slot_counts = defaultdict(int)
+    for pts in pitch_time_slots:
+        bit_positions[pts.id] = slot_counts[pts.pitch_id]
+        slot_counts[pts.pitch_id] += 1
+
+    taken = get_taken_slot_ids_for_range(
+        list(slot_counts), date_from, date_to)
+
+    bitmap = defaultdict(dict)
+    for (pitch_id, booking_date), slot_ids in taken.items():
+        mask = 0
+        for slot_id in slot_ids:
+            if slot_id in bit_positions:
+                mask |= 1 << bit_positions[slot_id]
+        bitmap[pitch_id][booking_date] = mask
+    return bitmap
+
+
+# ===== Version cache cho AJAX khung giờ =====
+#
+# Mỗi sân có một version (đổi khi sân / khung giờ của sân đổi giá, mở/đóng)
+# và mỗi (sân, ngày) có một version (đổi khi booking của sân trong ngày đó
+# được tạo / đổi trạng thái / xoá). Version là mốc thời gian (µs) lúc đổi,
+# nên vừa làm ETag vừa làm Last-Modified, và key bị evict cũng không quay
+# về một version cũ.
+#
+# Số key bị chặn: chỉ sân có thật và ngày trong cửa sổ đặt sân mới có key
+# (in_booking_window, pitch_exists), mỗi (sân, ngày) một key dữ liệu ghi
+# đè theo version - không để key rác đẩy refdata / voucher ra khỏi cache.
+
+def _version_key(pitch_id, booking_date=None):
+    if booking_date is None:
+        return f'{constants.AVAILABILITY_CACHE_PREFIX}:{pitch_id}:version'
+    return f'{constants.AVAILABILITY_CACHE_PREFIX}:{pitch_id}:{booking_date.isoformat()}:version'
+
+
+def _now_version():
+    return time.time_ns() // 1000
+
+
+def in_booking_window(booking_date):
+    """Ngày nằm trong cửa sổ đặt sân (MIN → MAX_BOOKING_ADVANCE_DAYS)"""
+    today = date.today()
+    return (today + timedelta(days=constants.MIN_BOOKING_ADVANCE_DAYS)
+            <= booking_date
+            <= today + timedelta(days=constants.MAX_BOOKING_ADVANCE_DAYS))
+
+
+def pitch_exists(pitch_id):
+    """Sân đã có version trong cache thì chắc chắn tồn tại, không query"""
+    if cache.get(_version_key(pitch_id)) is not None:
+        return True
+    return Pitch.objects.filter(pk=pitch_id).exists()
+
+
+async def apitch_exists(pitch_id):
+    if await cache.aget(_version_key(pitch_id)) is not None:
+        return True
+    return await Pitch.objects.filter(pk=pitch_id).aexists()
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _now_version(), timeout=constants.AVAILABILITY_CACHE_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+async def _aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _now_version(), timeout=constants.AVAILABILITY_CACHE_TIMEOUT)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump(key):
+    cache.set(key, _now_version(), timeout=constants.AVAILABILITY_CACHE_TIMEOUT)
+
+
+def _bump_now_and_on_commit(key, pitch_id, booking_date=None):
+    """
+    Như refdata.invalidate: process khác không kịp cache dữ liệu trước
+    commit. Sau commit đẩy trạng thái mới cho client SSE (slot_events).
+    """
+    _bump(key)
+
+    def committed():
+        _bump(key)
+        slot_events.publish(pitch_id, booking_date)
+
+    transaction.on_commit(committed)
+
+
+def invalidate_date(pitch_id, booking_date):
+    """Booking của sân trong ngày booking_date vừa thay đổi"""
+    if pitch_id and booking_date:
+        _bump_now_and_on_commit(_version_key(pitch_id, booking_date), pitch_id, booking_date)
+        cache.delete(_data_key(pitch_id, booking_date))
+
+
+def invalidate_pitch(pitch_id):
+    """Giá / trạng thái khung giờ của sân vừa thay đổi (mọi ngày)"""
+    if pitch_id:
+        _bump_now_and_on_commit(_version_key(pitch_id), pitch_id)
+
+
+def _last_modified(pitch_version, date_version, time_slots_version):
+    """Timestamp (giây) của thay đổi mới nhất; version refdata tính bằng ms"""
+    return max(pitch_version, date_version, time_slots_version * 1000) / 1_000_000
+
+
+def slots_version(pitch_id, booking_date):
+    """
+    Version hiện tại của dữ liệu khung giờ (sân, ngày), không query DB.
+
+    Returns:
+        tuple: (etag, last_modified_timestamp)
+    """
+    pitch_version = _get_version(_version_key(pitch_id))
+    date_version = _get_version(_version_key(pitch_id, booking_date))
+    time_slots_version = refdata.version(refdata.TIME_SLOTS)
+    etag = f'{pitch_version}.{date_version}.{time_slots_version}'
+    return etag, _last_modified(pitch_version, date_version, time_slots_version)
+
+
+async def aslots_version(pitch_id, booking_date):
+    """Bản async của slots_version (cache.aget / aadd, không chặn event loop)"""
+    pitch_version, date_version, time_slots_version = await asyncio.gather(
+        _aget_version(_version_key(pitch_id)),
+        _aget_version(_version_key(pitch_id, booking_date)),
+        refdata.aversion(refdata.TIME_SLOTS),
+    )
+    etag = f'{pitch_version}.{date_version}.{time_slots_version}'
+    return etag, _last_modified(pitch_version, date_version, time_slots_version)
+
+
+def _data_key(pitch_id, booking_date):
+    return f'{constants.AVAILABILITY_CACHE_PREFIX}:{pitch_id}:{booking_date.isoformat()}:data'
+
+
+def get_cached_slots(pitch_id, booking_date, etag):
+    cached = cache.get(_data_key(pitch_id, booking_date))
+    if cached is not None and cached[0] == etag:
+        return cached[1]
+    return None
+
+
+def set_cached_slots(pitch_id, booking_date, etag, data):
+    # Một key cho mỗi (sân, ngày): bản của version cũ bị ghi đè
+    cache.set(_data_key(pitch_id, booking_date), (etag, data),
+              timeout=constants.AVAILABILITY_CACHE_TIMEOUT)
+
+
+async def aget_cached_slots(pitch_id, booking_date, etag):
+    cached = await cache.aget(_data_key(pitch_id, booking_date))
+    if cached is not None and cached[0] == etag:
+        return cached[1]
+    return None
+
+
+async def aset_cached_slots(pitch_id, booking_date, etag, data):
+    await cache.aset(_data_key(pitch_id, booking_date), (etag, data),
+                     timeout=constants.AVAILABILITY_CACHE_TIMEOUT)
+
+
+def _slots_data(pitch_time_slots, taken_ids, booking_date):
+    slots_data = []
+    for pts in pitch_time_slots:
+        slots_data.append({
+            'id': pts.id,
+            'name': pts.time_slot.name,
+            'start_time': pts.time_slot.start_time.strftime('%H:%M'),
+            'end_time': pts.time_slot.end_time.strftime('%H:%M'),
+            'duration': float(pts.time_slot.duration_hours),
+            'price': float(pts.get_price()),
+            'is_available': pts.is_available and pts.id not in taken_ids
+        })
+    return {'date': booking_date.isoformat(), 'slots': slots_data}
+
+
+def _open_slots(pitch):
+    return PitchTimeSlot.objects.filter(pitch=pitch, is_available=True)
+
+
+def build_slots_data(pitch, booking_date):
+    """
+    Payload khung giờ của sân (instance hoặc id) trong ngày, tối đa 2 query.
+    Payload được cache cho mọi request nên luôn đọc primary, không đọc replica.
+    """
+    with db_router.primary_reads():
+        return _slots_data(
+            with_time_slots(_open_slots(pitch)),
+            get_taken_slot_ids(pitch, booking_date),
+            booking_date)
+
+
+async def abuild_slots_data(pitch_id, booking_date):
+    """
+    Bản async của build_slots_data (cùng payload, dùng chung cache): hai
+    query chạy đồng thời, TimeSlot lấy bằng JOIN thay vì refdata (cache
+    miss của refdata là query sync).
+    """
+    with db_router.primary_reads():
+        pitch_time_slots, taken_ids = await asyncio.gather(
+            _alist(_open_slots(pitch_id).select_related('time_slot')
+                   .order_by('time_slot__start_time', 'id')),
+            _alist(Booking.objects.filter(
+                pitch_id=pitch_id,
+                booking_date=booking_date,
+                status__in=ACTIVE_BOOKING_STATUSES,
+                time_slot__isnull=False,
+            ).values_list('time_slot_id', flat=True)),
+        )
+    return _slots_data(pitch_time_slots, set(taken_ids), booking_date)
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
+
+def slots_payload(pitch_id, booking_date):
+    """
+    Payload khung giờ (sân, ngày) qua cache theo version, dùng chung cho
+    AJAX và SSE.
+
+    Returns:
+        tuple: (etag, data)
+    """
+    etag, _ = slots_version(pitch_id, booking_date)
+    data = get_cached_slots(pitch_id, booking_date, etag)
+    if data is None:
+        data = build_slots_data(pitch_id, booking_date)
+        set_cached_slots(pitch_id, booking_date, etag, data)
+    return etag, data
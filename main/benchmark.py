@@ -0,0 +1,440 @@
+"""
+Benchmark các view nóng trên DB hiện tại (seed trước bằng `seed_load`):
+đo p50/p95 latency và số query từng kịch bản, so với baseline JSON.
+
+Chạy qua `manage.py benchmark`.
+"""
+import asyncio
+import itertools
+import json
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import date, timedelta
+from importlib import import_module
+from types import ModuleType
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, include, path, reverse
+
+from . import async_views, constants, urls, views
+from .availability import get_slot_availability
+from .models import Booking, Pitch, PitchTimeSlot, PitchType, Role, User, Voucher
+
+# as_user: 'user' | 'admin' | None (ẩn danh)
+Scenario = namedtuple('Scenario', 'name method path data as_user')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def _ensure_fixtures():
+    """User/admin/voucher cố định cho benchmark (tạo một lần, giữ lại)."""
+    user, _ = User.objects.get_or_create(
+        username='bench_user',
+        defaults={'email': 'bench_user@example.com', 'role': Role.USER})
+    admin, _ = User.objects.get_or_create(
+        username='bench_admin',
+        defaults={'email': 'bench_admin@example.com', 'role': Role.ADMIN})
+    voucher, _ = Voucher.objects.get_or_create(
+        code=constants.BENCHMARK_VOUCHER_CODE,
+        defaults={'discount_percent': 10, 'description': 'Voucher benchmark'})
+    return user, admin, voucher
+
+
+def _hot_pitch():
+    """Sân có nhiều booking nhất (trường hợp xấu nhất cho availability)."""
+    row = (
+        Booking.objects.values('pitch')
+        .annotate(total=Count('id'))
+        .order_by('-total')
+        .first()
+    )
+    pitches = Pitch.objects.filter(is_available=True, time_slots__isnull=False)
+    if row:
+        pitch = pitches.filter(id=row['pitch']).first()
+        if pitch:
+            return pitch
+    return pitches.order_by('id').first()
+
+
+def _free_slot(pitch):
+    """(ngày, PitchTimeSlot) còn trống xa nhất trong cửa sổ đặt sân."""
+    today = date.today()
+    slots = PitchTimeSlot.objects.filter(
+        pitch=pitch, is_available=True).select_related('time_slot')
+    for offset in range(constants.MAX_BOOKING_ADVANCE_DAYS,
+                        constants.MIN_BOOKING_ADVANCE_DAYS, -1):
+        booking_date = today + timedelta(days=offset)
+        for pts, is_free in get_slot_availability(pitch, booking_date, slots).items():
+            if is_free:
+                return booking_date, pts
+    return None, None
+
+
+def build_scenarios():
+    _, _, voucher = _ensure_fixtures()
+    pitch = _hot_pitch()
+    if pitch is None:
+        raise BenchmarkError(
+            "Chưa có sân nào có khung giờ. Chạy `manage.py seed_load` trước.")
+
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    pitch_type = PitchType.objects.order_by('id').first()
+
+    scenarios = []
+
+    # pitch_list: mọi tổ hợp bật/tắt filter x 2 kiểu sort
+    filters = [
+        ('q', 'san'),
+        ('pitch_type', str(pitch_type.id) if pitch_type else ''),
+        ('price_range', '200000-300000'),
+        ('booking_date', tomorrow),
+    ]
+    for enabled in itertools.product((False, True), repeat=len(filters)):
+        params = {key: value for (key, value), on in zip(filters, enabled) if on and value}
+        for sort in ('', '-price'):
+            query = dict(params, sort=sort) if sort else params
+            label = '+'.join(sorted(query)) or 'all'
+            scenarios.append(Scenario(
+                f'pitch_list[{label}]', 'get', reverse('pitch_list'), query, None))
+
+    scenarios.append(Scenario(
+        'ajax_time_slots', 'get',
+        reverse('ajax_time_slots', args=[pitch.id]), {'date': tomorrow}, None))
+
+    create_url = reverse('user_booking_create', args=[pitch.id])
+    scenarios.append(Scenario(
+        'user_booking_create[GET]', 'get', create_url, {'date': tomorrow}, 'user'))
+    scenarios.append(Scenario(
+        'user_booking_create[GET+voucher]', 'get', create_url,
+        {'date': tomorrow, 'voucher_code': voucher.code}, 'user'))
+    booking_date, pts = _free_slot(pitch)
+    if pts is not None:
+        scenarios.append(Scenario(
+            'user_booking_create[POST]', 'post', create_url,
+            {'booking_date': booking_date.isoformat(), 'time_slot': str(pts.id),
+             'voucher_code': '', 'note': 'benchmark'}, 'user'))
+
+    admin_url = reverse('admin_booking_list')
+    scenarios.append(Scenario('admin_booking_list', 'get', admin_url, {}, 'admin'))
+    scenarios.append(Scenario(
+        'admin_booking_list[status]', 'get', admin_url, {'status': 'Pending'}, 'admin'))
+    scenarios.append(Scenario(
+        'admin_booking_list[date_range]', 'get', admin_url,
+        {'date_from': (date.today() - timedelta(days=30)).isoformat(), 'date_to': tomorrow},
+        'admin'))
+
+    check_url = reverse('ajax_check_voucher')
+    scenarios.append(Scenario(
+        'check_voucher_ajax', 'get', check_url, {'code': voucher.code}, 'user'))
+    scenarios.append(Scenario(
+        'check_voucher_ajax[missing]', 'get', check_url, {'code': 'NOPE404'}, 'user'))
+    return scenarios
+
+
+def _percentile(values, percent):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+def _request(client, scenario):
+    method = getattr(client, scenario.method)
+    if scenario.method == 'post':
+        # Ghi rồi rollback để lần lặp sau vẫn đặt được slot cũ
+        with transaction.atomic():
+            response = method(scenario.path, scenario.data)
+            transaction.set_rollback(True)
+    else:
+        response = method(scenario.path, scenario.data)
+    if response.status_code >= 400:
+        raise BenchmarkError(
+            f"{scenario.name}: HTTP {response.status_code} ({scenario.path})")
+    return response
+
+
+def run_scenario(client, scenario, iterations, warmup):
+    for _ in range(warmup):
+        _request(client, scenario)
+
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            _request(client, scenario)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured))
+
+    return {
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'queries': max(queries),
+        'iterations': iterations,
+    }
+
+
+def run_benchmarks(iterations=constants.BENCHMARK_ITERATIONS,
+                   warmup=constants.BENCHMARK_WARMUP, only=None, on_result=None):
+    """
+    Returns:
+        dict: {tên kịch bản: {'p50_ms', 'p95_ms', 'queries', 'iterations'}}
+    """
+    user, admin, _ = _ensure_fixtures()
+    clients = {None: Client(), 'user': Client(), 'admin': Client()}
+    clients['user'].force_login(user)
+    clients['admin'].force_login(admin)
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        for scenario in build_scenarios():
+            if only and only not in scenario.name:
+                continue
+            results[scenario.name] = run_scenario(
+                clients[scenario.as_user], scenario, iterations, warmup)
+            if on_result:
+                on_result(scenario.name, results[scenario.name])
+    return results
+
+
+def _contention_worker(voucher_id, writes, barrier, timings, errors):
+    try:
+        barrier.wait()
+        for _ in range(writes):
+            start = time.perf_counter()
+            try:
+                # Đọc rồi ghi trong cùng transaction, giống luồng tạo booking
+                with transaction.atomic():
+                    Voucher.objects.filter(pk=voucher_id).values_list('used_count', flat=True).get()
+                    Voucher.objects.filter(pk=voucher_id).update(used_count=F('used_count') + 1)
+            except OperationalError:
+                errors.append(1)  # "database is locked"
+            else:
+                timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        connection.close()
+
+
+def run_write_contention(workers=constants.BENCHMARK_CONTENTION_WORKERS,
+                         writes=constants.BENCHMARK_CONTENTION_WRITES):
+    """
+    Nhiều thread (mỗi thread một kết nối DB) cùng ghi vào một dòng, để so
+    cấu hình DB (DB_PROFILE) khi có ghi đồng thời.
+
+    Returns:
+        dict: số transaction thành công / lỗi lock, throughput, p50/p95
+    """
+    _, _, voucher = _ensure_fixtures()
+    timings, errors = [], []
+    barrier = threading.Barrier(workers)
+    threads = [
+        threading.Thread(
+            target=_contention_worker,
+            args=(voucher.id, writes, barrier, timings, errors))
+        for _ in range(workers)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    Voucher.objects.filter(pk=voucher.id).update(used_count=voucher.used_count)
+
+    options = connection.settings_dict.get('OPTIONS', {})
+    return {
+        'workers': workers,
+        'ok': len(timings),
+        'errors': len(errors),
+        'writes_per_s': round(len(timings) / elapsed, 1) if elapsed else 0,
+        'p50_ms': round(_percentile(timings, 50), 3) if timings else None,
+        'p95_ms': round(_percentile(timings, 95), 3) if timings else None,
+        'transaction_mode': options.get('transaction_mode') or 'DEFERRED',
+        'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE', 0),
+    }
+
+
+# ===== View sync / async dưới ASGI =====
+
+# url name của các view có bản async (main/async_views.py)
+ASYNC_READ_VIEWS = ('pitch_list', 'facility_detail', 'ajax_time_slots', 'ajax_check_voucher')
+
+
+def _read_urlconf(read_views):
+    """ROOT_URLCONF với các view trong ASYNC_READ_VIEWS trỏ tới module read_views"""
+    patterns = [
+        URLPattern(pattern.pattern, getattr(read_views, pattern.callback.__name__),
+                   pattern.default_args, pattern.name)
+        if getattr(pattern, 'name', None) in ASYNC_READ_VIEWS else pattern
+        for pattern in urls.urlpatterns
+    ]
+    urlconf = ModuleType(f'{read_views.__name__}_urlconf')
+    urlconf.urlpatterns = [path('', include(patterns))] + import_module(settings.ROOT_URLCONF).urlpatterns
+    return urlconf
+
+
+def _asgi_paths():
+    """(path, query) xoay vòng cho các view trong ASYNC_READ_VIEWS"""
+    _, _, voucher = _ensure_fixtures()
+    pitch = _hot_pitch()
+    if pitch is None:
+        raise BenchmarkError(
+            "Chưa có sân nào có khung giờ. Chạy `manage.py seed_load` trước.")
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    return [
+        (reverse('pitch_list'), {}),
+        (reverse('pitch_list'), {'sort': '-price', 'page': '2'}),
+        (reverse('facility_detail', args=[pitch.facility_id]), {}),
+        (reverse('ajax_time_slots', args=[pitch.id]), {'date': tomorrow}),
+        (reverse('ajax_check_voucher'), {'code': voucher.code}),
+    ]
+
+
+async def _asgi_get(app, path, query, cookie):
+    """Một request GET qua ASGI app, trả về status"""
+    headers = [(b'host', b'testserver')]
+    if cookie:
+        headers.append((b'cookie', cookie.encode()))
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'root_path': '', 'query_string': urlencode(query).encode(), 'headers': headers,
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    received = asyncio.Event()
+    status = None
+
+    async def receive():
+        if not received.is_set():
+            received.set()
+            return {'type': 'http.request', 'body': b''}
+        # Không ngắt kết nối: Django tự huỷ task chờ sau khi gửi xong response
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _asgi_load(app, targets, cookie, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    timings, errors = [], []
+    peak_threads = threading.active_count()
+
+    async def one(target):
+        async with semaphore:
+            start = time.perf_counter()
+            status = await _asgi_get(app, *target, cookie)
+            timings.append((time.perf_counter() - start) * 1000)
+            if status >= 400:
+                errors.append(f"{target[0]}: HTTP {status}")
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while True:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.001)
+
+    sampler = asyncio.ensure_future(sample_threads())
+    start = time.perf_counter()
+    await asyncio.gather(*(one(targets[i % len(targets)]) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    sampler.cancel()
+    return timings, errors, elapsed, peak_threads
+
+
+def run_asgi_comparison(requests=constants.BENCHMARK_ASGI_REQUESTS,
+                        concurrency=constants.BENCHMARK_ASGI_CONCURRENCY):
+    """
+    Cùng một loạt request (user đã đăng nhập, concurrency request cùng lúc)
+    vào ASGIHandler, lần lượt với view sync (main/views.py) và async
+    (main/async_views.py). Lượt đầu đo throughput / latency / số thread,
+    lượt sau bật tracemalloc đo bộ nhớ cấp phát đỉnh.
+
+    Returns:
+        dict: {'sync' | 'async': {'req_per_s', 'p50_ms', 'p95_ms',
+               'peak_threads', 'peak_alloc_kb'}}
+    """
+    user, _, _ = _ensure_fixtures()
+    targets = _asgi_paths()
+    client = Client()
+    client.force_login(user, backend='django.contrib.auth.backends.ModelBackend')
+    cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    results = {}
+    for mode, read_views in (('sync', views), ('async', async_views)):
+        with override_settings(ROOT_URLCONF=_read_urlconf(read_views),
+                               ALLOWED_HOSTS=['testserver']):
+            app = ASGIHandler()
+            asyncio.run(_asgi_load(app, targets, cookie, len(targets) * 2, concurrency))
+            timings, errors, elapsed, peak_threads = asyncio.run(
+                _asgi_load(app, targets, cookie, requests, concurrency))
+            tracemalloc.start()
+            try:
+                asyncio.run(_asgi_load(app, targets, cookie, requests, concurrency))
+                _, peak_alloc = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        if errors:
+            raise BenchmarkError(f"{mode}: {errors[0]}")
+        results[mode] = {
+            'req_per_s': round(requests / elapsed, 1),
+            'p50_ms': round(_percentile(timings, 50), 3),
+            'p95_ms': round(_percentile(timings, 95), 3),
+            'peak_threads': peak_threads,
+            'peak_alloc_kb': round(peak_alloc / 1024),
+        }
+    return results
+
+
+def compare_results(results, baseline,
+                    latency_tolerance=constants.BENCHMARK_LATENCY_TOLERANCE,
+                    query_tolerance=constants.BENCHMARK_QUERY_TOLERANCE):
+    """Danh sách mô tả các kịch bản chậm hơn / nhiều query hơn baseline."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            limit = max(previous[key] * (1 + latency_tolerance),
+                        previous[key] + constants.BENCHMARK_LATENCY_MIN_SLACK_MS)
+            if current[key] > limit:
+                regressions.append(
+                    f"{name}: {key} {current[key]:.1f} > {limit:.1f} "
+                    f"(baseline {previous[key]:.1f})")
+        if current['queries'] > previous['queries'] + query_tolerance:
+            regressions.append(
+                f"{name}: queries {current['queries']} > "
+                f"{previous['queries'] + query_tolerance} (baseline {previous['queries']})")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['scenarios']
+
+
+def save_baseline(path, results):
+    data = {
+        'created_at': date.today().isoformat(),
+        'database': connection.vendor,
+        'scenarios': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,199 @@
+"""
+Duyệt / từ chối hàng loạt đơn đang chờ (dashboard + Django admin).
+
+Cả lô chạy trong một transaction: khoá các đơn PENDING (SELECT ... FOR
+UPDATE), một câu UPDATE theo id cho booking, used_count của voucher cộng
+dồn bằng F(), rollup thống kê cộng theo nhóm và email ghi vào outbox bằng
+một câu INSERT. Worker outbox gửi cả lô qua một kết nối SMTP.
+
+Bật settings.BOOKING_AUTO_REJECT_CONFLICTS thì khi xác nhận một đơn, các
+đơn đang chờ trùng giờ với nó bị từ chối luôn trong cùng transaction
+(reject_conflicting_bookings).
+"""
+import logging
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import analytics, availability, constants
+from .models import Booking, BookingStatus, Voucher
+from .outbox import enqueue_emails
+from .utils import build_booking_email
+
+logger = logging.getLogger(__name__)
+
+BULK_ACTIONS = {
+    'approve': (
+        BookingStatus.CONFIRMED,
+        constants.EMAIL_SUBJECT_BOOKING_APPROVED,
+        constants.EMAIL_TEMPLATE_BOOKING_APPROVED,
+    ),
+    'reject': (
+        BookingStatus.REJECTED,
+        constants.EMAIL_SUBJECT_BOOKING_REJECTION,
+        constants.EMAIL_TEMPLATE_BOOKING_REJECTION,
+    ),
+}
+
+
+def _redeem_vouchers(bookings):
+    """Cộng used_count, mỗi nhóm voucher có cùng số lượt chỉ 1 câu UPDATE"""
+    per_voucher = Counter(b.voucher_id for b in bookings if b.voucher_id)
+    by_count = defaultdict(list)
+    for voucher_id, count in per_voucher.items():
+        by_count[count].append(voucher_id)
+    for count, voucher_ids in by_count.items():
+        Voucher.objects.filter(id__in=voucher_ids).update(
+            used_count=F('used_count') + count)
+
+
+def _notification(booking, subject_template, message_template, extra_context):
+    try:
+        subject, message = build_booking_email(
+            booking, subject_template, message_template, extra_context)
+    except Exception as e:
+        logger.error(f"Không dựng được email cho booking #{booking.id}: {e}")
+        return None
+    return {
+        'subject': subject,
+        'message': message,
+        'recipient_list': [booking.user.email],
+    }
+
+
+def _transition(bookings, action, reason=''):
+    """
+    Chuyển các đơn PENDING trong queryset sang trạng thái của action bằng
+    một câu UPDATE. Trả về list Booking đã chuyển.
+    """
+    new_status, subject_template, message_template = BULK_ACTIONS[action]
+    extra_context = None
+    if new_status == BookingStatus.REJECTED:
+        extra_context = {"reason": reason or constants.BOOKING_REJECT_DEFAULT_REASON}
+
+    with transaction.atomic():
+        # Khoá các đơn còn PENDING trước rồi UPDATE / đọc lại theo id:
+        # admin khác xử lý song song phải đợi lô này commit
+        ids = list(
+            bookings.filter(status=BookingStatus.PENDING)
+            .select_for_update(of=('self',))
+            .values_list('id', flat=True)
+        )
+        if not ids:
+            return []
+        updated = Booking.objects.filter(pk__in=ids, status=BookingStatus.PENDING).update(
+            status=new_status, updated_at=timezone.now())
+        if not updated:
+            return []
+
+        changed = list(
+            Booking.objects
+            .filter(pk__in=ids, status=new_status)
+            .select_related('user', 'pitch', 'time_slot__time_slot', 'time_slot__pitch')
+            .order_by('id')
+        )
+
+        if new_status == BookingStatus.CONFIRMED:
+            _redeem_vouchers(changed)
+
+        analytics.record_bulk_status_change(changed, BookingStatus.PENDING)
+        for pitch_id, booking_date in {(b.pitch_id, b.booking_date) for b in changed}:
+            availability.invalidate_date(pitch_id, booking_date)
+
+        notifications = [
+            _notification(booking, subject_template, message_template, extra_context)
+            for booking in changed
+            if booking.user.email
+        ]
+        enqueue_emails(filter(None, notifications))
+
+    return changed
+
+
+def reject_conflicting_bookings(confirmed):
+    """
+    Từ chối các đơn PENDING tranh chấp với các đơn vừa xác nhận: cùng sân,
+    cùng ngày, khung giờ giao nhau (kể cả trùng hẳn khung giờ). Một câu
+    UPDATE, email từ chối vào outbox. Chỉ chạy khi
+    settings.BOOKING_AUTO_REJECT_CONFLICTS = True.
+
+    Gọi trong transaction của việc xác nhận.
+
+    Returns:
+        list: các Booking bị từ chối
+    """
+    if not getattr(settings, 'BOOKING_AUTO_REJECT_CONFLICTS', False):
+        return []
+
+    conflict = Q()
+    for booking in confirmed:
+        if not booking.time_slot_id:
+            continue
+        time_slot = booking.time_slot.time_slot
+        conflict |= Q(
+            pitch_id=booking.pitch_id,
+            booking_date=booking.booking_date,
+            time_slot__time_slot__start_time__lt=time_slot.end_time,
+            time_slot__time_slot__end_time__gt=time_slot.start_time,
+        )
+    if not conflict:
+        return []
+    return _transition(
+        Booking.objects.filter(conflict),
+        'reject',
+        reason=constants.BOOKING_CONFLICT_REJECT_REASON,
+    )
+
+
+def _first_come_ids(bookings):
+    """
+    Id các đơn PENDING trong lô được duyệt: đơn giao giờ với một đơn tạo
+    trước nó (cùng lô, cùng sân, cùng ngày) bị bỏ ra, để
+    reject_conflicting_bookings từ chối như mọi đơn trùng giờ khác.
+    """
+    kept = defaultdict(list)  # (sân, ngày) -> [(start, end)] đã giữ
+    ids = []
+    pending = (
+        bookings.filter(status=BookingStatus.PENDING)
+        .select_related('time_slot__time_slot')
+        .order_by('created_at', 'id')
+    )
+    for booking in pending:
+        if booking.time_slot_id:
+            time_slot = booking.time_slot.time_slot
+            taken = kept[(booking.pitch_id, booking.booking_date)]
+            if any(start < time_slot.end_time and end > time_slot.start_time
+                   for start, end in taken):
+                continue
+            taken.append((time_slot.start_time, time_slot.end_time))
+        ids.append(booking.id)
+    return ids
+
+
+def bulk_update_status(bookings, action, reason=''):
+    """
+    Chuyển các đơn PENDING trong queryset sang CONFIRMED/REJECTED.
+    Đơn không còn PENDING (admin khác vừa xử lý) được bỏ qua. Khi duyệt,
+    trong lô có các đơn trùng giờ nhau thì chỉ đơn tạo trước được duyệt;
+    bật BOOKING_AUTO_REJECT_CONFLICTS thì các đơn đang chờ trùng giờ với
+    đơn vừa duyệt bị từ chối luôn, không thì vẫn chờ.
+
+    Args:
+        bookings: QuerySet Booking cần xử lý
+        action: 'approve' hoặc 'reject'
+        reason: lý do từ chối ghi trong email (bỏ trống = lý do mặc định)
+
+    Returns:
+        tuple: (Booking đã chuyển trạng thái, Booking bị từ chối do trùng giờ)
+    """
+    with transaction.atomic():
+        if action == 'approve':
+            bookings = Booking.objects.filter(pk__in=_first_come_ids(bookings))
+        changed = _transition(bookings, action, reason=reason)
+        conflicts = []
+        if action == 'approve' and changed:
+            conflicts = reject_conflicting_bookings(changed)
+    return changed, conflicts
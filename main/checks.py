@@ -0,0 +1,30 @@
+"""
+System check cho cấu hình chạy nhiều worker.
+
+Version key trong cache (khung giờ trống - main/availability.py, dữ liệu
+tham chiếu - main/refdata.py, voucher không tồn tại - main/vouchers.py) chỉ
+có tác dụng khi mọi process cùng đọc một cache. LocMemCache nằm trong từng
+process: worker khác không thấy version bị tăng và tiếp tục trả dữ liệu cũ
+(kể cả 304) tới khi key hết hạn.
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.WEB_CONCURRENCY > 1 and backend in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            f'{backend} không dùng chung giữa {settings.WEB_CONCURRENCY} worker '
+            '(WEB_CONCURRENCY): khung giờ trống, dữ liệu tham chiếu và voucher '
+            'có thể cũ tới AVAILABILITY_CACHE_TIMEOUT / REFDATA_CACHE_TIMEOUT.',
+            hint='Đặt CACHE_BACKEND là cache dùng chung (FileBasedCache, Redis, Memcached).',
+            id='main.W001',
+        )]
+    return []
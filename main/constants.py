@@ -132,6 +132,14 @@ MSG_BOOKING_CREATED = "Đặt sân thành công! Vui lòng chờ xác nhận."
 MSG_BOOKING_CANCELLED = "Đã hủy đặt sân."
 MSG_BOOKING_APPROVED = "Đã duyệt booking #{booking_id}."
 MSG_BOOKING_REJECTED = "Đã từ chối booking #{booking_id}."
+MSG_BOOKING_BULK_APPROVED = "Đã duyệt {count} đơn đặt sân."
+MSG_BOOKING_BULK_REJECTED = "Đã từ chối {count} đơn đặt sân."
+MSG_BOOKING_BULK_SKIPPED = "{count} đơn đã được xử lý trước đó nên bị bỏ qua."
+MSG_BOOKING_BULK_OVERLAP_PENDING = "{count} đơn trùng giờ với đơn khác được duyệt trong lô nên vẫn đang chờ."
+ERR_BOOKING_BULK_EMPTY = "Vui lòng chọn ít nhất một đơn đang chờ."
+BOOKING_REJECT_DEFAULT_REASON = "Khung giờ đã có người đặt hoặc sân không khả dụng."
+BOOKING_CONFLICT_REJECT_REASON = "Khung giờ này đã được xác nhận cho một đơn đặt khác."
+MSG_BOOKING_CONFLICTS_REJECTED = "Đã tự động từ chối {count} đơn đang chờ trùng giờ."
 
 MSG_FAVORITE_ADDED = "Đã thêm {pitch_name} vào yêu thích."
 MSG_FAVORITE_REMOVED = "Đã bỏ yêu thích {pitch_name}."
@@ -147,6 +155,7 @@ ERR_BOOKING_ONLY_APPROVE_PENDING = "Chỉ có thể duyệt booking đang chờ.
 
 ERR_VOUCHER_INVALID = "Mã giảm giá không hợp lệ hoặc đã hết hạn."
 ERR_VOUCHER_NOT_FOUND = "Mã giảm giá không tồn tại."
+ERR_VOUCHER_ALREADY_USED = "Bạn đã sử dụng voucher này rồi. Mỗi người chỉ dùng 1 lần."
 
 ERR_REVIEW_ONLY_AFTER_BOOKING = "Bạn chỉ có thể đánh giá sân đã đặt."
 ERR_REVIEW_ALREADY_EXISTS = "Bạn đã đánh giá sân này rồi."
@@ -203,3 +212,76 @@ ICON_EDIT = "fas fa-edit"
 ICON_DELETE = "fas fa-trash"
 ICON_VIEW = "fas fa-eye"
 ICON_SEARCH = "fas fa-search"
+
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 60
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = 3600
+EMAIL_OUTBOX_LEASE_SECONDS = 300
+EMAIL_OUTBOX_POLL_INTERVAL_SECONDS = 5
+
+# Keyset pagination: thứ tự phải khớp với index trên Booking / Review
+ADMIN_BOOKING_KEYSET_ORDER = ('-created_at', '-id')
+USER_BOOKING_KEYSET_ORDER = ('-booking_date', '-created_at', '-id')
+REVIEW_KEYSET_ORDER = ('-created_at', '-id')  # index review_pitch_recent_idx
+
+# Benchmark (manage.py benchmark)
+BENCHMARK_BASELINE_FILE = 'benchmark_baseline.json'
+BENCHMARK_ITERATIONS = 20
+BENCHMARK_WARMUP = 2
+BENCHMARK_LATENCY_TOLERANCE = 0.25  # cho phép chậm hơn baseline 25%
+BENCHMARK_LATENCY_MIN_SLACK_MS = 2  # view rất nhanh: nhiễu tuyệt đối
+BENCHMARK_QUERY_TOLERANCE = 0  # số query thêm được phép
+BENCHMARK_VOUCHER_CODE = 'BENCH10'
+# benchmark --concurrent-writes: số thread ghi đồng thời, số transaction mỗi thread
+BENCHMARK_CONTENTION_WORKERS = 8
+BENCHMARK_CONTENTION_WRITES = 50
+# So sánh view sync / async dưới ASGI (manage.py benchmark --asgi)
+BENCHMARK_ASGI_REQUESTS = 400
+BENCHMARK_ASGI_CONCURRENCY = 50
+
+# Cache dữ liệu tham chiếu (main/refdata.py)
+REFDATA_CACHE_PREFIX = 'refdata'
+REFDATA_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Cache AJAX khung giờ theo (sân, ngày), xem main/availability.py
+AVAILABILITY_CACHE_PREFIX = 'availability'
+AVAILABILITY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# SSE khung giờ (main/slot_events.py)
+SLOT_EVENTS_HEARTBEAT_SECONDS = 15  # giữ kết nối + kiểm tra version do process khác ghi
+SLOT_EVENTS_RETRY_MS = 3000  # EventSource tự kết nối lại sau khoảng này
+SLOT_EVENTS_FALLBACK_RETRY_MS = 15000  # không chạy ASGI: poll mỗi lần một snapshot
+
+# Code voucher không tồn tại được nhớ trong cache (main/vouchers.py)
+VOUCHER_MISSING_CACHE_PREFIX = 'voucher-missing'
+VOUCHER_MISSING_CACHE_SECONDS = 60
+
+# Dashboard analytics (số ngày mặc định tính lùi từ hôm nay)
+ANALYTICS_DEFAULT_DAYS = 30
+# Khoảng ngày tối đa một lần xem (dashboard dựng danh sách theo từng ngày)
+ANALYTICS_MAX_DAYS = 366
+
+# Xuất CSV đơn đặt sân: số dòng đọc từ DB mỗi lần (QuerySet.iterator)
+BOOKING_EXPORT_CHUNK_SIZE = 2000
+
+# Ảnh sân (main/images.py)
+PITCH_IMAGE_DIR = 'pitches'
+PITCH_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+PITCH_IMAGE_MAX_PIXELS = 40_000_000  # ~ 7700 x 5200
+PITCH_IMAGE_ALLOWED_FORMATS = ('JPEG', 'PNG', 'WEBP', 'MPO')
+PITCH_IMAGE_THUMB_SIZE = (640, 400)  # ảnh card, cắt đúng khung 16:10
+PITCH_IMAGE_WIDTHS = (320, 640, 1280)  # srcset
+PITCH_IMAGE_QUALITY = {'jpeg': 82, 'webp': 80, 'avif': 60}
+PITCH_IMAGE_CARD_SIZES = '(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw'
+
+# Worker xử lý ảnh (manage.py process_image_jobs)
+IMAGE_JOB_BATCH_SIZE = 10
+IMAGE_JOB_MAX_ATTEMPTS = 3
+IMAGE_JOB_RETRY_SECONDS = 60
+IMAGE_JOB_LEASE_SECONDS = 600
+IMAGE_JOB_POLL_INTERVAL_SECONDS = 5
+
+# Đánh giá trên trang đặt sân: số review mỗi lần tải (cursor), độ sâu thụt lề tối đa của bình luận
+REVIEWS_PER_PAGE = 10
+COMMENT_MAX_INDENT_DEPTH = 4
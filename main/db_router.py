@@ -0,0 +1,107 @@
+"""
+Đọc từ DB replica cho các view chỉ đọc (danh sách sân, chi tiết cơ sở,
+khung giờ trống, review), ghi luôn vào primary.
+
+- Replica chỉ bật khi có kết nối DATABASE_REPLICA_ALIAS
+  (env DB_REPLICA_NAME), không có thì mọi thứ đi primary như cũ.
+- Chỉ view gắn @replica_reads mới đọc replica; session và user luôn đọc
+  primary (vừa đăng nhập xong replica có thể chưa có session).
+- Request nào có ghi DB thì ReplicaRoutingMiddleware đặt cookie ghim
+  primary trong DATABASE_REPLICA_PIN_SECONDS giây: user đặt sân / huỷ /
+  yêu thích xong sẽ thấy ngay dữ liệu mình vừa ghi dù replica còn trễ.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.connection import ConnectionDoesNotExist
+
+PRIMARY_ONLY_MODELS = {'sessions.session', settings.AUTH_USER_MODEL.lower()}
+
+_state = contextvars.ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    __slots__ = ('pinned', 'use_replica', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.use_replica = False
+        self.wrote = False
+
+
+def start_request(pinned=False):
+    state = RoutingState(pinned)
+    return state, _state.set(state)
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def current_state():
+    return _state.get()
+
+
+@contextmanager
+def primary_reads():
+    """
+    Trong khối này query đọc đi primary kể cả trong view @replica_reads:
+    dùng khi kết quả được cache cho mọi request (dữ liệu trễ của replica
+    sẽ nằm trong cache tới lần invalidate sau).
+    """
+    state = _state.get()
+    if state is None or not state.use_replica:
+        yield
+        return
+    state.use_replica = False
+    try:
+        yield
+    finally:
+        state.use_replica = True
+
+
+def replica_alias():
+    """Alias replica nếu đã cấu hình, ngược lại None"""
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', None)
+    if not alias:
+        return None
+    try:
+        replica = connections[alias]
+    except ConnectionDoesNotExist:
+        return None
+    # Test mirror (TEST.MIRROR) trỏ về chính DB primary: không cần route
+    if replica.settings_dict['NAME'] == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']:
+        return None
+    return alias
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias is None:
+            return None
+        state = _state.get()
+        if (state is not None and state.use_replica and not state.wrote
+                and model._meta.label_lower not in PRIMARY_ONLY_MODELS):
+            return alias
+        # Trả rõ primary: không để Django lấy theo instance._state.db của
+        # object đã đọc từ replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS if replica_alias() else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica là bản sao của primary: quan hệ giữa hai bên luôn hợp lệ
+        return True if replica_alias() else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Schema của replica đến từ primary (replication), không migrate riêng
+        if db == replica_alias():
+            return False
+        return None
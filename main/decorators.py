@@ -1,7 +1,9 @@
 # main/decorators.py
+from asgiref.sync import iscoroutinefunction
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from functools import wraps
+from . import db_router
 from .models import Role
 
 
@@ -38,3 +40,34 @@ def admin_required(view_func):
 def user_or_admin_required(view_func):
     """User hoặc Admin (đã đăng nhập)"""
     return role_required(Role.USER, Role.ADMIN)(view_func)
+
+
+def replica_reads(view_func):
+    """
+    View chỉ đọc: query đọc đi DB replica (nếu có cấu hình), trừ khi
+    request đang bị ghim primary sau khi user vừa ghi (main/db_router.py).
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            state = db_router.current_state()
+            if state is None or state.pinned:
+                return await view_func(request, *args, **kwargs)
+            state.use_replica = True
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                state.use_replica = False
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        state = db_router.current_state()
+        if state is None or state.pinned:
+            return view_func(request, *args, **kwargs)
+        state.use_replica = True
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            state.use_replica = False
+    return wrapper
@@ -0,0 +1,107 @@
+"""
+Xuất danh sách đơn đặt sân ra CSV theo kiểu streaming: đọc DB theo từng
+chunk (QuerySet.iterator, dưới ASGI là aiterator) và ghi từng dòng ra response, nên bộ nhớ không
+tăng theo số đơn.
+"""
+import csv
+
+from . import constants
+from .models import BookingStatus
+
+BOOKING_EXPORT_HEADER = (
+    'Mã đơn', 'Ngày đặt', 'Trạng thái', 'Tài khoản', 'Họ tên', 'Email',
+    'Cơ sở', 'Sân', 'Khung giờ', 'Số giờ', 'Thành tiền', 'Voucher', 'Tạo lúc',
+)
+BOOKING_EXPORT_FIELDS = (
+    'id', 'booking_date', 'status', 'user__username', 'user__full_name',
+    'user__email', 'pitch__facility__name', 'pitch__name',
+    'time_slot__time_slot__name', 'duration_hours', 'final_price',
+    'voucher__code', 'created_at',
+)
+
+
+# Excel / LibreOffice coi ô bắt đầu bằng các ký tự này là công thức
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _safe_cell(value):
+    """Chặn CSV formula injection: thêm ' trước text do user nhập trông như công thức"""
+    if not value:
+        return ''
+    if value.startswith(_FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+class _Echo:
+    """Pseudo-buffer cho csv.writer: trả lại luôn dòng vừa ghi"""
+
+    def write(self, value):
+        return value
+
+
+def _ordered(queryset):
+    return queryset.order_by('booking_date', 'created_at', 'id')
+
+
+def _format_row(row, status_labels):
+    (booking_id, booking_date, status, username, full_name, email,
+     facility, pitch, time_slot, duration_hours, final_price,
+     voucher_code, created_at) = row
+    return (
+        booking_id,
+        booking_date.isoformat(),
+        status_labels.get(status, status),
+        _safe_cell(username),
+        _safe_cell(full_name),
+        _safe_cell(email),
+        _safe_cell(facility),
+        _safe_cell(pitch),
+        _safe_cell(time_slot),
+        duration_hours,
+        final_price,
+        _safe_cell(voucher_code),
+        created_at.strftime('%Y-%m-%d %H:%M:%S'),
+    )
+
+
+def booking_csv_rows(queryset):
+    """
+    Sinh từng dòng CSV (str) cho queryset Booking đã lọc.
+    Dòng đầu là BOM để Excel mở đúng tiếng Việt.
+    """
+    writer = csv.writer(_Echo())
+    status_labels = dict(BookingStatus.choices)
+    yield '\ufeff'
+    yield writer.writerow(BOOKING_EXPORT_HEADER)
+
+    rows = (
+        _ordered(queryset)
+        .values_list(*BOOKING_EXPORT_FIELDS)
+        .iterator(chunk_size=constants.BOOKING_EXPORT_CHUNK_SIZE)
+    )
+    for row in rows:
+        yield writer.writerow(_format_row(row, status_labels))
+
+
+async def abooking_csv_rows(queryset):
+    """
+    Bản async của booking_csv_rows cho ASGI: StreamingHttpResponse gom
+    iterator sync vào list trước khi gửi (sync_to_async(list)), còn async
+    iterator thì được gửi từng chunk khi đọc xong (QuerySet.aiterator).
+    """
+    writer = csv.writer(_Echo())
+    status_labels = dict(BookingStatus.choices)
+    yield '\ufeff'
+    yield writer.writerow(BOOKING_EXPORT_HEADER)
+
+    # values() thay vì values_list(): aiterator của values_list (Django 5.2)
+    # chạy query ngay trong event loop -> SynchronousOnlyOperation
+    rows = (
+        _ordered(queryset)
+        .values(*BOOKING_EXPORT_FIELDS)
+        .aiterator(chunk_size=constants.BOOKING_EXPORT_CHUNK_SIZE)
+    )
+    async for row in rows:
+        row = tuple(row[field] for field in BOOKING_EXPORT_FIELDS)
+        yield writer.writerow(_format_row(row, status_labels))
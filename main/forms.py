@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
+from .images import validate_upload
 from .models import Pitch, PitchTimeSlot, User, Review, Voucher
 from datetime import date
 import re
@@ -11,6 +12,15 @@ class MultiFileInput(forms.ClearableFileInput):
     allow_multiple_selected = True
 
 
+class MultipleFileField(forms.FileField):
+    """FileField nhận list file từ MultiFileInput (FileField gốc chỉ nhận 1 file)."""
+
+    def clean(self, data, initial=None):
+        if isinstance(data, (list, tuple)):
+            return [super(MultipleFileField, self).clean(item, initial) for item in data]
+        return super().clean(data, initial)
+
+
 class SignUpForm(UserCreationForm):
     email = forms.EmailField(required=True)
     full_name = forms.CharField(required=True, label="Họ và tên")
@@ -203,7 +213,7 @@ class ReviewForm(forms.ModelForm):
 
 
 class PitchForm(forms.ModelForm):
-    multiple_images = forms.FileField(
+    multiple_images = MultipleFileField(
         required=False,
         widget=MultiFileInput(attrs={"multiple": True, "class": "form-control"}),
         label="Ảnh sân (có thể chọn nhiều)"
@@ -228,7 +238,10 @@ class PitchForm(forms.ModelForm):
         }
 
     def clean_multiple_images(self):
-        return self.files.getlist("multiple_images")
+        files = self.files.getlist("multiple_images")
+        for upload in files:
+            validate_upload(upload)
+        return files
 
 
 class VoucherForm(forms.ModelForm):
@@ -0,0 +1,105 @@
+"""
+Hàng đợi xử lý ảnh sân: request chỉ lưu file gốc và ghi ImageJob, worker
+`manage.py process_image_jobs` sinh thumbnail / WebP sau khi đã trả
+response rồi đánh dấu phần tử tương ứng trong Pitch.images là ready.
+
+Mỗi worker xử lý tuần tự từng ảnh (RAM tối đa ~ một ảnh giải mã), số ảnh
+xử lý song song = số worker đang chạy; job được claim bằng lease như outbox
+email nên chạy nhiều worker không bị trùng.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import constants, images
+from .models import ImageJob, ImageJobStatus, Pitch
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_for_pitch(pitch):
+    """Tạo job cho các ảnh PENDING của sân (gọi sau pitch.save())."""
+    jobs = [
+        ImageJob(pitch=pitch, image_hash=entry['hash'], original=entry['original'])
+        for entry in pitch.images or []
+        if isinstance(entry, dict) and entry.get('status') == images.STATUS_PENDING
+    ]
+    return ImageJob.objects.bulk_create(jobs)
+
+
+def _claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            ImageJob.objects.select_for_update(skip_locked=True).filter(
+                status=ImageJobStatus.PENDING,
+                next_attempt_at__lte=now,
+            ).order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        ImageJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            next_attempt_at=now + timedelta(
+                seconds=constants.IMAGE_JOB_LEASE_SECONDS))
+    return jobs
+
+
+def _update_pitch_entry(pitch_id, image_hash, record):
+    """Thay phần tử có hash tương ứng trong Pitch.images (admin có thể đã đổi ảnh)."""
+    with transaction.atomic():
+        pitch = Pitch.objects.select_for_update().filter(pk=pitch_id).only('images').first()
+        if pitch is None or not pitch.images:
+            return
+        entries = [
+            record if isinstance(entry, dict) and entry.get('hash') == image_hash else entry
+            for entry in pitch.images
+        ]
+        if entries != pitch.images:
+            # update() thay vì save(): không chạy lại signal search / giá slot
+            Pitch.objects.filter(pk=pitch_id).update(images=entries)
+
+
+def _run_job(job):
+    job.attempts += 1
+    try:
+        record = images.build_record(job.image_hash, job.original)
+    except Exception as e:
+        job.last_error = str(e)
+        if job.attempts >= constants.IMAGE_JOB_MAX_ATTEMPTS:
+            job.status = ImageJobStatus.FAILED
+            job.finished_at = timezone.now()
+            logger.error(f"Ảnh {job.original} xử lý thất bại sau {job.attempts} lần: {e}")
+            _update_pitch_entry(job.pitch_id, job.image_hash, {
+                'hash': job.image_hash,
+                'original': job.original,
+                'status': images.STATUS_FAILED,
+            })
+        else:
+            job.next_attempt_at = timezone.now() + timedelta(
+                seconds=constants.IMAGE_JOB_RETRY_SECONDS * job.attempts)
+            logger.warning(f"Ảnh {job.original} lỗi, thử lại lúc {job.next_attempt_at}: {e}")
+        job.save(update_fields=['attempts', 'status', 'next_attempt_at', 'last_error', 'finished_at'])
+        return False
+
+    _update_pitch_entry(job.pitch_id, job.image_hash, record)
+    job.status = ImageJobStatus.DONE
+    job.finished_at = timezone.now()
+    job.last_error = ''
+    job.save(update_fields=['attempts', 'status', 'last_error', 'finished_at'])
+    return True
+
+
+def run_pending(batch_size=constants.IMAGE_JOB_BATCH_SIZE):
+    """
+    Xử lý một batch job đến hạn, lần lượt từng ảnh.
+
+    Returns:
+        tuple: (số ảnh xử lý xong, số ảnh lỗi)
+    """
+    done = failed = 0
+    for job in _claim_batch(batch_size):
+        if _run_job(job):
+            done += 1
+        else:
+            failed += 1
+    return done, failed
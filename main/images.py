@@ -0,0 +1,274 @@
+"""
+Xử lý ảnh sân khi upload: giới hạn kích thước, thumbnail cố định cho card,
+các bản WebP/AVIF nhiều độ rộng cho srcset, chống trùng theo hash nội dung.
+
+Request chỉ lưu file gốc (stage_upload), worker `manage.py
+process_image_jobs` sinh các bản thu nhỏ sau (build_record, main/image_jobs.py).
+
+Mỗi phần tử của Pitch.images là một dict:
+    {
+        "hash": sha256 của file gốc,
+        "original": path, "width": ..., "height": ...,
+        "status": "pending" | "ready" | "failed",
+        "thumb": {"path", "width", "height"},          # JPEG, khi ready
+        "variants": [{"path", "width", "height", "format"}, ...],
+    }
+Chưa ready thì hiển thị ảnh gốc. Dữ liệu cũ (chuỗi path/URL) vẫn hiển
+thị được, xem image_urls().
+
+Ảnh đặt tại pitches/<2 ký tự đầu hash>/<hash>/ kèm meta.json, upload lại
+cùng một ảnh (ở sân nào cũng vậy) chỉ đọc meta.json, không resize lại.
+"""
+import hashlib
+import io
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from . import constants
+
+EXTENSIONS = {'JPEG': 'jpg', 'MPO': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+MIME_TYPES = {'webp': 'image/webp', 'avif': 'image/avif'}
+
+STATUS_PENDING = 'pending'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+
+def variant_formats():
+    """AVIF chỉ khi Pillow build có hỗ trợ"""
+    formats = ['webp']
+    if features.check('avif'):
+        formats.insert(0, 'avif')
+    return formats
+
+
+def _open(fp):
+    """Image.open chỉ đọc header, pixel giải mã khi dùng tới"""
+    try:
+        image = Image.open(fp)
+    except Image.DecompressionBombError:
+        # Kích thước khai báo quá lớn (vượt xa MAX_IMAGE_PIXELS của Pillow)
+        raise ValidationError("Ảnh quá lớn.")
+    except (UnidentifiedImageError, OSError):
+        raise ValidationError("File tải lên không phải ảnh hợp lệ.")
+    if image.format not in constants.PITCH_IMAGE_ALLOWED_FORMATS:
+        raise ValidationError(
+            f"Chỉ chấp nhận ảnh JPEG, PNG, WEBP (nhận được {image.format}).")
+    if image.width * image.height > constants.PITCH_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f"Ảnh quá lớn ({image.width}x{image.height} px).")
+    return image
+
+
+def validate_upload(upload):
+    """Kiểm tra dung lượng, định dạng và số pixel (chỉ đọc header ảnh)."""
+    if upload.size > constants.PITCH_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            f"Ảnh {upload.name} vượt quá "
+            f"{constants.PITCH_IMAGE_MAX_BYTES // (1024 * 1024)}MB.")
+    upload.seek(0)
+    _open(upload)
+    upload.seek(0)
+
+
+def _base_dir(digest):
+    return f"{constants.PITCH_IMAGE_DIR}/{digest[:2]}/{digest}"
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    quality = constants.PITCH_IMAGE_QUALITY[fmt]
+    if fmt == 'jpeg':
+        image.convert('RGB').save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, fmt.upper(), quality=quality)
+    return buffer.getvalue()
+
+
+def _store(path, data):
+    # Ghi đè nếu đã có (vd. lần xử lý trước dừng giữa chừng)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    return default_storage.save(path, ContentFile(data))
+
+
+def _prepare(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+
+def build_variants(image, base_dir):
+    """Sinh thumbnail + các bản resize, trả về (thumb, variants)"""
+    # Không phóng to: bỏ các độ rộng lớn hơn ảnh gốc, nhưng luôn có bản nhỏ nhất
+    widths = [w for w in constants.PITCH_IMAGE_WIDTHS if w <= image.width]
+    widths = sorted(widths or [image.width], reverse=True)
+
+    # Resize từ lớn đến nhỏ, mỗi bản lấy từ bản trước đó: không phải
+    # lọc lại ảnh gốc hàng chục megapixel cho từng độ rộng
+    variants = []
+    source = largest = image
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        if (width, height) != source.size:
+            source = source.resize((width, height), Image.Resampling.LANCZOS)
+        if width == widths[0]:
+            largest = source
+        for fmt in variant_formats():
+            variants.append({
+                'path': _store(f"{base_dir}/{width}w.{fmt}", _encode(source, fmt)),
+                'width': width,
+                'height': height,
+                'format': fmt,
+            })
+    variants.sort(key=lambda v: (v['format'], v['width']))
+
+    thumb_image = ImageOps.fit(
+        largest, constants.PITCH_IMAGE_THUMB_SIZE, Image.Resampling.LANCZOS)
+    thumb = {
+        'path': _store(f"{base_dir}/thumb.jpg", _encode(thumb_image, 'jpeg')),
+        'width': thumb_image.width,
+        'height': thumb_image.height,
+    }
+    return thumb, variants
+
+
+def _load_meta(digest):
+    meta_path = f"{_base_dir(digest)}/meta.json"
+    if not default_storage.exists(meta_path):
+        return None
+    with default_storage.open(meta_path) as meta_file:
+        return json.load(meta_file)
+
+
+def stage_upload(upload):
+    """
+    Phần chạy trong request: hash theo chunk, lưu file gốc, chưa resize.
+    Ảnh đã từng xử lý (cùng hash) thì trả luôn bản READY.
+
+    Returns:
+        dict: phần tử của Pitch.images, status PENDING hoặc READY
+    """
+    hasher = hashlib.sha256()
+    for chunk in upload.chunks():
+        hasher.update(chunk)
+    digest = hasher.hexdigest()
+
+    record = _load_meta(digest)
+    if record is not None:
+        return record
+
+    upload.seek(0)
+    header = Image.open(upload)  # chỉ đọc header
+    ext = EXTENSIONS[header.format]
+    width, height = header.size
+    upload.seek(0)
+    original = f"{_base_dir(digest)}/original.{ext}"
+    if not default_storage.exists(original):
+        original = default_storage.save(original, upload)
+    return {
+        'hash': digest,
+        'original': original,
+        'width': width,
+        'height': height,
+        'status': STATUS_PENDING,
+    }
+
+
+def build_record(digest, original):
+    """
+    Phần chạy trong worker: sinh thumbnail + variants từ file gốc đã lưu,
+    ghi meta.json.
+
+    Returns:
+        dict: phần tử của Pitch.images, status READY
+    """
+    record = _load_meta(digest)
+    if record is not None:
+        return record
+
+    with default_storage.open(original) as original_file:
+        # Đọc hết vào RAM: file đóng trước khi Pillow giải mã pixel
+        image = _open(io.BytesIO(original_file.read()))
+    width, height = image.size
+    # JPEG: giải mã thẳng ở tỉ lệ 1/2, 1/4, 1/8 nếu vẫn đủ cho bản lớn nhất,
+    # đỡ bung cả ảnh gốc ra RAM
+    max_width = max(constants.PITCH_IMAGE_WIDTHS)
+    if width > max_width:
+        image.draft('RGB', (max_width, round(height * max_width / width)))
+    image = _prepare(image)
+    thumb, variants = build_variants(image, _base_dir(digest))
+
+    record = {
+        'hash': digest,
+        'original': original,
+        'width': width,
+        'height': height,
+        'status': STATUS_READY,
+        'thumb': thumb,
+        'variants': variants,
+    }
+    _store(f"{_base_dir(digest)}/meta.json", json.dumps(record).encode())
+    return record
+
+
+def process_upload(upload):
+    """Lưu + xử lý luôn trong process hiện tại (không qua worker)."""
+    record = stage_upload(upload)
+    if record['status'] != STATUS_READY:
+        record = build_record(record['hash'], record['original'])
+    return record
+
+
+def save_pitch_images(files):
+    """
+    Lưu các file upload (bản PENDING, worker xử lý sau), bỏ file trùng
+    nội dung trong cùng lần upload.
+    """
+    records = []
+    seen = set()
+    for upload in files:
+        record = stage_upload(upload)
+        if record['hash'] not in seen:
+            seen.add(record['hash'])
+            records.append(record)
+    return records
+
+
+def _url(path):
+    if path.startswith(('http://', 'https://', '/')):
+        return path
+    return default_storage.url(path)
+
+
+def image_urls(entry):
+    """
+    URL để render một phần tử của Pitch.images.
+
+    Returns:
+        dict | None: {"src", "width", "height", "sources": [(mime, srcset)]}
+    """
+    if not entry:
+        return None
+    if isinstance(entry, str):
+        return {'src': _url(entry), 'width': None, 'height': None, 'sources': []}
+
+    sources = []
+    for fmt in ('avif', 'webp'):
+        srcset = ', '.join(
+            f"{_url(v['path'])} {v['width']}w"
+            for v in entry.get('variants', []) if v['format'] == fmt)
+        if srcset:
+            sources.append((MIME_TYPES[fmt], srcset))
+    thumb = entry.get('thumb') or {}
+    return {
+        'src': _url(thumb.get('path') or entry['original']),
+        'width': thumb.get('width'),
+        'height': thumb.get('height'),
+        'sources': sources,
+    }
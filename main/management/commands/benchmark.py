@@ -0,0 +1,116 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main import benchmark, constants
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark các view nóng (p50/p95 latency, số query) trên DB hiện tại "
+        "và so với baseline JSON; lỗi nếu vượt ngưỡng cho phép."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, constants.BENCHMARK_BASELINE_FILE),
+            help="File baseline JSON.")
+        parser.add_argument(
+            "--save-baseline", action="store_true",
+            help="Ghi kết quả lần chạy này làm baseline mới thay vì so sánh.")
+        parser.add_argument("--iterations", type=int, default=constants.BENCHMARK_ITERATIONS)
+        parser.add_argument("--warmup", type=int, default=constants.BENCHMARK_WARMUP)
+        parser.add_argument(
+            "--tolerance", type=float, default=constants.BENCHMARK_LATENCY_TOLERANCE,
+            help="Tỉ lệ chậm hơn baseline được phép (0.25 = 25%%).")
+        parser.add_argument(
+            "--query-tolerance", type=int, default=constants.BENCHMARK_QUERY_TOLERANCE,
+            help="Số query nhiều hơn baseline được phép.")
+        parser.add_argument("--only", default=None, help="Chỉ chạy kịch bản có tên chứa chuỗi này.")
+        parser.add_argument(
+            "--concurrent-writes", type=int, default=None, metavar="WORKERS",
+            help="Chỉ đo ghi đồng thời từ WORKERS thread (so DB_PROFILE).")
+        parser.add_argument(
+            "--writes-per-worker", type=int, default=constants.BENCHMARK_CONTENTION_WRITES)
+        parser.add_argument(
+            "--asgi", action="store_true",
+            help="Chỉ so view sync / async (danh sách sân, cơ sở, AJAX) dưới ASGI.")
+        parser.add_argument("--requests", type=int, default=constants.BENCHMARK_ASGI_REQUESTS)
+        parser.add_argument("--concurrency", type=int, default=constants.BENCHMARK_ASGI_CONCURRENCY)
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations phải >= 1")
+
+        if options["concurrent_writes"] is not None:
+            self._write_contention(options["concurrent_writes"], options["writes_per_worker"])
+            return
+
+        if options["asgi"]:
+            self._asgi(options["requests"], options["concurrency"])
+            return
+
+        def report(name, result):
+            self.stdout.write(
+                f"{name:<55} p50 {result['p50_ms']:8.1f}ms  "
+                f"p95 {result['p95_ms']:8.1f}ms  {result['queries']:3d} queries")
+
+        try:
+            results = benchmark.run_benchmarks(
+                iterations=options["iterations"],
+                warmup=options["warmup"],
+                only=options["only"],
+                on_result=report,
+            )
+        except benchmark.BenchmarkError as e:
+            raise CommandError(str(e))
+
+        path = options["baseline"]
+        if options["save_baseline"]:
+            benchmark.save_baseline(path, results)
+            self.stdout.write(self.style.SUCCESS(f"Đã lưu baseline: {path}"))
+            return
+
+        if not os.path.exists(path):
+            self.stdout.write(self.style.WARNING(
+                f"Chưa có baseline {path}, chạy lại với --save-baseline để tạo."))
+            return
+
+        regressions = benchmark.compare_results(
+            results,
+            benchmark.load_baseline(path),
+            latency_tolerance=options["tolerance"],
+            query_tolerance=options["query_tolerance"],
+        )
+        if regressions:
+            for line in regressions:
+                self.stderr.write(self.style.ERROR(line))
+            raise CommandError(f"{len(regressions)} chỉ số vượt baseline.")
+        self.stdout.write(self.style.SUCCESS("Không có regression so với baseline."))
+
+    def _write_contention(self, workers, writes):
+        if workers < 1 or writes < 1:
+            raise CommandError("--concurrent-writes và --writes-per-worker phải >= 1")
+        result = benchmark.run_write_contention(workers=workers, writes=writes)
+        style = self.style.WARNING if result['errors'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"DB_PROFILE={settings.DB_PROFILE} ({result['transaction_mode']}, "
+            f"CONN_MAX_AGE={result['conn_max_age']}): {result['workers']} thread, "
+            f"{result['ok']} ok / {result['errors']} lỗi lock, "
+            f"{result['writes_per_s']} ghi/s, p50 {result['p50_ms']}ms, p95 {result['p95_ms']}ms"))
+
+    def _asgi(self, requests, concurrency):
+        if requests < 1 or concurrency < 1:
+            raise CommandError("--requests và --concurrency phải >= 1")
+        try:
+            results = benchmark.run_asgi_comparison(requests=requests, concurrency=concurrency)
+        except benchmark.BenchmarkError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"{requests} request, {concurrency} đồng thời:")
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:<6} {result['req_per_s']:8.1f} req/s  "
+                f"p50 {result['p50_ms']:8.1f}ms  p95 {result['p95_ms']:8.1f}ms  "
+                f"{result['peak_threads']:4d} thread  {result['peak_alloc_kb']:8d} KB")
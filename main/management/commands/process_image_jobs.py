@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import constants
+from main.image_jobs import run_pending
+
+
+class Command(BaseCommand):
+    help = "Sinh thumbnail / bản WebP cho ảnh sân đang chờ, từng ảnh một."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=constants.IMAGE_JOB_BATCH_SIZE,
+            help="Số job claim mỗi lượt.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Chạy liên tục như worker thay vì xử lý một lượt rồi thoát.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=constants.IMAGE_JOB_POLL_INTERVAL_SECONDS,
+            help="Số giây nghỉ giữa các lượt khi hàng đợi trống (với --loop).",
+        )
+        parser.add_argument(
+            "--max-jobs",
+            type=int,
+            default=0,
+            help="Thoát sau khi xử lý chừng này job (0 = không giới hạn), để "
+                 "supervisor khởi động lại process và trả RAM.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        max_jobs = options["max_jobs"]
+        processed = 0
+
+        while True:
+            total_done = total_failed = 0
+            while True:
+                if max_jobs:
+                    batch_size = min(batch_size, max_jobs - processed)
+                done, failed = run_pending(batch_size=batch_size)
+                total_done += done
+                total_failed += failed
+                processed += done + failed
+                if (max_jobs and processed >= max_jobs) or done + failed < batch_size:
+                    break
+
+            if total_done or total_failed:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Đã xử lý {total_done} ảnh, {total_failed} ảnh lỗi."
+                    )
+                )
+            elif not options["loop"]:
+                self.stdout.write(self.style.SUCCESS("Không có ảnh nào cần xử lý."))
+
+            if not options["loop"] or (max_jobs and processed >= max_jobs):
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import analytics
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Ngày không hợp lệ: {value} (định dạng YYYY-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = "Dựng lại bảng rollup BookingDailyStat từ bảng Booking."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date-from", type=_parse_date, default=None)
+        parser.add_argument("--date-to", type=_parse_date, default=None)
+
+    def handle(self, *args, **options):
+        created = analytics.rebuild(options["date_from"], options["date_to"])
+        self.stdout.write(self.style.SUCCESS(f"Đã dựng lại {created} dòng rollup."))
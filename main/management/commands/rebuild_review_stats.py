@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main import reviews
+
+
+class Command(BaseCommand):
+    help = "Tính lại thống kê review (số review, điểm trung bình, số review từng mức sao) trên Pitch."
+
+    def handle(self, *args, **options):
+        updated = reviews.rebuild_pitch_stats()
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật thống kê review cho {updated} sân."))
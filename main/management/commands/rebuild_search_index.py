@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from main import search
+from main.models import Facility, Pitch
+
+
+class Command(BaseCommand):
+    help = "Dựng lại search_document và chỉ mục tìm kiếm cho sân và cơ sở."
+
+    def handle(self, *args, **options):
+        search.rebuild_index()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Đã dựng lại chỉ mục tìm kiếm: {Facility.objects.count()} cơ sở, "
+                f"{Pitch.objects.count()} sân."
+            )
+        )
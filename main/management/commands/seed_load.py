@@ -0,0 +1,248 @@
+import random
+from collections import Counter
+import time as timer
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main import analytics, constants, search
+from main.models import (
+    Facility,
+    PitchType,
+    Pitch,
+    TimeSlot,
+    PitchTimeSlot,
+    User,
+    Booking,
+    BookingStatus,
+    Role,
+)
+
+FACILITY_NAMES = [
+    "Phú Thịnh", "Hoà Khánh", "Mỹ Đình", "Thủ Đức", "Liên Chiểu", "Sơn Trà",
+    "Cầu Giấy", "Đống Đa", "Bình Thạnh", "Gò Vấp", "Ngũ Hành Sơn", "Hải Châu",
+]
+CITIES = ["Đà Nẵng", "Hà Nội", "TP.HCM", "Huế", "Cần Thơ", "Hải Phòng"]
+STREETS = ["Lê Duẩn", "Phan Chu Trinh", "Nguyễn Văn Linh", "Trần Phú", "Lê Lợi", "Hùng Vương"]
+
+# (name, start, end, weight) – giờ cao điểm buổi tối được đặt nhiều hơn
+SLOTS = [
+    ("05h-07h", time(5, 0), time(7, 0), 0.6),
+    ("07h-09h", time(7, 0), time(9, 0), 0.8),
+    ("09h-11h", time(9, 0), time(11, 0), 0.4),
+    ("13h-15h", time(13, 0), time(15, 0), 0.3),
+    ("15h-17h", time(15, 0), time(17, 0), 0.7),
+    ("17h-19h", time(17, 0), time(19, 0), 2.5),
+    ("19h-21h", time(19, 0), time(21, 0), 3.0),
+    ("21h-23h", time(21, 0), time(23, 0), 1.2),
+]
+WEEKDAY_WEIGHTS = [0.8, 0.8, 0.9, 0.9, 1.2, 2.0, 2.2]  # Thứ Hai -> Chủ Nhật
+
+PAST_STATUSES = (
+    [BookingStatus.CONFIRMED, BookingStatus.CANCELLED, BookingStatus.REJECTED],
+    [75, 15, 10],
+)
+FUTURE_STATUSES = (
+    [BookingStatus.PENDING, BookingStatus.CONFIRMED, BookingStatus.CANCELLED],
+    [40, 50, 10],
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Sinh dữ liệu lớn để benchmark (bulk_create theo batch): cơ sở, sân, "
+        "user và booking phân bố lệch theo giờ cao điểm / cuối tuần."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--facilities", type=int, default=50)
+        parser.add_argument("--pitches", type=int, default=4, help="Số sân mỗi cơ sở.")
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument(
+            "--days", type=int, default=365,
+            help="Số ngày lịch sử (tính lùi từ hôm nay), cộng thêm cửa sổ đặt trước.")
+        parser.add_argument("--bookings", type=int, default=200_000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=None, help="Seed random để tái lập dữ liệu.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        started = timer.perf_counter()
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Seeding load-test data..."))
+
+        pitch_types = [
+            PitchType.objects.get_or_create(name=name, defaults={"description": desc})[0]
+            for name, desc in (("Sân 5", "Sân 5 người"), ("Sân 7", "Sân 7 người"), ("Sân 11", "Sân 11 người"))
+        ]
+        time_slots = []
+        for name, start, end, weight in SLOTS:
+            ts, _ = TimeSlot.objects.get_or_create(
+                start_time=start, end_time=end, defaults={"name": name})
+            time_slots.append((ts, weight))
+
+        facilities = self._create_facilities(rng, options["facilities"], batch_size)
+        pitches = self._create_pitches(rng, facilities, pitch_types, options["pitches"], batch_size)
+        pitch_slots = self._create_pitch_slots(pitches, time_slots, batch_size)
+        users = self._create_users(options["users"], batch_size)
+        search.sync_fts_tables()
+
+        created = self._create_bookings(
+            rng, pitch_slots, users, options["days"], options["bookings"], batch_size,
+            verbosity=options["verbosity"])
+        analytics.rebuild()
+
+        elapsed = timer.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã tạo {len(facilities)} cơ sở, {len(pitches)} sân, {options['users']} user, "
+            f"{created} booking trong {elapsed:.1f}s."
+        ))
+
+    def _bulk_create(self, model, objs, batch_size):
+        with transaction.atomic():
+            return model.objects.bulk_create(objs, batch_size=batch_size)
+
+    def _create_facilities(self, rng, count, batch_size):
+        start = Facility.objects.count()
+        objs = []
+        for i in range(start, start + count):
+            name = f"Sân {rng.choice(FACILITY_NAMES)} {i + 1}"
+            address = f"{rng.randint(1, 500)} {rng.choice(STREETS)}, {rng.choice(CITIES)}"
+            objs.append(Facility(
+                name=name,
+                address=address,
+                description="Dữ liệu load test.",
+            ))
+            objs[-1].search_document = search.build_facility_document(objs[-1])
+        return self._bulk_create(Facility, objs, batch_size)
+
+    def _create_pitches(self, rng, facilities, pitch_types, per_facility, batch_size):
+        objs = []
+        for facility in facilities:
+            for j in range(per_facility):
+                pitch_type = rng.choice(pitch_types)
+                name = f"Sân {chr(ord('A') + j % 26)}{j // 26 + 1}"
+                objs.append(Pitch(
+                    facility=facility,
+                    name=name,
+                    pitch_type=pitch_type,
+                    base_price_per_hour=Decimal(rng.randrange(150_000, 500_000, 10_000)),
+                    is_available=True,
+                    images=[],
+                ))
+                objs[-1].search_document = search.build_pitch_document(objs[-1])
+        return self._bulk_create(Pitch, objs, batch_size)
+
+    def _create_pitch_slots(self, pitches, time_slots, batch_size):
+        objs = [
+            PitchTimeSlot(pitch=pitch, time_slot=ts, is_available=True)
+            for pitch in pitches
+            for ts, _ in time_slots
+        ]
+        for pts in objs:
+            pts.price = pts.compute_price()
+        self._bulk_create(PitchTimeSlot, objs, batch_size)
+
+        # bulk_create trên SQLite có thể không trả id -> đọc lại
+        weights = {ts.id: weight for ts, weight in time_slots}
+        durations = {ts.id: ts.duration_hours for ts, _ in time_slots}
+        pitch_slots = {}
+        for pts in PitchTimeSlot.objects.filter(pitch__in=pitches):
+            pitch_slots.setdefault(pts.pitch_id, []).append(
+                (pts, durations[pts.time_slot_id], weights[pts.time_slot_id]))
+        return list(pitch_slots.items())
+
+    def _create_users(self, count, batch_size):
+        start = User.objects.filter(username__startswith="load_user_").count()
+        password = make_password("User@123")
+        objs = [
+            User(
+                username=f"load_user_{i}",
+                email=f"load_user_{i}@example.com",
+                full_name=f"Load User {i}",
+                password=password,
+                role=Role.USER,
+                is_active=True,
+            )
+            for i in range(start, start + count)
+        ]
+        self._bulk_create(User, objs, batch_size)
+        return list(User.objects.filter(
+            username__startswith="load_user_").values_list("id", flat=True))
+
+    def _calibrate_scale(self, target, popularity, weekday_counts, slot_weights):
+        """
+        Tìm hệ số sao cho kỳ vọng số booking ~ target. Xác suất bị chặn ở 1
+        (sân hot kín lịch) nên phải lặp vài lần thay vì chia thẳng.
+        """
+        cells = [
+            (p * WEEKDAY_WEIGHTS[weekday] * w, count)
+            for p in popularity
+            for weekday, count in weekday_counts.items()
+            for w in slot_weights
+        ]
+        capacity = sum(count for _, count in cells)
+        target = min(target, capacity)
+        scale = target / sum(weight * count for weight, count in cells)
+        for _ in range(10):
+            expected = sum(min(1.0, scale * weight) * count for weight, count in cells)
+            if expected >= target * 0.995:
+                break
+            scale *= target / expected
+        return scale
+
+    def _create_bookings(self, rng, pitch_slots, user_ids, days, target, batch_size, verbosity=1):
+        """
+        Duyệt từng (sân, ngày, slot) và đặt với xác suất tỉ lệ với độ
+        "hot" của sân x thứ trong tuần x khung giờ. Mỗi (sân, slot, ngày)
+        tối đa 1 booking nên không vi phạm unique constraint.
+        """
+        if not pitch_slots or not user_ids or target <= 0:
+            return 0
+
+        today = date.today()
+        dates = [
+            today + timedelta(days=offset)
+            for offset in range(-days, constants.MAX_BOOKING_ADVANCE_DAYS + 1)
+        ]
+        # Độ phổ biến của sân lệch kiểu Zipf
+        popularity = [1.0 / (rank + 1) ** 0.6 for rank in range(len(pitch_slots))]
+        rng.shuffle(popularity)
+
+        slot_weights = [w for _, _, w in pitch_slots[0][1]]
+        weekday_counts = Counter(d.weekday() for d in dates)
+        scale = self._calibrate_scale(target, popularity, weekday_counts, slot_weights)
+
+        created = 0
+        batch = []
+        for (pitch_id, slots), pitch_weight in zip(pitch_slots, popularity):
+            for booking_date in dates:
+                day_weight = pitch_weight * WEEKDAY_WEIGHTS[booking_date.weekday()]
+                statuses = PAST_STATUSES if booking_date < today else FUTURE_STATUSES
+                for pts, duration, slot_weight in slots:
+                    if rng.random() >= scale * day_weight * slot_weight:
+                        continue
+                    batch.append(Booking(
+                        user_id=rng.choice(user_ids),
+                        pitch_id=pitch_id,
+                        time_slot=pts,
+                        booking_date=booking_date,
+                        duration_hours=duration,
+                        final_price=pts.price,
+                        status=rng.choices(*statuses)[0],
+                        note="Load test",
+                    ))
+                    if len(batch) >= batch_size:
+                        created += len(self._bulk_create(Booking, batch, batch_size))
+                        batch = []
+                        if verbosity > 1:
+                            self.stdout.write(f"  ... {created} booking")
+                        if created >= target:
+                            return created
+        if batch:
+            created += len(self._bulk_create(Booking, batch, batch_size))
+        return created
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import constants
+from main.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Gửi các email trong outbox qua một kết nối SMTP, retry với backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=constants.EMAIL_OUTBOX_BATCH_SIZE,
+            help="Số email tối đa gửi trong một lần mở kết nối SMTP.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Chạy liên tục như worker thay vì gửi một lượt rồi thoát.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=constants.EMAIL_OUTBOX_POLL_INTERVAL_SECONDS,
+            help="Số giây nghỉ giữa các lượt khi outbox trống (với --loop).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        while True:
+            total_sent = total_failed = 0
+            while True:
+                sent, failed = deliver_pending(batch_size=batch_size)
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < batch_size:
+                    break
+
+            if total_sent or total_failed:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Đã gửi {total_sent} email, {total_failed} email lỗi (sẽ thử lại)."
+                    )
+                )
+            elif not options["loop"]:
+                self.stdout.write(self.style.SUCCESS("Không có email nào cần gửi."))
+
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,160 @@
+"""
+Đo số query, thời gian DB, thời gian render template và tổng latency
+cho từng view (theo url name), xuất ra định dạng Prometheus text.
+
+Dữ liệu giữ trong process (mỗi worker gunicorn/uvicorn có bộ đếm riêng).
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_current_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds', 'template_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current_stats.set(stats)
+
+
+def end_request(token):
+    _current_stats.reset(token)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapper: đếm query và thời gian DB của request"""
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.latency = defaultdict(lambda: _Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: _Histogram(QUERY_COUNT_BUCKETS))
+        self.db_seconds = defaultdict(float)
+        self.template_seconds = defaultdict(float)
+        self.over_budget = defaultdict(int)
+
+    def record(self, view, duration, stats, over_budget):
+        with self._lock:
+            self.latency[view].observe(duration)
+            self.queries[view].observe(stats.queries)
+            self.db_seconds[view] += stats.db_seconds
+            self.template_seconds[view] += stats.template_seconds
+            if over_budget:
+                self.over_budget[view] += 1
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            _render_histogram(
+                lines, 'pitchmanager_request_duration_seconds',
+                'Tổng thời gian xử lý request theo view.', self.latency)
+            _render_histogram(
+                lines, 'pitchmanager_request_queries',
+                'Số SQL query mỗi request theo view.', self.queries)
+            _render_counter(
+                lines, 'pitchmanager_request_db_seconds_total',
+                'Tổng thời gian chạy SQL theo view.', self.db_seconds)
+            _render_counter(
+                lines, 'pitchmanager_request_template_seconds_total',
+                'Tổng thời gian render template theo view.', self.template_seconds)
+            _render_counter(
+                lines, 'pitchmanager_request_over_budget_total',
+                'Số request vượt ngân sách (VIEW_BUDGETS) theo view.', self.over_budget)
+        return '\n'.join(lines) + '\n'
+
+
+def _label(view):
+    return view.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _render_histogram(lines, name, help_text, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for view, histogram in sorted(histograms.items()):
+        label = _label(view)
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{view="{label}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{view="{label}"}} {histogram.total}')
+        lines.append(f'{name}_count{{view="{label}"}} {histogram.count}')
+
+
+def _render_counter(lines, name, help_text, values):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for view, value in sorted(values.items()):
+        lines.append(f'{name}{{view="{_label(view)}"}} {value}')
+
+
+registry = MetricsRegistry()
+
+
+# ===== Template backend đo thời gian render =====
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current_stats.get()
+        if stats is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_seconds += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, cộng thời gian render template vào RequestStats hiện tại"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,141 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import db_router, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCapableMiddleware:
+    """
+    Middleware chạy được cả sync lẫn async: dưới ASGI view async
+    (main/async_views.py) không bị bọc vào thread vì middleware chỉ có sync.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class RequestMetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Ghi số query, thời gian DB, thời gian render template và tổng latency
+    cho mỗi request theo url name; log cảnh báo khi vượt VIEW_BUDGETS.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.budgets = getattr(settings, 'VIEW_BUDGETS', {})
+        self.default_budget = self.budgets.get('default', {})
+
+    @staticmethod
+    def _wrap_connections(stack):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics.query_wrapper))
+
+    def handle(self, request):
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                self._wrap_connections(stack)
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self._record(request, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        stack = ExitStack()
+        try:
+            # Kết nối DB là theo thread: gắn wrapper trong thread mà ORM
+            # (sync_to_async thread_sensitive) của request này dùng
+            await sync_to_async(self._wrap_connections)(stack)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            metrics.end_request(token)
+        self._record(request, stats, time.perf_counter() - start)
+        return response
+
+    def _record(self, request, stats, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unresolved'
+        over_budget = self._check_budget(view, duration, stats, request)
+        metrics.registry.record(view, duration, stats, over_budget)
+
+    def _check_budget(self, view, duration, stats, request):
+        budget = self.budgets.get(view, self.default_budget)
+        max_queries = budget.get('queries')
+        max_ms = budget.get('ms')
+        duration_ms = duration * 1000
+
+        over_queries = max_queries is not None and stats.queries > max_queries
+        over_time = max_ms is not None and duration_ms > max_ms
+        if over_queries or over_time:
+            logger.warning(
+                f"Request vượt ngân sách: view={view} path={request.path} "
+                f"queries={stats.queries}/{max_queries} "
+                f"time={duration_ms:.1f}ms/{max_ms}ms "
+                f"db={stats.db_seconds * 1000:.1f}ms "
+                f"template={stats.template_seconds * 1000:.1f}ms")
+            return True
+        return False
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Trạng thái routing replica cho từng request (main/db_router.py): đọc
+    cookie ghim primary, và đặt lại cookie khi request có ghi DB. Đặt trước
+    SessionMiddleware để tính cả lần lưu session (vd. đăng nhập).
+    """
+
+    def handle(self, request):
+        if db_router.replica_alias() is None:
+            return self.get_response(request)
+
+        state, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.end_request(token)
+        return self._pin(state, response)
+
+    async def __acall__(self, request):
+        if db_router.replica_alias() is None:
+            return await self.get_response(request)
+
+        # ContextVar được copy sang thread của sync_to_async: ORM thấy state
+        state, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.end_request(token)
+        return self._pin(state, response)
+
+    def _start(self, request):
+        pinned = settings.DATABASE_REPLICA_PIN_COOKIE in request.COOKIES
+        return db_router.start_request(pinned=pinned)
+
+    def _pin(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                settings.DATABASE_REPLICA_PIN_COOKIE, '1',
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
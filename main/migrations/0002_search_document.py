@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:06
+
+import re
+import unicodedata
+
+from django.db import OperationalError, migrations, models
+
+SEARCH_TABLES = (
+    ('main_pitch', 'main_pitch_fts'),
+    ('main_facility', 'main_facility_fts'),
+)
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+# Bản sao cố định của main.search.fold_text / build_document lúc viết
+# migration: sửa main.search về sau không được đổi kết quả migration này.
+def fold_text(value):
+    if not value:
+        return ''
+    value = value.replace('đ', 'd').replace('Đ', 'D')
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return ' '.join(_TOKEN_RE.findall(value.lower()))
+
+
+def build_document(*parts):
+    return ' '.join(filter(None, (fold_text(part) for part in parts)))
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        for _, fts_table in SEARCH_TABLES:
+            try:
+                schema_editor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} "
+                    f"USING fts5(document, tokenize='unicode61', prefix='2 3')")
+            except OperationalError as e:
+                # SQLite build không có FTS5 -> main.search fallback sang contains
+                if 'fts5' not in str(e):
+                    raise
+                return
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, _ in SEARCH_TABLES:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_search_trgm '
+                f'ON {table} USING gin (search_document gin_trgm_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    for table, fts_table in SEARCH_TABLES:
+        if connection.vendor == 'sqlite':
+            schema_editor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+        elif connection.vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_trgm')
+
+
+def populate_search_documents(apps, schema_editor):
+    Facility = apps.get_model('main', 'Facility')
+    Pitch = apps.get_model('main', 'Pitch')
+    is_sqlite = schema_editor.connection.vendor == 'sqlite'
+    fts_tables = schema_editor.connection.introspection.table_names()
+
+    def index(fts_table, row_id, document):
+        if is_sqlite and fts_table in fts_tables:
+            schema_editor.execute(
+                f'INSERT INTO {fts_table}(rowid, document) VALUES (%s, %s)',
+                [row_id, document])
+
+    for facility in Facility.objects.all():
+        document = build_document(facility.name, facility.address)
+        Facility.objects.filter(pk=facility.pk).update(search_document=document)
+        index('main_facility_fts', facility.pk, document)
+
+    for pitch in Pitch.objects.select_related('facility', 'pitch_type'):
+        facility = pitch.facility
+        document = build_document(
+            pitch.name,
+            pitch.pitch_type.name,
+            facility.name if facility else '',
+            facility.address if facility else '',
+        )
+        Pitch.objects.filter(pk=pitch.pk).update(search_document=document)
+        index('main_pitch_fts', pitch.pk, document)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facility',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='pitch',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
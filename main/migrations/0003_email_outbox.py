@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('html_message', models.TextField(blank=True, null=True)),
+                ('from_email', models.CharField(max_length=255)),
+                ('recipient_list', models.JSONField()),
+                ('status', models.CharField(choices=[('Pending', 'Đang chờ gửi'), ('Sent', 'Đã gửi'), ('Failed', 'Gửi thất bại')], default='Pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='main_emailo_status_1b72d5_idx')],
+            },
+        ),
+    ]
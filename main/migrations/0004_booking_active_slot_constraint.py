@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['Pending', 'Confirmed'])), fields=('pitch', 'time_slot', 'booking_date'), name='unique_active_booking_per_slot'),
+        ),
+    ]
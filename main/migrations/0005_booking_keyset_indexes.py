@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_booking_active_slot_constraint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at', 'id'], name='main_bookin_created_ad83cf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_date', 'created_at', 'id'], name='main_bookin_booking_d33ccc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'booking_date', 'created_at', 'id'], name='main_bookin_user_id_35a93e_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:23
+
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+
+def fill_duration_and_price(apps, schema_editor):
+    TimeSlot = apps.get_model('main', 'TimeSlot')
+    PitchTimeSlot = apps.get_model('main', 'PitchTimeSlot')
+
+    today = date.today()
+    for time_slot in TimeSlot.objects.all():
+        seconds = (datetime.combine(today, time_slot.end_time) -
+                   datetime.combine(today, time_slot.start_time)).total_seconds()
+        time_slot.duration_hours = Decimal(seconds / 3600).quantize(Decimal('0.01'))
+        time_slot.save(update_fields=['duration_hours'])
+
+    rows = list(PitchTimeSlot.objects.select_related('pitch', 'time_slot'))
+    for pts in rows:
+        pts.price = (pts.pitch.base_price_per_hour * pts.time_slot.duration_hours).quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP)
+    PitchTimeSlot.objects.bulk_update(rows, ['price'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_booking_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pitchtimeslot',
+            name='price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='timeslot',
+            name='duration_hours',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=4),
+        ),
+        migrations.RunPython(fill_duration_and_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_slot_duration_and_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('pending_count', models.IntegerField(default=0)),
+                ('confirmed_count', models.IntegerField(default=0)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('rejected_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('voucher_discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('voucher_count', models.IntegerField(default=0)),
+                ('facility', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='booking_stats', to='main.facility')),
+                ('pitch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_stats', to='main.pitch')),
+                ('pitch_time_slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='main.pitchtimeslot')),
+                ('time_slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_stats', to='main.timeslot')),
+            ],
+            options={
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['date'], name='main_bookin_date_faafda_idx'), models.Index(fields=['facility', 'date'], name='main_bookin_facilit_6b1daa_idx'), models.Index(fields=['pitch', 'date'], name='main_bookin_pitch_i_e0b568_idx')],
+                'constraints': [models.UniqueConstraint(fields=('pitch_time_slot', 'date'), name='unique_booking_stat_per_slot_day')],
+            },
+        ),
+    ]
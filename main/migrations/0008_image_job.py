@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_booking_daily_stat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_hash', models.CharField(max_length=64)),
+                ('original', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('Pending', 'Đang chờ xử lý'), ('Done', 'Đã xử lý'), ('Failed', 'Xử lý thất bại')], default='Pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('pitch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_jobs', to='main.pitch')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='main_imagej_status_ef98c1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:46
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_review_stats(apps, schema_editor):
+    Pitch = apps.get_model('main', 'Pitch')
+    Review = apps.get_model('main', 'Review')
+
+    rows = Review.objects.order_by().values('pitch').annotate(
+        total=Count('id'),
+        rating_total=Sum('rating'),
+        **{f'star_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+    )
+    for row in rows:
+        Pitch.objects.filter(pk=row['pitch']).update(
+            review_count=row['total'],
+            rating_sum=row['rating_total'],
+            rating_avg=row['rating_total'] / row['total'],
+            **{f'rating_{star}_count': row[f'star_{star}'] for star in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_image_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pitch',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pitch',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pitch',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pitch',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pitch',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pitch',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pitch',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pitch',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='pitch',
+            index=models.Index(fields=['-rating_avg', '-review_count'], name='pitch_rating_idx'),
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,9 @@
 from decimal import Decimal, ROUND_HALF_UP
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from datetime import datetime, date
 
 # ===== User & Roles =====
@@ -21,6 +22,21 @@ class BookingStatus(models.TextChoices):
     CANCELLED = "Cancelled", "Người dùng hủy"
 
 
+ACTIVE_BOOKING_STATUSES = [BookingStatus.PENDING, BookingStatus.CONFIRMED]
+
+
+class EmailStatus(models.TextChoices):
+    PENDING = "Pending", "Đang chờ gửi"
+    SENT = "Sent", "Đã gửi"
+    FAILED = "Failed", "Gửi thất bại"
+
+
+class ImageJobStatus(models.TextChoices):
+    PENDING = "Pending", "Đang chờ xử lý"
+    DONE = "Done", "Đã xử lý"
+    FAILED = "Failed", "Xử lý thất bại"
+
+
 class User(AbstractUser):
     full_name = models.CharField(max_length=255, blank=True)
     phone_number = models.CharField(max_length=20, blank=True)
@@ -45,12 +61,20 @@ class Facility(models.Model):
     name = models.CharField(max_length=255)
     address = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
+    # Tên + địa chỉ đã bỏ dấu, dùng cho tìm kiếm (xem main/search.py)
+    search_document = models.TextField(blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from .search import build_facility_document
+
+        self.search_document = build_facility_document(self)
+        super().save(*args, **kwargs)
+
 
 class PitchType(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -65,6 +89,9 @@ class TimeSlot(models.Model):
     name = models.CharField(max_length=50)  # "7h-9h"
     start_time = models.TimeField()
     end_time = models.TimeField()
+    # Lưu sẵn khi save, PitchTimeSlot.price tính từ cột này
+    duration_hours = models.DecimalField(
+        max_digits=4, decimal_places=2, default=0, editable=False, db_index=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -79,13 +106,22 @@ class TimeSlot(models.Model):
         if self.start_time >= self.end_time:
             raise ValidationError("Giờ bắt đầu phải trước giờ kết thúc")
 
-    def duration_hours(self):
+    def compute_duration_hours(self):
         start = datetime.combine(date.today(), self.start_time)
         end = datetime.combine(date.today(), self.end_time)
         duration_float = (end - start).total_seconds() / 3600
 
         return Decimal(duration_float).quantize(Decimal('0.01'))
 
+    def save(self, *args, **kwargs):
+        duration = self.compute_duration_hours()
+        # duration_hours đang giữ giá trị trong DB -> chỉ tính lại giá khi giờ đổi
+        duration_changed = self.pk is not None and duration != self.duration_hours
+        self.duration_hours = duration
+        super().save(*args, **kwargs)
+        if duration_changed:
+            PitchTimeSlot.refresh_prices(self.pitch_slots.all())
+
 
 class Pitch(models.Model):
     facility = models.ForeignKey(
@@ -102,19 +138,81 @@ class Pitch(models.Model):
     base_price_per_hour = models.DecimalField(max_digits=10, decimal_places=2)
     images = models.JSONField(blank=True, null=True)
     is_available = models.BooleanField(default=True)
+    # Tên sân + loại sân + tên/địa chỉ cơ sở đã bỏ dấu (xem main/search.py)
+    search_document = models.TextField(blank=True, default='', editable=False)
+    # Thống kê review, chỉ đổi bằng UPDATE ... F() khi review thêm/sửa/xoá
+    # (xem main/reviews.py)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    REVIEW_STAT_FIELDS = (
+        'review_count', 'rating_sum', 'rating_1_count', 'rating_2_count',
+        'rating_3_count', 'rating_4_count', 'rating_5_count', 'rating_avg',
+    )
+
+    class Meta:
+        indexes = [
+            # pitch_list sort=rating
+            models.Index(fields=['-rating_avg', '-review_count'], name='pitch_rating_idx'),
+        ]
+
     def __str__(self):
         facility_name = self.facility.name if self.facility else "No Facility"
         return f"{self.name} - {facility_name}"
 
+    @property
+    def rating_histogram(self):
+        """[(số sao, số review, % trên tổng)] từ 5 sao xuống 1 sao"""
+        total = self.review_count or 1
+        histogram = []
+        for star in range(5, 0, -1):
+            count = getattr(self, f'rating_{star}_count')
+            histogram.append((star, count, round(100 * count / total)))
+        return histogram
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Giá lúc load, để save() biết có cần tính lại giá slot không
+        instance._loaded_base_price = instance.__dict__.get('base_price_per_hour')
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .search import build_pitch_document
+
+        self.search_document = build_pitch_document(self)
+        price_changed = (
+            self.pk is not None and
+            self.base_price_per_hour != getattr(self, '_loaded_base_price', None)
+        )
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Không ghi đè thống kê review bằng giá trị cũ trong instance
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.REVIEW_STAT_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        self._loaded_base_price = self.base_price_per_hour
+        if price_changed:
+            PitchTimeSlot.refresh_prices(self.time_slots.all())
+
     def get_available_time_slots(self, booking_date):
         """Chỉ trả về các slot còn trống"""
-        available_slots = []
-        for slot in self.time_slots.filter(is_available=True):
-            if slot.is_available_on_date(booking_date):
-                available_slots.append(slot)
+        from .availability import get_slot_availability
+
+        slots = self.time_slots.filter(
+            is_available=True).select_related('time_slot')
+        availability = get_slot_availability(self, booking_date, slots)
+        available_slots = [
+            slot for slot, is_free in availability.items() if is_free]
         # Cập nhật luôn is_available theo ngày
         self.is_available = len(available_slots) > 0
         return available_slots
@@ -133,6 +231,9 @@ class PitchTimeSlot(models.Model):
         on_delete=models.CASCADE,
         related_name='pitch_slots')
     is_available = models.BooleanField(default=True)
+    # base_price_per_hour x duration_hours, tính lại khi một trong hai đổi
+    price = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -142,9 +243,33 @@ class PitchTimeSlot(models.Model):
     def __str__(self):
         return f"{self.pitch.name} - {self.time_slot.name}"
 
+    def compute_price(self):
+        return (self.pitch.base_price_per_hour * self.time_slot.duration_hours).quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    def save(self, *args, **kwargs):
+        self.price = self.compute_price()
+        super().save(*args, **kwargs)
+
     def get_price(self):
-        """Tính giá tiền cho PitchTimeSlot này"""
-        return self.pitch.base_price_per_hour * self.time_slot.duration_hours()
+        """Giá tiền cho PitchTimeSlot này (đã lưu sẵn)"""
+        return self.price
+
+    @staticmethod
+    def refresh_prices(pitch_time_slots):
+        """Tính lại price cho các slot, chỉ ghi những dòng thay đổi"""
+        changed = []
+        for pts in pitch_time_slots.select_related('pitch', 'time_slot'):
+            price = pts.compute_price()
+            if pts.price != price:
+                pts.price = price
+                changed.append(pts)
+        from .availability import invalidate_pitch
+
+        PitchTimeSlot.objects.bulk_update(changed, ['price'], batch_size=500)
+        for pitch_id in {pts.pitch_id for pts in changed}:
+            invalidate_pitch(pitch_id)
+        return len(changed)
 
     def is_available_on_date(self, booking_date, exclude_booking_id=None):
         """Kiểm tra khung giờ này có còn trống vào ngày booking_date không"""
@@ -243,8 +368,35 @@ class Booking(models.Model):
             models.Index(fields=['pitch', 'booking_date', 'status']),
             models.Index(fields=['user', 'created_at']),
             models.Index(fields=['pitch', 'booking_date', 'time_slot']),
+            # Keyset pagination (admin_booking_list, user_booking_list)
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['booking_date', 'created_at', 'id']),
+            models.Index(fields=['user', 'booking_date', 'created_at', 'id']),
+        ]
+        constraints = [
+            # Mỗi khung giờ của sân chỉ có 1 booking active trong 1 ngày;
+            # DB chặn luôn trường hợp 2 request đặt cùng lúc
+            models.UniqueConstraint(
+                fields=['pitch', 'time_slot', 'booking_date'],
+                condition=models.Q(status__in=ACTIVE_BOOKING_STATUSES),
+                name='unique_active_booking_per_slot',
+            ),
         ]
 
+    # Các trường ảnh hưởng tới BookingDailyStat (xem main/analytics.py)
+    ROLLUP_FIELDS = ('status', 'final_price', 'voucher_id', 'booking_date', 'time_slot_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_rollup_state = instance.rollup_state()
+        return instance
+
+    def rollup_state(self):
+        return {field: self.__dict__.get(field) for field in self.ROLLUP_FIELDS}
+
+    _saving = False
+
     def clean(self):
         errors = {}
         # Chỉ kiểm tra ngày quá khứ nếu booking đang active (Pending/Confirmed)
@@ -253,14 +405,17 @@ class Booking(models.Model):
             if self.booking_date and self.booking_date < date.today():
                 errors['booking_date'] = "Không thể đặt lịch trong quá khứ."
 
-        if self.pitch and self.time_slot:
+        if self.pitch_id and self.time_slot_id:
             # Kiểm tra xem time_slot có thuộc về pitch không
-            if self.time_slot.pitch != self.pitch:
+            if self.time_slot.pitch_id != self.pitch_id:
                 errors['time_slot'] = "Khung giờ không thuộc về sân này."
 
-            # Kiểm tra xem khung giờ còn trống không
-            # Chỉ kiểm tra nếu booking đang active (Pending/Confirmed)
-            if self.status in [BookingStatus.PENDING, BookingStatus.CONFIRMED]:
+            # Kiểm tra xem khung giờ còn trống không (để form báo lỗi sớm)
+            # Chỉ kiểm tra nếu booking đang active (Pending/Confirmed).
+            # Lúc save() thì bỏ qua: constraint unique_active_booking_per_slot
+            # chặn khi ghi, không tốn thêm query
+            if (self.status in [BookingStatus.PENDING, BookingStatus.CONFIRMED]
+                    and not self._saving):
                 if not self.time_slot.is_available_on_date(
                         self.booking_date, exclude_booking_id=self.pk):
                     errors['time_slot'] = "Khung giờ này đã được đặt."
@@ -269,9 +424,11 @@ class Booking(models.Model):
             raise ValidationError(errors)
 
     def save(self, *args, **kwargs):
+        redeem_voucher = False
+
         # Tự động tính duration và final_price từ time_slot
         if self.time_slot:
-            self.duration_hours = self.time_slot.time_slot.duration_hours()
+            self.duration_hours = self.time_slot.time_slot.duration_hours
             base_price = self.time_slot.get_price()
 
             # Áp dụng voucher nếu có
@@ -284,16 +441,44 @@ class Booking(models.Model):
                     Decimal('0.01'),
                     rounding=ROUND_HALF_UP)
 
-                # Tăng used_count của voucher
-                if self.pk is None:  # Chỉ tăng khi tạo mới booking
-                    self.voucher.used_count += 1
-                    self.voucher.save()
+                # Chỉ tăng used_count khi tạo mới booking
+                redeem_voucher = self.pk is None
             else:
                 self.final_price = base_price.quantize(
                     Decimal('0.01'), rounding=ROUND_HALF_UP)
 
-        self.full_clean()
-        super().save(*args, **kwargs)
+        # Constraint slot được DB kiểm tra khi insert, clean() không query
+        # khung giờ trống nữa (xem _saving)
+        self._saving = True
+        try:
+            self.full_clean(validate_constraints=False)
+        finally:
+            self._saving = False
+
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if redeem_voucher:
+                    self._redeem_voucher()
+        except IntegrityError:
+            if self.status in ACTIVE_BOOKING_STATUSES and self.time_slot_id:
+                raise ValidationError(
+                    {'time_slot': "Khung giờ này đã được đặt."})
+            raise
+
+    def _redeem_voucher(self):
+        """
+        Tăng used_count bằng 1 câu UPDATE có điều kiện, không đọc-sửa-ghi.
+        Nếu voucher vừa hết lượt (request khác dùng trước) thì huỷ booking.
+        """
+        updated = Voucher.objects.filter(
+            models.Q(usage_limit__isnull=True) |
+            models.Q(used_count__lt=models.F('usage_limit')),
+            pk=self.voucher_id,
+        ).update(used_count=models.F('used_count') + 1)
+        if not updated:
+            raise ValidationError(
+                {'voucher': "Mã giảm giá không hợp lệ hoặc đã hết hạn."})
 
     def __str__(self):
         return f"{self.pitch.name} - {self.user.username} ({self.booking_date})"
@@ -318,11 +503,33 @@ class Review(models.Model):
     class Meta:
         unique_together = ('user', 'pitch')
         ordering = ['-created_at']
-        indexes = [models.Index(fields=['pitch', 'rating'])]
+        indexes = [
+            models.Index(fields=['pitch', 'rating']),
+            models.Index(fields=['pitch', '-created_at', '-id'], name='review_pitch_recent_idx'),
+        ]
 
     def __str__(self):
         return f"Review by {self.user.username} for {self.pitch.name} - {self.rating} stars"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_review_state = instance.review_state()
+        return instance
+
+    def review_state(self):
+        """(pitch_id, rating): phần ảnh hưởng tới thống kê review của Pitch"""
+        return self.__dict__.get('pitch_id'), self.__dict__.get('rating')
+
+    def save(self, *args, **kwargs):
+        # Signal cập nhật thống kê chạy trong cùng transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
 
 class Comment(models.Model):
     user = models.ForeignKey(
@@ -367,3 +574,112 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f"{self.user.username} favorites {self.pitch.name}"
+
+# ===== Email outbox =====
+
+
+class EmailOutbox(models.Model):
+    """Email chờ gửi, ghi cùng transaction với thay đổi booking"""
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    html_message = models.TextField(blank=True, null=True)
+    from_email = models.CharField(max_length=255)
+    recipient_list = models.JSONField()
+    status = models.CharField(
+        max_length=10,
+        choices=EmailStatus.choices,
+        default=EmailStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipient_list)} ({self.status})"
+
+# ===== Image jobs =====
+
+
+class ImageJob(models.Model):
+    """Ảnh sân chờ sinh thumbnail / bản WebP (worker process_image_jobs)"""
+    pitch = models.ForeignKey(
+        Pitch,
+        on_delete=models.CASCADE,
+        related_name="image_jobs")
+    image_hash = models.CharField(max_length=64)
+    original = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=10,
+        choices=ImageJobStatus.choices,
+        default=ImageJobStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.original} ({self.status})"
+
+# ===== Analytics rollup =====
+
+
+class BookingDailyStat(models.Model):
+    """
+    Tổng hợp booking theo (khung giờ của sân, ngày). Cập nhật tăng dần khi
+    booking đổi trạng thái (main/analytics.py), dựng lại bằng
+    `manage.py rebuild_booking_stats`.
+    """
+    pitch_time_slot = models.ForeignKey(
+        PitchTimeSlot,
+        on_delete=models.CASCADE,
+        related_name='daily_stats')
+    # Denormalize để group theo cơ sở / sân / khung giờ không cần JOIN
+    facility = models.ForeignKey(
+        Facility,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='booking_stats')
+    pitch = models.ForeignKey(
+        Pitch,
+        on_delete=models.CASCADE,
+        related_name='booking_stats')
+    time_slot = models.ForeignKey(
+        TimeSlot,
+        on_delete=models.CASCADE,
+        related_name='booking_stats')
+    date = models.DateField()
+    pending_count = models.IntegerField(default=0)
+    confirmed_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    rejected_count = models.IntegerField(default=0)
+    # Chỉ tính booking đã xác nhận
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    voucher_discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    voucher_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['pitch_time_slot', 'date'],
+                name='unique_booking_stat_per_slot_day'),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['facility', 'date']),
+            models.Index(fields=['pitch', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.pitch_time_slot_id} @ {self.date}"
@@ -0,0 +1,140 @@
+"""
+Email outbox: request chỉ ghi email vào bảng EmailOutbox (cùng transaction
+với booking), worker `manage.py send_queued_emails` gửi sau qua một kết nối
+SMTP dùng chung và retry với backoff.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from . import constants
+from .models import EmailOutbox, EmailStatus
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(subject, message, recipient_list, html_message=None, from_email=None):
+    """Ghi email vào outbox. Nếu đang trong transaction, email chỉ tồn tại khi commit."""
+    return EmailOutbox.objects.create(
+        subject=subject,
+        message=message,
+        html_message=html_message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipient_list=list(recipient_list),
+    )
+
+
+def enqueue_emails(emails):
+    """
+    Ghi nhiều email vào outbox bằng một câu INSERT (bulk_create).
+
+    Args:
+        emails: iterable dict có subject, message, recipient_list
+            (tuỳ chọn html_message, from_email)
+    """
+    return EmailOutbox.objects.bulk_create([
+        EmailOutbox(
+            subject=email['subject'],
+            message=email['message'],
+            html_message=email.get('html_message'),
+            from_email=email.get('from_email') or settings.DEFAULT_FROM_EMAIL,
+            recipient_list=list(email['recipient_list']),
+        )
+        for email in emails
+    ])
+
+
+def _build_message(email, connection):
+    msg = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.message,
+        from_email=email.from_email,
+        to=email.recipient_list,
+        connection=connection,
+    )
+    if email.html_message:
+        msg.attach_alternative(email.html_message, "text/html")
+    return msg
+
+
+def _retry_delay(attempts):
+    delay = constants.EMAIL_OUTBOX_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+    return timedelta(seconds=min(delay, constants.EMAIL_OUTBOX_RETRY_MAX_SECONDS))
+
+
+def _claim_batch(batch_size):
+    """
+    Lấy batch email đến hạn và đẩy next_attempt_at ra sau thời gian lease
+    để worker khác không lấy trùng trong lúc đang gửi.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+                status=EmailStatus.PENDING,
+                next_attempt_at__lte=now,
+            ).order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        EmailOutbox.objects.filter(id__in=[e.id for e in emails]).update(
+            next_attempt_at=now + timedelta(
+                seconds=constants.EMAIL_OUTBOX_LEASE_SECONDS))
+    return emails
+
+
+def _mark_failed(email, error, now):
+    email.last_error = str(error)
+    if email.attempts >= constants.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = EmailStatus.FAILED
+        logger.error(f"Email #{email.id} gửi thất bại sau {email.attempts} lần: {error}")
+    else:
+        email.next_attempt_at = now + _retry_delay(email.attempts)
+        logger.warning(f"Email #{email.id} lỗi, thử lại lúc {email.next_attempt_at}: {error}")
+
+
+def deliver_pending(batch_size=constants.EMAIL_OUTBOX_BATCH_SIZE, connection=None):
+    """
+    Gửi một batch email đến hạn qua một kết nối SMTP.
+
+    Returns:
+        tuple: (số email gửi thành công, số email lỗi)
+    """
+    emails = _claim_batch(batch_size)
+    if not emails:
+        return 0, 0
+
+    connection = connection or get_connection(fail_silently=False)
+    sent = failed = 0
+    now = timezone.now()
+
+    try:
+        connection.open()
+    except Exception as e:
+        for email in emails:
+            email.attempts += 1
+            _mark_failed(email, e, now)
+        failed = len(emails)
+    else:
+        try:
+            for email in emails:
+                email.attempts += 1
+                try:
+                    connection.send_messages([_build_message(email, connection)])
+                except Exception as e:
+                    failed += 1
+                    _mark_failed(email, e, now)
+                else:
+                    sent += 1
+                    email.status = EmailStatus.SENT
+                    email.sent_at = timezone.now()
+                    email.last_error = ''
+        finally:
+            connection.close()
+
+    EmailOutbox.objects.bulk_update(
+        emails,
+        ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return sent, failed
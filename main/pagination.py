@@ -0,0 +1,126 @@
+"""
+Keyset (seek) pagination: thay OFFSET/COUNT(*) bằng điều kiện
+WHERE (k1, k2, ...) < (v1, v2, ...) trên index tương ứng, nên trang sâu
+vẫn nhanh như trang đầu.
+
+Cursor là chuỗi ký bằng django.core.signing, client không đọc/sửa được.
+"""
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'main.pagination.cursor'
+DIRECTION_NEXT = 'n'
+DIRECTION_PREV = 'p'
+
+
+def _split_key(key):
+    return (key[1:], True) if key.startswith('-') else (key, False)
+
+
+def _seek_filter(keys, values, forward):
+    """
+    Dựng Q cho (k1, k2, ...) đứng sau (v1, v2, ...) theo thứ tự keys.
+    forward=False đảo chiều so sánh (lấy trang trước).
+    """
+    condition = Q()
+    equal_prefix = Q()
+    for key, value in zip(keys, values):
+        field, descending = _split_key(key)
+        after = descending == forward  # desc + forward -> lấy giá trị nhỏ hơn
+        lookup = f'{field}__lt' if after else f'{field}__gt'
+        condition |= equal_prefix & Q(**{lookup: value})
+        equal_prefix &= Q(**{field: value})
+    return condition
+
+
+def _reverse_keys(keys):
+    return [key[1:] if key.startswith('-') else f'-{key}' for key in keys]
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+
+class KeysetPaginator:
+    """
+    Usage:
+        paginator = KeysetPaginator(queryset, ['-created_at', '-id'], 20)
+        page = paginator.page(request.GET.get('cursor'))
+    """
+
+    def __init__(self, queryset, keys, per_page):
+        self.queryset = queryset
+        self.keys = list(keys)
+        self.per_page = per_page
+        self._fields = [
+            queryset.model._meta.get_field(_split_key(key)[0]) for key in self.keys
+        ]
+
+    def _encode(self, obj, direction):
+        values = [
+            field.value_to_string(obj) for field in self._fields
+        ]
+        return signing.dumps({'v': values, 'd': direction}, salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            values = [
+                field.to_python(value) for field, value in zip(self._fields, data['v'])
+            ]
+            if len(values) != len(self._fields) or data['d'] not in (DIRECTION_NEXT, DIRECTION_PREV):
+                return None, DIRECTION_NEXT
+            return values, data['d']
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None, DIRECTION_NEXT
+
+    def page(self, cursor=None):
+        values, direction = self._decode(cursor) if cursor else (None, DIRECTION_NEXT)
+        forward = direction == DIRECTION_NEXT
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(_seek_filter(self.keys, values, forward))
+        order = self.keys if forward else _reverse_keys(self.keys)
+        rows = list(queryset.order_by(*order)[:self.per_page + 1])
+
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            has_next, has_previous = True, has_more
+
+        return KeysetPage(
+            rows,
+            has_next=has_next,
+            has_previous=has_previous,
+            next_cursor=self._encode(rows[-1], DIRECTION_NEXT) if rows and has_next else None,
+            previous_cursor=self._encode(rows[0], DIRECTION_PREV) if rows and has_previous else None,
+        )
@@ -0,0 +1,147 @@
+"""
+Cache dữ liệu tham chiếu (PitchType, TimeSlot, Facility): vài tháng mới
+đổi một lần nhưng trang nào cũng đọc.
+
+Hai tầng:
+- dict trong process: không tốn cả round-trip tới cache backend
+- cache dùng chung (CACHES['default']: locmem, file, redis...)
+
+Mỗi bảng có một version key trong cache dùng chung. Signal post_save /
+post_delete tăng version (ngay lập tức và sau commit), process khác thấy
+version mới ở lần đọc kế tiếp và nạp lại.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import constants
+
+PITCH_TYPES = 'pitch_types'
+TIME_SLOTS = 'time_slots'
+FACILITIES = 'facilities'
+
+# {name: (version, data)}
+_local = {}
+
+
+def _load_pitch_types():
+    from .models import PitchType
+    return tuple(PitchType.objects.all())
+
+
+def _load_time_slots():
+    from .models import TimeSlot
+    return {ts.id: ts for ts in TimeSlot.objects.all()}
+
+
+def _load_facilities():
+    from .models import Facility
+    return tuple(Facility.objects.all())
+
+
+_LOADERS = {
+    PITCH_TYPES: _load_pitch_types,
+    TIME_SLOTS: _load_time_slots,
+    FACILITIES: _load_facilities,
+}
+
+
+def _key(name, suffix):
+    return f'{constants.REFDATA_CACHE_PREFIX}:{name}:{suffix}'
+
+
+def _current_version(name):
+    key = _key(name, 'version')
+    version = cache.get(key)
+    if version is None:
+        # Mốc thời gian thay vì 1: key version bị evict cũng không quay về
+        # một version cũ mà process khác còn giữ trong _local
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def version(name):
+    """Version hiện tại của bảng (dùng làm một phần ETag / cache key)"""
+    return _current_version(name)
+
+
+async def aversion(name):
+    """Bản async của version() cho view async (cache.aget / aadd)"""
+    key = _key(name, 'version')
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def get(name):
+    version = _current_version(name)
+    entry = _local.get(name)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    data_key = _key(name, version)
+    data = cache.get(data_key)
+    if data is None:
+        data = _LOADERS[name]()
+        cache.set(data_key, data, timeout=constants.REFDATA_CACHE_TIMEOUT)
+    _local[name] = (version, data)
+    return data
+
+
+def _bump(name):
+    key = _key(name, 'version')
+    now = int(time.time() * 1000)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        cache.add(key, now, timeout=None)
+    else:
+        # Version luôn >= mốc thời gian thay đổi: dùng được làm Last-Modified
+        # (availability.slots_version), incr vẫn giữ tăng khi bump cùng ms
+        if version < now:
+            cache.set(key, now, timeout=None)
+    _local.pop(name, None)
+
+
+def invalidate(name):
+    """
+    Tăng version ngay (cùng process đọc lại được luôn) và thêm lần nữa sau
+    commit, để process khác không kịp cache lại dữ liệu trước commit.
+    """
+    _bump(name)
+    transaction.on_commit(lambda: _bump(name))
+
+
+def get_pitch_types():
+    return get(PITCH_TYPES)
+
+
+def get_time_slots():
+    """{time_slot_id: TimeSlot}"""
+    return get(TIME_SLOTS)
+
+
+def get_facilities():
+    return get(FACILITIES)
+
+
+def with_time_slots(pitch_time_slots, key=None):
+    """
+    Gắn TimeSlot từ cache vào từng PitchTimeSlot (thay cho
+    select_related('time_slot')) rồi sắp theo giờ bắt đầu hoặc theo key.
+    """
+    time_slots = get_time_slots()
+    if hasattr(pitch_time_slots, 'order_by'):
+        # Bỏ ordering mặc định (time_slot__start_time) để khỏi JOIN
+        pitch_time_slots = pitch_time_slots.order_by()
+    rows = list(pitch_time_slots)
+    for pts in rows:
+        time_slot = time_slots.get(pts.time_slot_id)
+        if time_slot is not None:
+            pts.time_slot = time_slot
+    rows.sort(key=key or (lambda pts: pts.time_slot.start_time))
+    return rows
@@ -0,0 +1,164 @@
+"""
+Thống kê review trên Pitch (review_count, rating_sum, số review từng mức
+sao, rating_avg) được cộng dồn khi review thêm/sửa/xoá thay vì aggregate
+bảng Review cho từng card.
+
+Mọi thay đổi là một câu UPDATE ... SET x = x + delta trên dòng Pitch nên
+hai review cùng lúc không ghi đè nhau; rating_avg tính lại trong chính câu
+UPDATE đó từ giá trị mới.
+
+Trang đặt sân tải review theo keyset cursor (created_at, id), bình
+luận của cả trang review lấy bằng một query rồi dựng cây trong bộ nhớ nên
+số query không phụ thuộc số review hay độ sâu của thread.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from . import constants
+from .models import Comment, Pitch, Review
+from .pagination import KeysetPaginator
+
+
+def _deltas(rating, sign):
+    return Counter({
+        'review_count': sign,
+        'rating_sum': sign * rating,
+        f'rating_{rating}_count': sign,
+    })
+
+
+def _apply(pitch_id, deltas):
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    new_count = F('review_count') + deltas.get('review_count', 0)
+    new_sum = F('rating_sum') + deltas.get('rating_sum', 0)
+    updates['rating_avg'] = Coalesce(
+        Cast(new_sum, FloatField()) / NullIf(new_count, 0),
+        Value(0.0),
+        output_field=FloatField())
+    Pitch.objects.filter(pk=pitch_id).update(**updates)
+
+
+def record_review_change(review, old_state=None, deleted=False):
+    """
+    Cập nhật thống kê của sân theo thay đổi của review.
+
+    Args:
+        old_state: Review.review_state() trước khi lưu (None nếu tạo mới)
+        deleted: review vừa bị xoá -> chỉ trừ phần cũ
+    """
+    new_state = None if deleted else review.review_state()
+    if old_state == new_state:
+        return
+
+    per_pitch = defaultdict(Counter)
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state and state[0] and state[1]:
+            per_pitch[state[0]].update(_deltas(state[1], sign))
+    for pitch_id, deltas in per_pitch.items():
+        _apply(pitch_id, deltas)
+
+
+def rebuild_pitch_stats():
+    """Tính lại thống kê review cho mọi sân từ bảng Review. Trả về số sân."""
+    stats = {
+        row['pitch']: row
+        for row in Review.objects.order_by().values('pitch').annotate(
+            total=Count('id'),
+            rating_total=Sum('rating'),
+            **{f'star_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+        )
+    }
+    pitches = list(Pitch.objects.only('id', *Pitch.REVIEW_STAT_FIELDS))
+    for pitch in pitches:
+        row = stats.get(pitch.id)
+        pitch.review_count = row['total'] if row else 0
+        pitch.rating_sum = row['rating_total'] if row else 0
+        for star in range(1, 6):
+            setattr(pitch, f'rating_{star}_count', row[f'star_{star}'] if row else 0)
+        pitch.rating_avg = pitch.rating_sum / pitch.review_count if pitch.review_count else 0
+    with transaction.atomic():
+        Pitch.objects.bulk_update(pitches, Pitch.REVIEW_STAT_FIELDS, batch_size=500)
+    return len(pitches)
+
+
+# ===== Danh sách review trên trang đặt sân =====
+
+def _flatten(roots, children):
+    """Duyệt cây theo chiều sâu bằng stack (không đệ quy, thread sâu bao nhiêu cũng được)"""
+    thread = []
+    stack = [(comment, 0) for comment in reversed(roots)]
+    while stack:
+        comment, depth = stack.pop()
+        comment.depth = depth
+        comment.indent = min(depth, constants.COMMENT_MAX_INDENT_DEPTH)
+        thread.append(comment)
+        stack.extend((reply, depth + 1) for reply in reversed(children.get(comment.id, ())))
+    return thread
+
+
+def attach_comment_threads(reviews):
+    """
+    Gắn review.thread: list bình luận theo thứ tự duyệt cây (cha trước,
+    trả lời ngay sau), mỗi bình luận có .depth. Một query cho cả trang.
+    """
+    reviews = list(reviews)
+    children = defaultdict(list)
+    roots = defaultdict(list)
+    comments = Comment.objects.filter(
+        review__in=[review.id for review in reviews],
+    ).select_related('user').order_by('created_at', 'id')
+    for comment in comments:
+        if comment.parent_comment_id:
+            children[comment.parent_comment_id].append(comment)
+        else:
+            roots[comment.review_id].append(comment)
+    for review in reviews:
+        review.thread = _flatten(roots[review.id], children)
+    return reviews
+
+
+def review_page(pitch, cursor=None):
+    """
+    Một trang review (mới nhất trước) của sân, kèm thread bình luận.
+
+    Args:
+        cursor: next_cursor của trang trước (None / sai chữ ký = trang đầu)
+
+    Returns:
+        KeysetPage: review.thread đã được gắn
+    """
+    paginator = KeysetPaginator(
+        Review.objects.filter(pitch=pitch).select_related('user'),
+        constants.REVIEW_KEYSET_ORDER,
+        constants.REVIEWS_PER_PAGE)
+    page = paginator.page(cursor)
+    attach_comment_threads(page.object_list)
+    return page
+
+
+def serialize_review(review):
+    return {
+        'id': review.id,
+        'user': review.user.full_name or review.user.username,
+        'rating': review.rating,
+        'content': review.content,
+        'created_at': review.created_at.strftime('%d/%m/%Y'),
+        'comments': [
+            {
+                'id': comment.id,
+                'parent_id': comment.parent_comment_id,
+                'user': comment.user.full_name or comment.user.username,
+                'content': comment.content,
+                'created_at': comment.created_at.strftime('%d/%m/%Y'),
+                'depth': comment.depth,
+                'indent': comment.indent,
+            }
+            for comment in review.thread
+        ],
+    }
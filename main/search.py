@@ -0,0 +1,196 @@
+"""
+Tìm kiếm sân/cơ sở trên search_document đã bỏ dấu.
+
+- SQLite: bảng FTS5 (main_pitch_fts, main_facility_fts), rowid = id bản ghi,
+  prefix search + xếp hạng bm25.
+- PostgreSQL: GIN trigram index trên search_document, xếp hạng bằng
+  word_similarity.
+- Backend khác: lọc contains trên cột search_document (không join).
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+PITCH_FTS_TABLE = 'main_pitch_fts'
+FACILITY_FTS_TABLE = 'main_facility_fts'
+
+_TOKEN_RE = re.compile(r'\w+')
+_fts_available = {}
+
+
+def fold_text(value):
+    """Bỏ dấu tiếng Việt, chuyển thường: 'Sân Hoà Khánh' -> 'san hoa khanh'"""
+    if not value:
+        return ''
+    value = value.replace('đ', 'd').replace('Đ', 'D')
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return ' '.join(_TOKEN_RE.findall(value.lower()))
+
+
+def build_document(*parts):
+    return ' '.join(filter(None, (fold_text(part) for part in parts)))
+
+
+def build_pitch_document(pitch):
+    facility = pitch.facility
+    return build_document(
+        pitch.name,
+        pitch.pitch_type.name if pitch.pitch_type_id else '',
+        facility.name if facility else '',
+        facility.address if facility else '',
+    )
+
+
+def build_facility_document(facility):
+    return build_document(facility.name, facility.address)
+
+
+# ===== Index maintenance =====
+
+def _use_fts():
+    """Chỉ dùng FTS5 khi migration đã tạo được bảng (SQLite có FTS5)"""
+    if connection.vendor != 'sqlite':
+        return False
+    db_name = connection.settings_dict['NAME']
+    if db_name not in _fts_available:
+        _fts_available[db_name] = (
+            PITCH_FTS_TABLE in connection.introspection.table_names())
+    return _fts_available[db_name]
+
+
+def _index_row(table, row_id, document):
+    if not _use_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [row_id])
+        cursor.execute(
+            f'INSERT INTO {table}(rowid, document) VALUES (%s, %s)',
+            [row_id, document])
+
+
+def _unindex_row(table, row_id):
+    if not _use_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [row_id])
+
+
+def index_pitch(pitch):
+    _index_row(PITCH_FTS_TABLE, pitch.pk, pitch.search_document)
+
+
+def unindex_pitch(pitch_id):
+    _unindex_row(PITCH_FTS_TABLE, pitch_id)
+
+
+def index_facility(facility):
+    _index_row(FACILITY_FTS_TABLE, facility.pk, facility.search_document)
+
+
+def unindex_facility(facility_id):
+    _unindex_row(FACILITY_FTS_TABLE, facility_id)
+
+
+def refresh_pitch_documents(pitches):
+    """
+    Cập nhật lại search_document cho các sân khi cơ sở / loại sân
+    của chúng đổi tên (không gọi Pitch.save() để tránh auto_now).
+    """
+    from .models import Pitch
+
+    for pitch in pitches.select_related('facility', 'pitch_type'):
+        document = build_pitch_document(pitch)
+        if document != pitch.search_document:
+            Pitch.objects.filter(pk=pitch.pk).update(search_document=document)
+            pitch.search_document = document
+        index_pitch(pitch)
+
+
+def sync_fts_tables():
+    """
+    Nạp lại bảng FTS từ cột search_document bằng 1 câu INSERT ... SELECT
+    cho mỗi bảng (dùng sau bulk_create / update hàng loạt).
+    """
+    if not _use_fts():
+        return
+    with connection.cursor() as cursor:
+        for table, fts_table in (
+                ('main_pitch', PITCH_FTS_TABLE),
+                ('main_facility', FACILITY_FTS_TABLE)):
+            cursor.execute(f'DELETE FROM {fts_table}')
+            cursor.execute(
+                f'INSERT INTO {fts_table}(rowid, document) '
+                f'SELECT id, search_document FROM {table}')
+
+
+def rebuild_index():
+    """Dựng lại toàn bộ search_document và bảng FTS"""
+    from .models import Facility, Pitch
+
+    for facility in Facility.objects.all():
+        document = build_facility_document(facility)
+        if document != facility.search_document:
+            Facility.objects.filter(pk=facility.pk).update(search_document=document)
+
+    for pitch in Pitch.objects.select_related('facility', 'pitch_type'):
+        document = build_pitch_document(pitch)
+        if document != pitch.search_document:
+            Pitch.objects.filter(pk=pitch.pk).update(search_document=document)
+
+    sync_fts_tables()
+
+
+# ===== Query =====
+
+def _fts_match_expression(tokens):
+    # Mỗi token là prefix query, các token nối AND
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _fts_filter(queryset, table, tokens):
+    """
+    Lọc + xếp hạng bằng subquery FTS ngay trong query của queryset: các
+    bộ lọc, ORDER BY và phân trang phía sau áp lên toàn bộ kết quả khớp.
+    """
+    match = _fts_match_expression(tokens)
+    meta = queryset.model._meta
+    pk_column = f'{connection.ops.quote_name(meta.db_table)}.{connection.ops.quote_name(meta.pk.column)}'
+    # bm25 càng nhỏ càng liên quan -> đổi dấu để rank lớn = tốt hơn
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match]),
+    ).annotate(search_rank=RawSQL(
+        f'SELECT -bm25({table}) FROM {table} WHERE {table} MATCH %s AND rowid = {pk_column}',
+        [match], output_field=FloatField()))
+
+
+def _search(queryset, table, query):
+    tokens = fold_text(query).split()
+    if not tokens:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    if _use_fts():
+        return _fts_filter(queryset, table, tokens)
+
+    for token in tokens:
+        queryset = queryset.filter(search_document__contains=token)
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        return queryset.annotate(
+            search_rank=TrigramWordSimilarity(' '.join(tokens), 'search_document'))
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def search_pitches(queryset, query):
+    """Lọc queryset Pitch theo từ khoá, annotate search_rank (lớn = liên quan hơn)"""
+    return _search(queryset, PITCH_FTS_TABLE, query)
+
+
+def search_facilities(queryset, query):
+    """Lọc queryset Facility theo từ khoá, annotate search_rank"""
+    return _search(queryset, FACILITY_FTS_TABLE, query)
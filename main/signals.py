@@ -0,0 +1,126 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import analytics, availability, refdata, reviews, search, vouchers
+from .models import Booking, Facility, Pitch, PitchTimeSlot, PitchType, Review, TimeSlot, Voucher
+
+
+# ===== Search index =====
+
+@receiver(post_save, sender=Pitch)
+def index_pitch_on_save(sender, instance, **kwargs):
+    search.index_pitch(instance)
+
+
+@receiver(post_delete, sender=Pitch)
+def unindex_pitch_on_delete(sender, instance, **kwargs):
+    search.unindex_pitch(instance.pk)
+
+
+@receiver(post_save, sender=Facility)
+def index_facility_on_save(sender, instance, created, **kwargs):
+    search.index_facility(instance)
+    if not created:
+        # Tài liệu của sân chứa tên/địa chỉ cơ sở
+        search.refresh_pitch_documents(instance.pitches.all())
+
+
+@receiver(post_delete, sender=Facility)
+def unindex_facility_on_delete(sender, instance, **kwargs):
+    search.unindex_facility(instance.pk)
+
+
+@receiver(post_save, sender=PitchType)
+def refresh_pitches_on_pitch_type_save(sender, instance, created, **kwargs):
+    if not created:
+        search.refresh_pitch_documents(instance.pitches.all())
+
+
+# ===== Reference data cache =====
+
+@receiver(post_save, sender=PitchType)
+@receiver(post_delete, sender=PitchType)
+def invalidate_pitch_types(sender, **kwargs):
+    refdata.invalidate(refdata.PITCH_TYPES)
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def invalidate_time_slots(sender, **kwargs):
+    refdata.invalidate(refdata.TIME_SLOTS)
+
+
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+def invalidate_facilities(sender, **kwargs):
+    refdata.invalidate(refdata.FACILITIES)
+
+
+@receiver(post_save, sender=Voucher)
+def forget_missing_voucher(sender, instance, **kwargs):
+    # Xoá cả sau commit: request khác có thể vừa cache "không tồn tại" trước commit
+    vouchers.forget_missing(instance.code)
+    transaction.on_commit(lambda: vouchers.forget_missing(instance.code))
+
+
+# ===== Cache AJAX khung giờ =====
+# Đăng ký trước rollup: cần _loaded_rollup_state trước khi rollup ghi đè
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_availability(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    availability.invalidate_date(instance.pitch_id, instance.booking_date)
+    old_state = getattr(instance, '_loaded_rollup_state', None)
+    if old_state and old_state['booking_date'] != instance.booking_date:
+        availability.invalidate_date(instance.pitch_id, old_state['booking_date'])
+
+
+@receiver(post_save, sender=Pitch)
+@receiver(post_save, sender=PitchTimeSlot)
+@receiver(post_delete, sender=PitchTimeSlot)
+def invalidate_pitch_availability(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    availability.invalidate_pitch(instance.pk if sender is Pitch else instance.pitch_id)
+
+
+# ===== Analytics rollup =====
+
+@receiver(post_save, sender=Booking)
+def update_booking_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = None if created else getattr(instance, '_loaded_rollup_state', None)
+    if created or old_state is not None:
+        analytics.record_booking_change(instance, old_state)
+    # Không biết trạng thái cũ (instance tự dựng, không load từ DB):
+    # bỏ qua, `rebuild_booking_stats` sẽ sửa lại
+    instance._loaded_rollup_state = instance.rollup_state()
+
+
+@receiver(post_delete, sender=Booking)
+def update_booking_stats_on_delete(sender, instance, **kwargs):
+    old_state = getattr(instance, '_loaded_rollup_state', None) or instance.rollup_state()
+    analytics.record_booking_change(instance, old_state, deleted=True)
+
+
+# ===== Review stats =====
+
+@receiver(post_save, sender=Review)
+def update_review_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = None if created else getattr(instance, '_loaded_review_state', None)
+    if created or old_state is not None:
+        reviews.record_review_change(instance, old_state)
+    # Không biết trạng thái cũ: bỏ qua, `rebuild_review_stats` sẽ sửa lại
+    instance._loaded_review_state = instance.review_state()
+
+
+@receiver(post_delete, sender=Review)
+def update_review_stats_on_delete(sender, instance, **kwargs):
+    old_state = getattr(instance, '_loaded_review_state', None) or instance.review_state()
+    reviews.record_review_change(instance, old_state, deleted=True)
@@ -0,0 +1,293 @@
+"""
+Đẩy trạng thái khung giờ (sân, ngày) tới trang đặt sân qua Server-Sent
+Events: booking được tạo / huỷ / duyệt / từ chối thì client đang xem ngày
+đó nhận ngay danh sách slot mới, không phải đợi POST lỗi mới biết.
+
+- Pub/sub trong process: mỗi kết nối là một Subscriber (coroutine chờ
+  asyncio.Event, không chiếm thread). availability.invalidate_* gọi
+  publish() sau commit, payload dựng một lần cho mỗi (sân, ngày) rồi đẩy
+  sang event loop bằng call_soon_threadsafe.
+- Nhiều process / nhiều máy: cache dùng chung làm broker thay thế. Cứ
+  SLOT_EVENTS_HEARTBEAT_SECONDS giây không có event, stream so version
+  (sân, ngày) trong cache, đổi thì gửi trạng thái mới.
+- Event chứa toàn bộ trạng thái và id = ETag của AJAX khung giờ: client
+  kết nối lại với Last-Event-ID trùng version hiện tại thì không gửi lại.
+
+Chạy dưới ASGI (PitchManager/asgi.py): route() phục vụ URL stream trực tiếp,
+không qua middleware Django (Host vẫn được kiểm tra theo ALLOWED_HOSTS). ASGIHandler giữ một thread executor cho mỗi
+request tới khi response stream xong, nên đi qua Django thì vẫn tốn một
+thread cho mỗi client. View slot_events_stream chỉ là đường dự phòng cho
+runserver / WSGI: trả một snapshot rồi đóng để EventSource poll lại.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http.request import split_domain_port, validate_host
+from django.urls import NoReverseMatch, Resolver404, resolve, reverse
+
+from . import availability, constants
+
+logger = logging.getLogger(__name__)
+
+URL_NAME = 'slot_events_stream'
+CONTENT_TYPE = 'text/event-stream; charset=utf-8'
+HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+_subscribers = defaultdict(set)  # (pitch_id, booking_date) -> {Subscriber}
+_lock = threading.Lock()
+
+
+class Subscriber:
+    """Một kết nối SSE. Chỉ giữ trạng thái mới nhất chưa gửi."""
+    __slots__ = ('loop', 'ready', 'pending')
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+        self.pending = None
+
+    def push(self, message):
+        """Gọi từ thread bất kỳ"""
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, message)
+        except RuntimeError:
+            pass  # event loop đã đóng, stream sẽ tự unsubscribe
+
+    def _deliver(self, message):
+        self.pending = message
+        self.ready.set()
+
+    async def wait(self, timeout):
+        """(etag, event) mới nhất, None nếu hết timeout"""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.ready.clear()
+        message, self.pending = self.pending, None
+        return message
+
+
+def subscribe(pitch_id, booking_date):
+    subscriber = Subscriber()
+    with _lock:
+        _subscribers[(pitch_id, booking_date)].add(subscriber)
+    return subscriber
+
+
+def unsubscribe(pitch_id, booking_date, subscriber):
+    key = (pitch_id, booking_date)
+    with _lock:
+        subscribers = _subscribers.get(key)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del _subscribers[key]
+
+
+def subscriber_count(pitch_id=None):
+    with _lock:
+        return sum(
+            len(subscribers) for (key_pitch_id, _), subscribers in _subscribers.items()
+            if pitch_id is None or key_pitch_id == pitch_id)
+
+
+def format_event(etag, data):
+    return f'id: {etag}\nevent: slots\ndata: {json.dumps(data)}\n\n'
+
+
+def publish(pitch_id, booking_date=None):
+    """
+    Gửi trạng thái mới cho client của sân (một ngày, hoặc mọi ngày nếu
+    booking_date None). Gọi sau commit, không có ai nghe thì không query.
+    """
+    with _lock:
+        targets = {
+            key: list(subscribers) for key, subscribers in _subscribers.items()
+            if key[0] == pitch_id and (booking_date is None or key[1] == booking_date)
+        }
+    for (key_pitch_id, key_date), subscribers in targets.items():
+        try:
+            etag, data = availability.slots_payload(key_pitch_id, key_date)
+        except Exception as e:
+            # Không làm hỏng request đã commit, client tự đồng bộ ở heartbeat
+            logger.error(f"Không dựng được SSE khung giờ sân #{key_pitch_id} ngày {key_date}: {e}")
+            continue
+        message = (etag, format_event(etag, data))
+        for subscriber in subscribers:
+            subscriber.push(message)
+
+
+def _db(func):
+    """
+    Như channels database_sync_to_async: chạy trong thread pool dùng chung
+    (không giữ thread riêng cho mỗi kết nối), dọn kết nối DB trước / sau.
+    """
+    def run(*args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def parse_date(value):
+    """Ngày trong query string, None nếu sai định dạng hoặc ngoài cửa sổ đặt sân"""
+    try:
+        booking_date = datetime.strptime(value or '', '%Y-%m-%d').date()
+    except ValueError:
+        return None
+    return booking_date if availability.in_booking_window(booking_date) else None
+
+
+async def pitch_exists(pitch_id):
+    return await _db(availability.pitch_exists)(pitch_id)
+
+
+def snapshot(pitch_id, booking_date, last_event_id=None):
+    """
+    Generator sync cho view dự phòng (WSGI): retry + trạng thái hiện tại
+    (bỏ qua nếu client đã có version này) rồi kết thúc.
+    """
+    yield f'retry: {constants.SLOT_EVENTS_FALLBACK_RETRY_MS}\n\n'
+    etag, data = availability.slots_payload(pitch_id, booking_date)
+    if etag != last_event_id:
+        yield format_event(etag, data)
+
+
+async def stream(pitch_id, booking_date, last_event_id=None):
+    """
+    Async iterator các chunk SSE của (sân, ngày): trạng thái hiện tại rồi
+    mỗi lần thay đổi, comment keep-alive khi rảnh. Chạy tới khi client ngắt.
+    """
+    # Đăng ký trước khi đọc trạng thái: thay đổi xen giữa không bị lỡ
+    subscriber = subscribe(pitch_id, booking_date)
+    try:
+        yield f'retry: {constants.SLOT_EVENTS_RETRY_MS}\n\n'
+        etag, data = await _db(availability.slots_payload)(pitch_id, booking_date)
+        if etag != last_event_id:
+            yield format_event(etag, data)
+
+        while True:
+            message = await subscriber.wait(constants.SLOT_EVENTS_HEARTBEAT_SECONDS)
+            if message is None:
+                current, _ = await _db(availability.slots_version)(pitch_id, booking_date)
+                if current == etag:
+                    yield ': keep-alive\n\n'
+                    continue
+                current, data = await _db(availability.slots_payload)(pitch_id, booking_date)
+                message = (current, format_event(current, data))
+            if message[0] != etag:
+                etag = message[0]
+                yield message[1]
+    finally:
+        unsubscribe(pitch_id, booking_date, subscriber)
+
+
+# ===== ASGI =====
+
+async def _send_text(send, status, text):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+    })
+    await send({'type': 'http.response.body', 'body': text.encode()})
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _pump(events, send):
+    async for chunk in events:
+        await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+
+
+def _host_allowed(headers):
+    """Như HttpRequest.get_host(): route() chạy trước middleware nên tự kiểm tra"""
+    host = headers.get(b'host', b'')
+    if settings.USE_X_FORWARDED_HOST:
+        host = headers.get(b'x-forwarded-host', host).split(b',')[0].strip()
+    domain, _ = split_domain_port(host.decode('latin-1'))
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = ['.localhost', '127.0.0.1', '[::1]']
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+
+async def serve(scope, receive, send, pitch_id):
+    """Phục vụ một kết nối SSE trực tiếp trên ASGI"""
+    headers = dict(scope.get('headers', []))
+    if not _host_allowed(headers):
+        return await _send_text(send, 400, 'Bad Request')
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    booking_date = parse_date(query.get('date', [''])[0])
+    if booking_date is None:
+        return await _send_text(send, 400, 'Invalid or out-of-range date')
+    if not await pitch_exists(pitch_id):
+        return await _send_text(send, 404, 'Not found')
+
+    last_event_id = headers.get(b'last-event-id', b'').decode('latin-1') or None
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', CONTENT_TYPE.encode())] + [
+            (name.lower().encode(), value.encode()) for name, value in HEADERS.items()],
+    })
+
+    events = stream(pitch_id, booking_date, last_event_id)
+    pump = asyncio.ensure_future(_pump(events, send))
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await asyncio.wait({pump, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pump, disconnected):
+            task.cancel()
+        await asyncio.gather(pump, disconnected, return_exceptions=True)
+        await events.aclose()
+
+
+@lru_cache(maxsize=None)
+def _path_prefix(urlconf):
+    """Phần cố định của URL stream, lọc nhanh trước khi resolve()"""
+    try:
+        path = reverse(URL_NAME, urlconf=urlconf, args=[0])
+    except NoReverseMatch:
+        return None
+    return path[:path.rindex('0')]
+
+
+def _match(scope):
+    if scope['type'] != 'http' or scope.get('method') != 'GET':
+        return None
+    path = scope['path'][len(scope.get('root_path', '')):] or '/'
+    prefix = _path_prefix(settings.ROOT_URLCONF)
+    if prefix is None or not path.startswith(prefix):
+        return None
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    return match if match.url_name == URL_NAME else None
+
+
+def route(django_application):
+    """Bọc ASGI app của Django: URL stream do serve() xử lý, còn lại chuyển cho Django"""
+    async def application(scope, receive, send):
+        match = _match(scope)
+        if match is not None:
+            return await serve(scope, receive, send, **match.kwargs)
+        return await django_application(scope, receive, send)
+    return application
@@ -39,6 +39,50 @@ document.querySelectorAll('.time-slot-card').forEach(card => {
 });
 
 
+// ============= LIVE SLOT UPDATES (SSE) =============
+function renderSlotStatus(card, isAvailable) {
+    const badge = card.querySelector('.slot-status');
+    if (!badge) return;
+    badge.className = `badge ${isAvailable ? 'bg-success' : 'bg-secondary'} slot-status`;
+    badge.replaceChildren(
+        createElement('i', isAvailable ? 'fas fa-check' : 'fas fa-times'),
+        document.createTextNode(` ${isAvailable ? TEXT.SLOT_AVAILABLE : TEXT.SLOT_TAKEN}`)
+    );
+}
+
+function applySlotState(data) {
+    data.slots.forEach(slot => {
+        const card = document.querySelector(`.time-slot-card[data-slot-id="${slot.id}"]`);
+        if (!card) return;
+
+        card.dataset.available = String(slot.is_available);
+        card.classList.toggle('disabled', !slot.is_available);
+        renderSlotStatus(card, slot.is_available);
+
+        if (!slot.is_available && card.classList.contains('selected')) {
+            card.classList.remove('selected');
+            document.getElementById('selectedTimeSlot').value = '';
+            const submitBtn = document.getElementById('submitBtn');
+            if (submitBtn) {
+                submitBtn.disabled = true;
+            }
+            const msg = document.getElementById('formMessage');
+            if (msg) {
+                msg.textContent = TEXT.MSG_SELECTED_SLOT_TAKEN;
+                msg.classList.remove('d-none');
+            }
+        }
+    });
+}
+
+const timeSlotsGrid = document.getElementById('timeSlotsGrid');
+if (timeSlotsGrid && timeSlotsGrid.dataset.streamUrl && window.EventSource) {
+    // EventSource tự kết nối lại (gửi Last-Event-ID), không cần xử lý onerror
+    const slotEvents = new EventSource(timeSlotsGrid.dataset.streamUrl);
+    slotEvents.addEventListener('slots', event => applySlotState(JSON.parse(event.data)));
+    window.addEventListener('pagehide', () => slotEvents.close());
+}
+
 // ============= VOUCHER CHECK =============
 let currentDiscountPercent = null;
 
@@ -118,6 +162,85 @@ if (voucherBtn) {
     voucherBtn.addEventListener('click', checkVoucher);
 }
 
+// ============= REVIEWS (cursor) =============
+function createElement(tag, className, text) {
+    const el = document.createElement(tag);
+    if (className) el.className = className;
+    if (text !== undefined) el.textContent = text;
+    return el;
+}
+
+function renderStars(rating) {
+    const stars = createElement('div', 'small text-warning');
+    for (let i = 1; i <= 5; i++) {
+        stars.appendChild(createElement('i', i <= rating ? 'fas fa-star' : 'far fa-star'));
+        stars.appendChild(document.createTextNode(' '));
+    }
+    return stars;
+}
+
+function renderReview(review) {
+    const item = createElement('div', 'p-3 border-bottom review-item');
+
+    const header = createElement('div', 'd-flex justify-content-between align-items-start mb-1');
+    const author = createElement('div');
+    author.appendChild(createElement('strong', 'text-dark', review.user));
+    author.appendChild(renderStars(review.rating));
+    header.appendChild(author);
+    header.appendChild(createElement('small', 'text-muted', review.created_at));
+    item.appendChild(header);
+    item.appendChild(createElement('p', 'mb-0 small text-secondary', review.content));
+
+    review.comments.forEach(comment => {
+        const row = createElement('div', 'review-comment border-start ps-2 mt-2');
+        row.style.marginLeft = `${comment.indent}rem`;
+        row.appendChild(createElement('small', 'fw-semibold', comment.user));
+        row.appendChild(createElement('small', 'text-muted ms-1', comment.created_at));
+        row.appendChild(createElement('p', 'mb-0 small text-secondary', comment.content));
+        item.appendChild(row);
+    });
+    return item;
+}
+
+async function loadMoreReviews(button) {
+    button.disabled = true;
+    button.textContent = TEXT.MSG_REVIEWS_LOADING;
+
+    try {
+        const url = `${button.dataset.url}?cursor=${encodeURIComponent(button.dataset.cursor)}`;
+        const res = await fetch(url);
+        if (!res.ok) throw new Error(`Reviews HTTP ${res.status}`);
+        const data = await res.json();
+
+        const container = button.parentElement;
+        data.reviews.forEach(review => {
+            container.parentElement.insertBefore(renderReview(review), container);
+        });
+
+        if (data.next_cursor) {
+            button.dataset.cursor = data.next_cursor;
+            button.disabled = false;
+            button.textContent = TEXT.MSG_REVIEWS_MORE;
+        } else {
+            container.remove();
+        }
+    } catch (err) {
+        button.disabled = false;
+        button.textContent = TEXT.MSG_REVIEWS_ERROR;
+        console.error({
+            level: 'error',
+            type: err.name,
+            message: err.message,
+            time: new Date().toISOString()
+        });
+    }
+}
+
+const loadMoreReviewsBtn = document.getElementById('loadMoreReviews');
+if (loadMoreReviewsBtn) {
+    loadMoreReviewsBtn.addEventListener('click', () => loadMoreReviews(loadMoreReviewsBtn));
+}
+
 // ============= FORM VALIDATION =============
 const bookingForm = document.getElementById('bookingForm');
 if (bookingForm) {
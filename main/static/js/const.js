@@ -20,7 +20,13 @@ export const TEXT = {
     MSG_VOUCHER_CHECKING: 'Đang kiểm tra...',
     MSG_VOUCHER_VALID: 'Voucher hợp lệ!',
     MSG_VOUCHER_INVALID: 'Voucher không hợp lệ!',
-    MSG_VOUCHER_ERROR: 'Có lỗi xảy ra, vui lòng thử lại.'
+    MSG_VOUCHER_ERROR: 'Có lỗi xảy ra, vui lòng thử lại.',
+    MSG_REVIEWS_LOADING: 'Đang tải...',
+    MSG_REVIEWS_MORE: 'Xem thêm đánh giá',
+    MSG_REVIEWS_ERROR: 'Không tải được đánh giá, thử lại.',
+    SLOT_AVAILABLE: 'Còn trống',
+    SLOT_TAKEN: 'Đã đặt',
+    MSG_SELECTED_SLOT_TAKEN: 'Khung giờ bạn chọn vừa có người đặt, vui lòng chọn khung giờ khác.'
 };
 
 export const URL_CONFIG = {
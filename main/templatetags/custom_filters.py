@@ -1,6 +1,10 @@
 from django import template
+from django.utils.html import format_html, format_html_join
 from urllib.parse import urlencode
 
+from main import constants
+from main.images import image_urls
+
 register = template.Library()
 
 
@@ -78,3 +82,35 @@ def selected_if(value, arg):
         return 'selected' if str(value) == str(arg) else ''
     except BaseException:
         return ''
+
+
+@register.simple_tag
+def pitch_picture(entry, alt='', css_class='', fallback='', sizes=constants.PITCH_IMAGE_CARD_SIZES):
+    """
+    <picture> cho một phần tử của Pitch.images: AVIF/WebP qua srcset,
+    thumbnail JPEG làm src. Ảnh lỗi thì thay bằng fallback.
+    """
+    urls = image_urls(entry)
+    if urls is None:
+        return format_html('<img src="{}" class="{}" alt="{}">', fallback, css_class, alt)
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime, srcset, sizes) for mime, srcset in urls['sources']))
+    onerror = ''
+    if fallback:
+        onerror = format_html(
+            ' onerror="this.onerror=null;'
+            'this.parentNode.querySelectorAll(\'source\').forEach(function(s){{s.remove()}});'
+            'this.src=\'{}\'"',
+            fallback)
+    return format_html(
+        '<picture>{}<img src="{}" class="{}" alt="{}" loading="lazy" decoding="async"{}></picture>',
+        sources, urls['src'], css_class, alt, onerror)
+
+
+@register.simple_tag
+def pitch_thumbnail_url(entry):
+    """URL thumbnail (hoặc ảnh gốc với dữ liệu cũ) của một phần tử Pitch.images"""
+    urls = image_urls(entry)
+    return urls['src'] if urls else ''
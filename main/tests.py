@@ -1,15 +1,46 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.core import mail
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
 from decimal import Decimal
 from datetime import date, time, timedelta
+from io import BytesIO, StringIO
+import asyncio
+import json
+import shutil
+import struct
+import tempfile
+import zlib
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync, sync_to_async
 
 from .models import (
     Facility, Pitch, PitchType, Favorite, TimeSlot, PitchTimeSlot,
-    Voucher, Booking, BookingStatus
+    Voucher, Booking, BookingStatus, EmailOutbox, EmailStatus, ImageJob, ImageJobStatus,
+    ACTIVE_BOOKING_STATUSES, BookingDailyStat, Review, Comment
+)
+from . import (
+    async_views, availability, benchmark, booking_actions, checks, constants, db_router,
+    image_jobs, images, metrics, refdata, search, slot_events, vouchers,
+)
+from .forms import PitchForm
+from .availability import (
+    get_slot_availability, get_taken_slot_ids, get_taken_slot_ids_for_range
 )
-from . import constants
+from .outbox import deliver_pending, enqueue_email
+from .pagination import KeysetPaginator
+from .search import fold_text, search_pitches
+from .templatetags.custom_filters import pitch_picture
 
 User = get_user_model()
 
@@ -131,18 +162,18 @@ class TimeSlotTests(TestCase):
         )
     
     def test_duration_hours_calculation(self):
-        """Test duration_hours() calculates correctly"""
-        duration = self.time_slot.duration_hours()
+        """Test duration_hours is stored on save"""
+        duration = self.time_slot.duration_hours
         self.assertEqual(duration, Decimal('2.00'))
     
     def test_duration_hours_with_minutes(self):
-        """Test duration_hours() with fractional hours"""
+        """Test duration_hours with fractional hours"""
         slot = TimeSlot.objects.create(
             name="7h30-8h45",
             start_time=time(7, 30),
             end_time=time(8, 45)
         )
-        duration = slot.duration_hours()
+        duration = slot.duration_hours
         self.assertEqual(duration, Decimal('1.25'))
     
     def test_clean_invalid_time_range(self):
@@ -431,4 +462,1455 @@ class BookingTests(TestCase):
         )
         expected = f"{self.pitch.name} - {self.user.username} ({booking_date})"
         self.assertEqual(str(booking), expected)
-        
\ No newline at end of file
+        
+
+# ===== Availability Service Tests =====
+class AvailabilityFixtureMixin:
+    """Một sân với 4 khung giờ, slot thứ 2 đã được đặt vào ngày mai"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.facility = Facility.objects.create(
+            name='Test Facility',
+            address='123 Test St'
+        )
+        self.pitch = Pitch.objects.create(
+            name='Pitch 1',
+            facility=self.facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00')
+        )
+        self.slots = []
+        for hour in (7, 9, 17, 19):
+            time_slot = TimeSlot.objects.create(
+                name=f"{hour}h-{hour + 2}h",
+                start_time=time(hour, 0),
+                end_time=time(hour + 2, 0)
+            )
+            self.slots.append(PitchTimeSlot.objects.create(
+                pitch=self.pitch,
+                time_slot=time_slot
+            ))
+        self.booking_date = date.today() + timedelta(days=1)
+        self.booking = Booking.objects.create(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=self.slots[1],
+            booking_date=self.booking_date
+        )
+
+
+class AvailabilityServiceTests(AvailabilityFixtureMixin, TestCase):
+    """Test batched slot availability"""
+
+    def test_get_slot_availability_marks_taken_slots(self):
+        availability = get_slot_availability(self.pitch, self.booking_date)
+        result = {pts.id: is_free for pts, is_free in availability.items()}
+        self.assertFalse(result[self.slots[1].id])
+        self.assertTrue(result[self.slots[0].id])
+        self.assertEqual(len(result), 4)
+
+    def test_get_slot_availability_uses_constant_queries(self):
+        refdata.get_time_slots()  # TimeSlot đã nằm trong cache
+        with self.assertNumQueries(2):
+            get_slot_availability(self.pitch, self.booking_date)
+
+    def test_cancelled_booking_frees_slot(self):
+        Booking.objects.update(status=BookingStatus.CANCELLED)
+        taken = get_taken_slot_ids(self.pitch, self.booking_date)
+        self.assertEqual(taken, set())
+
+    def test_get_taken_slot_ids_for_range(self):
+        taken = get_taken_slot_ids_for_range(
+            [self.pitch.id], date.today(), self.booking_date)
+        self.assertEqual(
+            taken[(self.pitch.id, self.booking_date)], {self.slots[1].id})
+
+    def test_pitch_get_available_time_slots(self):
+        slots = self.pitch.get_available_time_slots(self.booking_date)
+        self.assertEqual(len(slots), 3)
+        self.assertNotIn(self.slots[1], slots)
+
+
+# ===== Availability Calendar Tests =====
+class AvailabilityCalendarViewTests(AvailabilityFixtureMixin, TestCase):
+    """Test multi-day calendar endpoints"""
+
+    def test_pitch_calendar_covers_booking_window(self):
+        response = self.client.get(
+            reverse('ajax_pitch_calendar', args=[self.pitch.id]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            len(data['dates']), constants.MAX_BOOKING_ADVANCE_DAYS + 1)
+        pitch_data = data['pitches'][0]
+        self.assertEqual(len(pitch_data['slots']), 4)
+        day_index = data['dates'].index(self.booking_date.isoformat())
+        # slots[1] bị đặt -> bit 1
+        self.assertEqual(pitch_data['occupancy'][day_index], 0b10)
+        self.assertEqual(pitch_data['occupancy'][0], 0)
+
+    def test_pitch_calendar_query_count(self):
+        refdata.get_time_slots()
+        with self.assertNumQueries(3):
+            self.client.get(
+                reverse('ajax_pitch_calendar', args=[self.pitch.id]))
+
+    def test_facility_calendar_lists_all_pitches(self):
+        other = Pitch.objects.create(
+            name='Pitch 2',
+            facility=self.facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('150.00')
+        )
+        PitchTimeSlot.objects.create(
+            pitch=other, time_slot=self.slots[0].time_slot)
+        response = self.client.get(
+            reverse('ajax_facility_calendar', args=[self.facility.id]))
+        data = response.json()
+        self.assertEqual(data['facility']['id'], self.facility.id)
+        self.assertEqual(
+            [p['id'] for p in data['pitches']], [self.pitch.id, other.id])
+
+
+# ===== Search Tests =====
+class SearchTests(TestCase):
+    """Test accent-folded pitch/facility search"""
+
+    def setUp(self):
+        self.pitch_type = PitchType.objects.create(name='Sân 7')
+        self.facility = Facility.objects.create(
+            name='Sân Hoà Khánh',
+            address='45 Lê Duẩn, Đà Nẵng'
+        )
+        self.other_facility = Facility.objects.create(
+            name='Sân Mỹ Đình',
+            address='Lê Đức Thọ, Hà Nội'
+        )
+        self.pitch = Pitch.objects.create(
+            name='Sân B1',
+            facility=self.facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('300000.00')
+        )
+        self.other_pitch = Pitch.objects.create(
+            name='Sân C1',
+            facility=self.other_facility,
+            pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('350000.00')
+        )
+
+    def test_fold_text_removes_vietnamese_accents(self):
+        self.assertEqual(fold_text('Sân Mỹ Đình, Đà Nẵng'), 'san my dinh da nang')
+
+    def test_search_document_built_on_save(self):
+        self.assertIn('hoa khanh', self.pitch.search_document)
+        self.assertIn('da nang', self.pitch.search_document)
+
+    def test_unaccented_prefix_search(self):
+        results = search_pitches(Pitch.objects.all(), 'hoa kh')
+        self.assertEqual(list(results), [self.pitch])
+
+    def test_facility_rename_refreshes_pitch_documents(self):
+        self.facility.name = 'Sân Liên Chiểu'
+        self.facility.save()
+        results = search_pitches(Pitch.objects.all(), 'lien chieu')
+        self.assertEqual(list(results), [self.pitch])
+        self.assertFalse(search_pitches(Pitch.objects.all(), 'khanh').exists())
+
+    def test_search_applies_filters_and_rank_in_one_query(self):
+        queryset = Pitch.objects.filter(facility=self.other_facility)
+        with CaptureQueriesContext(connection) as captured:
+            results = list(search_pitches(queryset, 'san').order_by('-search_rank'))
+        self.assertEqual(results, [self.other_pitch])
+        self.assertEqual(len(captured.captured_queries), 1)
+        if search._use_fts():
+            self.assertGreater(results[0].search_rank, 0)
+
+    def test_pitch_list_search(self):
+        response = self.client.get(reverse('pitch_list'), {'q': 'ha noi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['pitches']), [self.other_pitch])
+
+    def test_home_search_facilities(self):
+        response = self.client.get(reverse('home'), {'q': 'my dinh'})
+        self.assertEqual(list(response.context['facilities']), [self.other_facility])
+
+
+# ===== Email Outbox Tests =====
+class EmailOutboxTests(AvailabilityFixtureMixin, TestCase):
+    """Test outbox-based booking notifications"""
+
+    def test_booking_create_queues_email_without_sending(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.post(
+            reverse('user_booking_create', args=[self.pitch.id]),
+            {
+                'booking_date': self.booking_date.isoformat(),
+                'time_slot': str(self.slots[0].id),
+            }
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = EmailOutbox.objects.get()
+        self.assertEqual(queued.recipient_list, ['test@example.com'])
+        self.assertEqual(queued.status, EmailStatus.PENDING)
+
+    def test_deliver_pending_sends_batch(self):
+        for i in range(3):
+            enqueue_email(f'Subject {i}', 'Body', ['a@example.com'])
+        sent, failed = deliver_pending(batch_size=10)
+        self.assertEqual((sent, failed), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(
+            EmailOutbox.objects.exclude(status=EmailStatus.SENT).exists())
+
+    def test_deliver_pending_retries_with_backoff(self):
+        class BrokenConnection:
+            def open(self):
+                pass
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                raise OSError('SMTP down')
+
+        email = enqueue_email('Subject', 'Body', ['a@example.com'])
+        sent, failed = deliver_pending(connection=BrokenConnection())
+        self.assertEqual((sent, failed), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatus.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        # Chưa đến hạn retry -> không gửi lại
+        self.assertEqual(deliver_pending(), (0, 0))
+
+
+# ===== Concurrent Booking Tests =====
+class BookingConcurrencyTests(AvailabilityFixtureMixin, TestCase):
+    """Test DB-level slot uniqueness and atomic voucher redemption"""
+
+    def test_constraint_blocks_double_booking_when_check_races(self):
+        # Giả lập 2 request cùng qua bước kiểm tra trước khi insert
+        with patch.object(PitchTimeSlot, 'is_available_on_date', return_value=True):
+            with self.assertRaises(ValidationError) as ctx:
+                Booking.objects.create(
+                    user=self.user,
+                    pitch=self.pitch,
+                    time_slot=self.slots[1],
+                    booking_date=self.booking_date
+                )
+        self.assertIn('time_slot', ctx.exception.message_dict)
+        self.assertEqual(
+            Booking.objects.filter(time_slot=self.slots[1]).count(), 1)
+
+    def test_save_relies_on_constraint_not_availability_query(self):
+        with patch.object(PitchTimeSlot, 'is_available_on_date') as check:
+            Booking.objects.create(
+                user=self.user, pitch=self.pitch, time_slot=self.slots[0],
+                booking_date=self.booking_date)
+        check.assert_not_called()
+
+        # Validate ngoài save (form) vẫn báo khung giờ đã đặt trước khi ghi
+        taken = Booking(
+            user=self.user, pitch=self.pitch, time_slot=self.slots[1],
+            booking_date=self.booking_date)
+        with self.assertRaises(ValidationError) as ctx:
+            taken.full_clean(validate_constraints=False)
+        self.assertIn('time_slot', ctx.exception.message_dict)
+
+    def test_cancelled_booking_does_not_block_slot(self):
+        Booking.objects.update(status=BookingStatus.CANCELLED)
+        Booking.objects.create(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=self.slots[1],
+            booking_date=self.booking_date
+        )
+        self.assertEqual(
+            Booking.objects.filter(time_slot=self.slots[1]).count(), 2)
+
+    def test_voucher_not_over_redeemed_with_stale_instance(self):
+        voucher = Voucher.objects.create(
+            code='ONCE', discount_percent=10, usage_limit=1)
+        stale_voucher = Voucher.objects.get(pk=voucher.pk)
+
+        Booking.objects.create(
+            user=self.user,
+            pitch=self.pitch,
+            time_slot=self.slots[0],
+            booking_date=self.booking_date,
+            voucher=voucher
+        )
+        with self.assertRaises(ValidationError) as ctx:
+            Booking.objects.create(
+                user=self.user,
+                pitch=self.pitch,
+                time_slot=self.slots[2],
+                booking_date=self.booking_date,
+                voucher=stale_voucher
+            )
+        self.assertIn('voucher', ctx.exception.message_dict)
+        voucher.refresh_from_db()
+        self.assertEqual(voucher.used_count, 1)
+        self.assertFalse(
+            Booking.objects.filter(time_slot=self.slots[2]).exists())
+
+
+# ===== Keyset Pagination Tests =====
+class KeysetPaginationTests(AvailabilityFixtureMixin, TestCase):
+    """Test cursor pagination for booking lists"""
+
+    def setUp(self):
+        super().setUp()
+        for day in range(2, 8):
+            for slot in self.slots:
+                Booking.objects.create(
+                    user=self.user,
+                    pitch=self.pitch,
+                    time_slot=slot,
+                    booking_date=date.today() + timedelta(days=day)
+                )
+        self.queryset = Booking.objects.all()
+        self.expected_ids = list(
+            self.queryset.order_by('-booking_date', '-created_at', '-id')
+            .values_list('id', flat=True))
+
+    def test_walk_forward_and_back(self):
+        paginator = KeysetPaginator(
+            self.queryset, constants.USER_BOOKING_KEYSET_ORDER, 10)
+        first = paginator.page()
+        self.assertFalse(first.has_previous())
+        seen = [b.id for b in first]
+
+        page = first
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            seen.extend(b.id for b in page)
+        self.assertEqual(seen, self.expected_ids)
+
+        second = paginator.page(first.next_cursor)
+        back = paginator.page(second.previous_cursor)
+        self.assertEqual([b.id for b in back], [b.id for b in first])
+        self.assertFalse(back.has_previous())
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(
+            self.queryset, constants.USER_BOOKING_KEYSET_ORDER, 10)
+        page = paginator.page('not-a-valid-cursor')
+        self.assertEqual([b.id for b in page], self.expected_ids[:10])
+
+    def test_user_booking_list_uses_cursor_by_default(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('user_booking_list'))
+        self.assertTrue(response.context['use_keyset'])
+        page = response.context['page_obj']
+        self.assertEqual(
+            [b.id for b in page], self.expected_ids[:constants.BOOKINGS_PER_PAGE])
+
+        response = self.client.get(
+            reverse('user_booking_list'), {'cursor': page.next_cursor})
+        self.assertEqual(
+            [b.id for b in response.context['page_obj']],
+            self.expected_ids[constants.BOOKINGS_PER_PAGE:2 * constants.BOOKINGS_PER_PAGE])
+
+    def test_user_booking_list_page_number_mode(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('user_booking_list'), {'page': 2})
+        self.assertFalse(response.context['use_keyset'])
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_admin_booking_list_cursor_pages(self):
+        User.objects.create_user(
+            username='admin', password='adminpass123', role=constants.ROLE_ADMIN)
+        self.client.login(username='admin', password='adminpass123')
+        response = self.client.get(reverse('admin_booking_list'))
+        self.assertEqual(response.status_code, 200)
+        page = response.context['bookings']
+        self.assertTrue(page.has_next())
+        response = self.client.get(
+            reverse('admin_booking_list'), {'cursor': page.next_cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['bookings'].has_previous())
+
+
+# ===== Request Metrics Tests =====
+class RequestMetricsTests(AvailabilityFixtureMixin, TestCase):
+    """Test query/latency instrumentation middleware"""
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+
+    def test_records_queries_per_view(self):
+        # Số query tuỳ bản sync / async (ASYNC_READ_VIEWS), so với số thực chạy
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(
+                reverse('ajax_time_slots', args=[self.pitch.id]),
+                {'date': self.booking_date.isoformat()})
+        histogram = metrics.registry.queries['ajax_time_slots']
+        self.assertEqual(histogram.count, 1)
+        self.assertGreater(histogram.total, 0)
+        self.assertEqual(histogram.total, len(captured.captured_queries))
+
+    def test_records_template_time(self):
+        self.client.get(reverse('pitch_list'))
+        self.assertGreater(metrics.registry.template_seconds['pitch_list'], 0)
+
+    @override_settings(VIEW_BUDGETS={'default': {'queries': 0}})
+    def test_over_budget_is_logged(self):
+        with self.assertLogs('main.middleware', level='WARNING'):
+            self.client.get(reverse('pitch_list'))
+        self.assertEqual(metrics.registry.over_budget['pitch_list'], 1)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint_prometheus_format(self):
+        self.client.get(reverse('pitch_list'))
+        response = self.client.get(
+            reverse('metrics'), headers={'Authorization': 'Bearer scrape-secret'})
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'pitchmanager_request_duration_seconds_count{view="pitch_list"} 1', body)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint_rejects_remote_scrape(self):
+        auth = {'Authorization': 'Bearer scrape-secret'}
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5', headers=auth)
+        self.assertEqual(response.status_code, 403)
+        # Sau reverse proxy cùng máy: IP loopback nhưng không có token
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_endpoint_disabled_without_token(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+
+class SeedLoadCommandTests(TestCase):
+    def test_generates_bookings_without_slot_conflicts(self):
+        call_command(
+            'seed_load', facilities=2, pitches=2, users=5, days=30,
+            bookings=150, batch_size=40, seed=1, stdout=StringIO())
+
+        self.assertEqual(Facility.objects.count(), 2)
+        self.assertEqual(Pitch.objects.count(), 4)
+        self.assertEqual(User.objects.filter(username__startswith='load_user_').count(), 5)
+        bookings = Booking.objects.all()
+        self.assertGreater(bookings.count(), 100)
+        active = bookings.filter(status__in=ACTIVE_BOOKING_STATUSES)
+        self.assertEqual(
+            active.count(),
+            active.values('pitch', 'time_slot', 'booking_date').distinct().count())
+        self.assertTrue(all(p.search_document for p in Pitch.objects.all()))
+
+
+class BenchmarkTests(AvailabilityFixtureMixin, TestCase):
+    def test_run_benchmarks_covers_hot_views(self):
+        results = benchmark.run_benchmarks(iterations=1, warmup=0)
+
+        self.assertEqual(
+            len([name for name in results if name.startswith('pitch_list[')]), 32)
+        for name in ('ajax_time_slots', 'user_booking_create[GET]',
+                     'user_booking_create[POST]', 'admin_booking_list',
+                     'check_voucher_ajax'):
+            self.assertIn(name, results)
+            self.assertGreater(results[name]['queries'], 0)
+        # POST được rollback
+        self.assertFalse(Booking.objects.filter(note='benchmark').exists())
+
+    def test_compare_results_flags_latency_and_query_regressions(self):
+        baseline = {
+            'a': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 5},
+            'b': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 5},
+        }
+        results = {
+            'a': {'p50_ms': 11.0, 'p95_ms': 24.0, 'queries': 5},
+            'b': {'p50_ms': 10.0, 'p95_ms': 40.0, 'queries': 6},
+            'new': {'p50_ms': 1.0, 'p95_ms': 1.0, 'queries': 1},
+        }
+
+        regressions = benchmark.compare_results(
+            results, baseline, latency_tolerance=0.25, query_tolerance=0)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(line.startswith('b:') for line in regressions))
+
+
+class ReferenceDataCacheTests(TestCase):
+    def setUp(self):
+        self.pitch_type = PitchType.objects.create(name='Sân 5')
+        self.time_slot = TimeSlot.objects.create(
+            name='7h-9h', start_time=time(7, 0), end_time=time(9, 0))
+
+    def test_served_from_cache_without_queries(self):
+        refdata.get_pitch_types()
+        refdata.get_time_slots()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [pt.name for pt in refdata.get_pitch_types()], ['Sân 5'])
+            self.assertEqual(
+                refdata.get_time_slots()[self.time_slot.id].name, '7h-9h')
+
+    def test_save_and_delete_invalidate(self):
+        refdata.get_pitch_types()
+        PitchType.objects.create(name='Sân 7')
+        self.assertEqual(
+            sorted(pt.name for pt in refdata.get_pitch_types()), ['Sân 5', 'Sân 7'])
+
+        self.time_slot.name = '07h-09h'
+        self.time_slot.save()
+        self.assertEqual(refdata.get_time_slots()[self.time_slot.id].name, '07h-09h')
+
+        self.pitch_type.delete()
+        self.assertEqual([pt.name for pt in refdata.get_pitch_types()], ['Sân 7'])
+
+    def test_other_process_sees_new_version(self):
+        refdata.get_pitch_types()
+        # Giả lập process khác: cache trong process còn bản cũ,
+        # version trong cache dùng chung đã tăng
+        stale = refdata._local[refdata.PITCH_TYPES]
+        PitchType.objects.create(name='Sân 11')
+        refdata._local[refdata.PITCH_TYPES] = stale
+
+        self.assertEqual(len(refdata.get_pitch_types()), 2)
+
+
+class SlotPriceTests(AvailabilityFixtureMixin, TestCase):
+    def test_price_follows_pitch_base_price(self):
+        self.pitch.base_price_per_hour = Decimal('250.00')
+        self.pitch.save()
+
+        prices = set(PitchTimeSlot.objects.filter(
+            pitch=self.pitch).values_list('price', flat=True))
+        self.assertEqual(prices, {Decimal('500.00')})
+
+    def test_price_follows_time_slot_duration(self):
+        time_slot = self.slots[0].time_slot
+        time_slot.end_time = time(8, 30)
+        time_slot.save()
+
+        self.slots[0].refresh_from_db()
+        self.assertEqual(time_slot.duration_hours, Decimal('1.50'))
+        self.assertEqual(
+            self.slots[0].price, self.pitch.base_price_per_hour * Decimal('1.50'))
+
+    def test_unchanged_pitch_save_skips_price_refresh(self):
+        pitch = Pitch.objects.get(pk=self.pitch.pk)
+        pitch.name = 'Sân mới'
+        with patch.object(PitchTimeSlot, 'refresh_prices') as refresh:
+            pitch.save()
+        refresh.assert_not_called()
+
+    def test_pitch_list_sorts_and_filters_by_slot_price(self):
+        cheap = Pitch.objects.create(
+            name='Sân rẻ', pitch_type=self.pitch.pitch_type,
+            base_price_per_hour=Decimal('50.00'))
+        PitchTimeSlot.objects.create(pitch=cheap, time_slot=self.slots[0].time_slot)
+
+        response = self.client.get(reverse('pitch_list'), {'sort': 'slot_price'})
+        self.assertEqual(
+            [p.name for p in response.context['pitches']][:2],
+            ['Sân rẻ', self.pitch.name])
+
+        response = self.client.get(reverse('pitch_list'), {'slot_price_max': '150'})
+        self.assertEqual([p.name for p in response.context['pitches']], ['Sân rẻ'])
+
+    def test_pitch_list_ignores_non_finite_slot_price(self):
+        for value in ('NaN', 'Infinity', '-inf', 'sNaN', 'abc'):
+            response = self.client.get(reverse('pitch_list'), {'slot_price_max': value})
+            self.assertEqual(response.status_code, 200, value)
+            self.assertEqual(response.context['pitches'].paginator.count, 1)
+
+
+class BookingDailyStatTests(AvailabilityFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='statadmin', password='testpass123', role=constants.ROLE_ADMIN)
+
+    def _stat(self, slot=None, day=None):
+        return BookingDailyStat.objects.get(
+            pitch_time_slot=slot or self.slots[1], date=day or self.booking_date)
+
+    def test_status_transitions_update_rollup(self):
+        stat = self._stat()
+        self.assertEqual((stat.pending_count, stat.confirmed_count), (1, 0))
+
+        self.booking.status = BookingStatus.CONFIRMED
+        self.booking.save()
+        stat = self._stat()
+        self.assertEqual((stat.pending_count, stat.confirmed_count), (0, 1))
+        self.assertEqual(stat.revenue, self.booking.final_price)
+
+        booking = Booking.objects.get(pk=self.booking.pk)
+        booking.status = BookingStatus.CANCELLED
+        booking.save()
+        stat = self._stat()
+        self.assertEqual((stat.confirmed_count, stat.cancelled_count), (0, 1))
+        self.assertEqual(stat.revenue, 0)
+
+        booking.delete()
+        self.assertEqual(self._stat().cancelled_count, 0)
+
+    def test_voucher_discount_tracked_for_confirmed(self):
+        voucher = Voucher.objects.create(code='GIAM10', discount_percent=10)
+        booking = Booking.objects.create(
+            user=self.user, pitch=self.pitch, time_slot=self.slots[0],
+            booking_date=self.booking_date, voucher=voucher,
+            status=BookingStatus.CONFIRMED)
+
+        stat = self._stat(self.slots[0])
+        self.assertEqual(stat.voucher_count, 1)
+        self.assertEqual(stat.voucher_discount, self.slots[0].price - booking.final_price)
+
+    def test_rebuild_matches_incremental(self):
+        self.booking.status = BookingStatus.CONFIRMED
+        self.booking.save()
+        Booking.objects.create(
+            user=self.user, pitch=self.pitch, time_slot=self.slots[2],
+            booking_date=self.booking_date)
+        incremental = sorted(BookingDailyStat.objects.values_list(
+            'pitch_time_slot', 'date', 'pending_count', 'confirmed_count', 'revenue'))
+
+        call_command('rebuild_booking_stats', stdout=StringIO())
+
+        rebuilt = sorted(BookingDailyStat.objects.values_list(
+            'pitch_time_slot', 'date', 'pending_count', 'confirmed_count', 'revenue'))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_dashboard_reads_rollup_only(self):
+        self.client.login(username='statadmin', password='testpass123')
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('admin_analytics'), {
+                'date_from': date.today().isoformat(),
+                'date_to': self.booking_date.isoformat(),
+            })
+        self.assertFalse(
+            any('"main_booking"' in query['sql'] for query in captured.captured_queries))
+
+        self.assertEqual(response.status_code, 200)
+        totals = response.context['summary']['totals']
+        self.assertEqual(totals['pending_count'], 1)
+        # 1 lượt / (4 slot x 2 ngày)
+        self.assertEqual(totals['occupancy'], 12.5)
+
+    def test_dashboard_clamps_date_range(self):
+        self.client.login(username='statadmin', password='testpass123')
+        response = self.client.get(reverse('admin_analytics'), {
+            'date_from': '0001-01-01',
+            'date_to': self.booking_date.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        expected_from = self.booking_date - timedelta(days=constants.ANALYTICS_MAX_DAYS - 1)
+        self.assertEqual(response.context['date_from'], expected_from.isoformat())
+        self.assertEqual(response.context['summary']['totals']['pending_count'], 1)
+
+    def test_dashboard_requires_admin(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('admin_analytics'))
+        self.assertEqual(response.status_code, 403)
+
+
+class BookingExportTests(AvailabilityFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='exportadmin', password='testpass123', role=constants.ROLE_ADMIN)
+        other_facility = Facility.objects.create(name='Other Facility', address='456 St')
+        other_pitch = Pitch.objects.create(
+            name='Pitch 2', facility=other_facility, pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('50.00'))
+        other_slot = PitchTimeSlot.objects.create(
+            pitch=other_pitch, time_slot=self.slots[0].time_slot)
+        Booking.objects.create(
+            user=self.user, pitch=other_pitch, time_slot=other_slot,
+            booking_date=self.booking_date)
+
+    def _export(self, **params):
+        response = self.client.get(reverse('admin_booking_export'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_export_streams_filtered_rows(self):
+        self.client.login(username='exportadmin', password='testpass123')
+        content = self._export(facility=self.facility.id)
+
+        self.assertTrue(content.startswith('\ufeff'))
+        lines = content.lstrip('\ufeff').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Pitch 1', lines[1])
+        self.assertIn('Đang chờ', lines[1])
+
+        self.assertEqual(len(self._export().splitlines()), 3)
+        self.assertEqual(len(self._export(status=BookingStatus.CONFIRMED).splitlines()), 1)
+
+    async def test_export_streams_async_under_asgi(self):
+        admin = await User.objects.aget(username='exportadmin')
+        await self.async_client.aforce_login(admin)
+        response = await self.async_client.get(reverse('admin_booking_export'))
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        await sync_to_async(self.client.force_login)(admin)
+        self.assertEqual(content, await sync_to_async(self._export)())
+
+    def test_export_neutralises_formula_cells(self):
+        self.user.full_name = '=HYPERLINK("http://evil.example","x")'
+        self.user.save()
+        self.client.login(username='exportadmin', password='testpass123')
+        lines = self._export(facility=self.facility.id).lstrip('\ufeff').splitlines()
+        self.assertIn('"\'=HYPERLINK(""http://evil.example"",""x"")"', lines[1])
+
+    def test_export_forbidden_for_non_admin(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('admin_booking_export'))
+        self.assertEqual(response.status_code, 403)
+
+
+class BookingBulkActionTests(AvailabilityFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='bulkadmin', password='testpass123', role=constants.ROLE_ADMIN)
+        self.voucher = Voucher.objects.create(code='BULK10', discount_percent=10)
+        self.others = [
+            Booking.objects.create(
+                user=self.user, pitch=self.pitch, time_slot=slot,
+                booking_date=self.booking_date, voucher=self.voucher)
+            for slot in (self.slots[0], self.slots[2])
+        ]
+        self.booking.status = BookingStatus.CONFIRMED
+        self.booking.save()
+        EmailOutbox.objects.all().delete()
+        self.client.login(username='bulkadmin', password='testpass123')
+
+    def _post(self, action, ids):
+        return self.client.post(reverse('admin_booking_bulk_update'), {
+            'action': action, 'booking_ids': ids})
+
+    def test_bulk_approve_updates_pending_only(self):
+        used_before = Voucher.objects.get(pk=self.voucher.pk).used_count
+        ids = [self.booking.id] + [b.id for b in self.others]
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self._post('approve', ids)
+        booking_updates = [
+            q for q in captured.captured_queries
+            if q['sql'].startswith('UPDATE "main_booking"')]
+        # Một câu duyệt cả lô; không có đơn trùng giờ nên không UPDATE từ chối
+        self.assertEqual(len(booking_updates), 1)
+        self.assertRedirects(response, reverse('admin_booking_list'))
+
+        self.assertEqual(
+            Booking.objects.filter(status=BookingStatus.CONFIRMED).count(), 3)
+        self.assertEqual(
+            Voucher.objects.get(pk=self.voucher.pk).used_count, used_before + 2)
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+        stat = BookingDailyStat.objects.get(
+            pitch_time_slot=self.slots[0], date=self.booking_date)
+        self.assertEqual((stat.pending_count, stat.confirmed_count), (0, 1))
+        self.assertEqual(stat.revenue, self.others[0].final_price)
+        self.assertEqual(stat.voucher_count, 1)
+
+    def test_bulk_reject_and_permissions(self):
+        self._post('reject', [b.id for b in self.others])
+        self.assertEqual(
+            Booking.objects.filter(status=BookingStatus.REJECTED).count(), 2)
+        self.assertEqual(
+            BookingDailyStat.objects.get(
+                pitch_time_slot=self.slots[2], date=self.booking_date).rejected_count, 1)
+
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self._post('approve', [self.booking.id]).status_code, 403)
+
+
+@override_settings(BOOKING_AUTO_REJECT_CONFLICTS=True)
+class ConflictRejectionTests(AvailabilityFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='conflictadmin', password='testpass123', role=constants.ROLE_ADMIN)
+        other_user = User.objects.create_user(
+            username='other', email='other@example.com', password='testpass123')
+        # 10h-12h giao với slot 9h-11h của self.booking
+        overlapping = PitchTimeSlot.objects.create(
+            pitch=self.pitch,
+            time_slot=TimeSlot.objects.create(
+                name='10h-12h', start_time=time(10, 0), end_time=time(12, 0)))
+        self.competitor = Booking.objects.create(
+            user=other_user, pitch=self.pitch, time_slot=overlapping,
+            booking_date=self.booking_date)
+        self.unrelated = Booking.objects.create(
+            user=other_user, pitch=self.pitch, time_slot=self.slots[2],
+            booking_date=self.booking_date)
+        EmailOutbox.objects.all().delete()
+        self.client.login(username='conflictadmin', password='testpass123')
+
+    def _approve(self):
+        return self.client.post(
+            reverse('admin_update_booking_status', args=[self.booking.id]),
+            {'action': 'approve'})
+
+    def test_confirm_rejects_overlapping_pending(self):
+        self._approve()
+
+        self.competitor.refresh_from_db()
+        self.unrelated.refresh_from_db()
+        self.assertEqual(self.competitor.status, BookingStatus.REJECTED)
+        self.assertEqual(self.unrelated.status, BookingStatus.PENDING)
+        self.assertTrue(EmailOutbox.objects.filter(
+            recipient_list=['other@example.com'],
+            message__contains=constants.BOOKING_CONFLICT_REJECT_REASON).exists())
+        stat = BookingDailyStat.objects.get(
+            pitch_time_slot=self.competitor.time_slot, date=self.booking_date)
+        self.assertEqual((stat.pending_count, stat.rejected_count), (0, 1))
+
+    def test_bulk_approve_overlapping_selection_keeps_earliest(self):
+        changed, conflicts = booking_actions.bulk_update_status(
+            Booking.objects.filter(pk__in=[self.competitor.id, self.booking.id]), 'approve')
+
+        self.assertEqual([b.id for b in changed], [self.booking.id])
+        self.assertEqual([b.id for b in conflicts], [self.competitor.id])
+        self.competitor.refresh_from_db()
+        self.assertEqual(self.competitor.status, BookingStatus.REJECTED)
+
+    def _bulk_messages(self):
+        self.assertEqual(self.booking.status, BookingStatus.PENDING)
+        ids = [self.booking.id, self.competitor.id, f'0{self.booking.id}']
+        response = self.client.post(
+            reverse('admin_booking_bulk_update'), {'action': 'approve', 'booking_ids': ids},
+            follow=True)
+        return [str(message) for message in response.context['messages']]
+
+    def test_bulk_messages_do_not_count_conflicts_as_skipped(self):
+        shown = self._bulk_messages()
+        self.assertIn(constants.MSG_BOOKING_BULK_APPROVED.format(count=1), shown)
+        self.assertIn(constants.MSG_BOOKING_CONFLICTS_REJECTED.format(count=1), shown)
+        self.assertEqual(len(shown), 2)
+
+    @override_settings(BOOKING_AUTO_REJECT_CONFLICTS=False)
+    def test_bulk_messages_report_overlap_left_pending(self):
+        shown = self._bulk_messages()
+        self.assertIn(constants.MSG_BOOKING_BULK_OVERLAP_PENDING.format(count=1), shown)
+        self.assertEqual(len(shown), 2)
+
+    @override_settings(BOOKING_AUTO_REJECT_CONFLICTS=False)
+    def test_option_disabled_keeps_pending(self):
+        self._approve()
+        self.competitor.refresh_from_db()
+        self.assertEqual(self.competitor.status, BookingStatus.PENDING)
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT tạm cho test ghi ảnh, xoá sau mỗi test"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def _upload(self, size=(1000, 700), color='green', name='san.png'):
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class PitchImagePipelineTests(TempMediaMixin, TestCase):
+
+    def test_variants_and_thumbnail(self):
+        record = images.process_upload(self._upload())
+
+        self.assertEqual((record['width'], record['height']), (1000, 700))
+        self.assertEqual(
+            (record['thumb']['width'], record['thumb']['height']),
+            constants.PITCH_IMAGE_THUMB_SIZE)
+        # Không phóng to lên 1280w
+        self.assertEqual(
+            sorted({v['width'] for v in record['variants']}), [320, 640])
+        self.assertIn('webp', {v['format'] for v in record['variants']})
+
+        html = pitch_picture(record, alt='Sân 1', fallback='/default.jpg')
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('640w', html)
+        self.assertIn(record['thumb']['path'], html)
+
+    def test_duplicate_uploads_share_files(self):
+        processed = images.process_upload(self._upload(name='a.png'))
+
+        with patch.object(images, 'build_variants') as build_variants:
+            records = images.save_pitch_images(
+                [self._upload(name='b.png'), self._upload(name='c.png')])
+        build_variants.assert_not_called()
+        self.assertEqual(records, [processed])
+
+    def test_validate_upload_limits(self):
+        with self.assertRaises(ValidationError):
+            images.validate_upload(SimpleUploadedFile('x.png', b'not an image'))
+        with patch.object(constants, 'PITCH_IMAGE_MAX_PIXELS', 100):
+            with self.assertRaises(ValidationError):
+                images.validate_upload(self._upload())
+
+    def test_validate_upload_rejects_decompression_bomb(self):
+        # Chỉ header PNG khai báo 20000x20000, Pillow từ chối ngay lúc open
+        def chunk(kind, data):
+            return (struct.pack('>I', len(data)) + kind + data
+                    + struct.pack('>I', zlib.crc32(kind + data)))
+        header = (b'\x89PNG\r\n\x1a\n'
+                  + chunk(b'IHDR', struct.pack('>IIBBBBB', 20000, 20000, 8, 2, 0, 0, 0))
+                  + chunk(b'IEND', b''))
+        with self.assertRaises(ValidationError):
+            images.validate_upload(SimpleUploadedFile('bomb.png', header))
+        images.validate_upload(self._upload())
+
+    def test_legacy_path_entries_still_render(self):
+        html = pitch_picture('https://example.com/a.jpg', alt='x')
+        self.assertIn('src="https://example.com/a.jpg"', html)
+        self.assertNotIn('<source', html)
+
+    def test_pitch_form_accepts_multiple_images(self):
+        pitch_type = PitchType.objects.create(name='Football')
+        form = PitchForm(
+            data={'name': 'Sân nhiều ảnh', 'pitch_type': pitch_type.id,
+                  'base_price_per_hour': '100000'},
+            files=MultiValueDict({'multiple_images': [self._upload(), self._upload(color='red')]}))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(len(form.cleaned_data['multiple_images']), 2)
+
+
+class ImageJobWorkerTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user(
+            username='imageadmin', password='testpass123', role=constants.ROLE_ADMIN)
+        self.pitch_type = PitchType.objects.create(name='Football')
+        self.client.login(username='imageadmin', password='testpass123')
+
+    def test_upload_is_processed_after_response(self):
+        response = self.client.post(reverse('admin_pitch_create'), {
+            'name': 'Sân ảnh',
+            'pitch_type': self.pitch_type.id,
+            'base_price_per_hour': '100000',
+            'is_available': 'on',
+            'multiple_images': [self._upload()],
+        })
+        self.assertRedirects(response, reverse('admin_pitch_list'))
+
+        pitch = Pitch.objects.get(name='Sân ảnh')
+        self.assertEqual(pitch.images[0]['status'], images.STATUS_PENDING)
+        self.assertNotIn('variants', pitch.images[0])
+        job = ImageJob.objects.get(pitch=pitch)
+
+        call_command('process_image_jobs', stdout=StringIO())
+
+        pitch.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJobStatus.DONE)
+        self.assertEqual(pitch.images[0]['status'], images.STATUS_READY)
+        self.assertTrue(pitch.images[0]['variants'])
+
+    def test_missing_original_marks_entry_failed(self):
+        pitch = Pitch.objects.create(
+            name='Sân lỗi', pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100000'),
+            images=[{'hash': 'abc', 'original': 'pitches/missing.png',
+                     'status': images.STATUS_PENDING}])
+        image_jobs.enqueue_for_pitch(pitch)
+
+        with self.assertLogs('main.image_jobs', level='WARNING'):
+            for _ in range(constants.IMAGE_JOB_MAX_ATTEMPTS):
+                ImageJob.objects.update(next_attempt_at=timezone.now())
+                image_jobs.run_pending()
+
+        pitch.refresh_from_db()
+        self.assertEqual(ImageJob.objects.get().status, ImageJobStatus.FAILED)
+        self.assertEqual(pitch.images[0]['status'], images.STATUS_FAILED)
+
+
+class PitchReviewStatsTests(AvailabilityFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user(
+            username='reviewer2', password='testpass123')
+
+    def _stats(self, pitch=None):
+        pitch = Pitch.objects.get(pk=(pitch or self.pitch).pk)
+        return pitch.review_count, pitch.rating_sum, pitch.rating_avg
+
+    def test_add_review_updates_stats(self):
+        self.booking.status = BookingStatus.CONFIRMED
+        self.booking.save()
+        self.client.login(username='testuser', password='testpass123')
+        self.client.post(reverse('add_review', args=[self.pitch.id]), {
+            'rating': 4, 'content': 'Sân đẹp, cỏ tốt, sẽ quay lại.'})
+
+        self.assertEqual(self._stats(), (1, 4, 4.0))
+        self.assertEqual(Pitch.objects.get(pk=self.pitch.pk).rating_4_count, 1)
+
+    def test_edit_and_delete_adjust_histogram(self):
+        stale_pitch = Pitch.objects.get(pk=self.pitch.pk)
+        Review.objects.create(user=self.user, pitch=self.pitch, rating=5, content='x' * 10)
+        review = Review.objects.create(
+            user=self.other_user, pitch=self.pitch, rating=2, content='y' * 10)
+        self.assertEqual(self._stats(), (2, 7, 3.5))
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 4
+        review.save()
+        pitch = Pitch.objects.get(pk=self.pitch.pk)
+        self.assertEqual((pitch.rating_2_count, pitch.rating_4_count), (0, 1))
+        self.assertEqual(pitch.rating_avg, 4.5)
+
+        # Lưu một instance Pitch cũ không được ghi đè thống kê
+        stale_pitch.name = 'Pitch 1 (mới)'
+        stale_pitch.save()
+        self.assertEqual(self._stats(), (2, 9, 4.5))
+
+        review.delete()
+        self.assertEqual(self._stats(), (1, 5, 5.0))
+
+        call_command('rebuild_review_stats', stdout=StringIO())
+        self.assertEqual(self._stats(), (1, 5, 5.0))
+
+    def test_pitch_list_sorts_by_rating(self):
+        better = Pitch.objects.create(
+            name='Pitch 2', facility=self.facility, pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00'))
+        Review.objects.create(user=self.user, pitch=self.pitch, rating=3, content='x' * 10)
+        Review.objects.create(user=self.user, pitch=better, rating=5, content='x' * 10)
+
+        response = self.client.get(reverse('pitch_list'), {'sort': 'rating'})
+        names = [pitch.name for pitch in response.context['pitches']]
+        self.assertEqual(names[:2], ['Pitch 2', 'Pitch 1'])
+
+
+class ReviewThreadTests(AvailabilityFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.reviews = []
+        for i in range(constants.REVIEWS_PER_PAGE + 2):
+            author = User.objects.create_user(username=f'reviewer{i}', password='testpass123')
+            self.reviews.append(Review.objects.create(
+                user=author, pitch=self.pitch, rating=5, content=f'Review {i} ' * 3))
+
+    def _comment_chain(self, review, depth):
+        parent = None
+        for level in range(depth):
+            parent = Comment.objects.create(
+                user=self.user, review=review, parent_comment=parent, content=f'level {level}')
+        return parent
+
+    def test_pages_follow_cursor(self):
+        url = reverse('ajax_pitch_reviews', args=[self.pitch.id])
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['reviews']), constants.REVIEWS_PER_PAGE)
+        self.assertEqual(first['reviews'][0]['id'], self.reviews[-1].id)
+
+        second = self.client.get(url, {'cursor': first['next_cursor']}).json()
+        self.assertEqual([r['id'] for r in second['reviews']],
+                         [self.reviews[1].id, self.reviews[0].id])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_thread_queries_do_not_depend_on_depth(self):
+        newest = self.reviews[-1]
+        sibling = Comment.objects.create(user=self.user, review=newest, content='root 2')
+        self._comment_chain(newest, 3)
+        Comment.objects.create(user=self.user, review=newest, parent_comment=sibling, content='reply')
+        url = reverse('ajax_pitch_reviews', args=[self.pitch.id])
+
+        with CaptureQueriesContext(connection) as shallow:
+            self.client.get(url)
+        self._comment_chain(self.reviews[-2], 30)
+        with CaptureQueriesContext(connection) as deep:
+            data = self.client.get(url).json()
+        self.assertEqual(len(deep), len(shallow))
+
+        thread = data['reviews'][0]['comments']
+        self.assertEqual(
+            [(c['content'], c['depth']) for c in thread],
+            [('root 2', 0), ('reply', 1), ('level 0', 0), ('level 1', 1), ('level 2', 2)])
+        deep_thread = data['reviews'][1]['comments']
+        self.assertEqual(deep_thread[-1]['depth'], 29)
+        self.assertEqual(deep_thread[-1]['indent'], constants.COMMENT_MAX_INDENT_DEPTH)
+
+    def test_booking_page_renders_first_page(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('user_booking_create', args=[self.pitch.id]))
+        self.assertEqual(len(response.context['reviews']), constants.REVIEWS_PER_PAGE)
+        self.assertContains(response, 'id="loadMoreReviews"')
+
+
+class VoucherEligibilityTests(AvailabilityFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.voucher = Voucher.objects.create(code='SALE10', discount_percent=10)
+
+    def test_single_query_with_usage_check(self):
+        with self.assertNumQueries(1):
+            result = vouchers.check_voucher(' sale10 ', self.user)
+        self.assertTrue(result.is_valid)
+        self.assertEqual(result.discount_percent, 10)
+
+        self.booking.voucher = self.voucher
+        self.booking.save()
+        self.assertEqual(vouchers.check_voucher('SALE10', self.user).status, vouchers.ALREADY_USED)
+
+        self.booking.status = BookingStatus.REJECTED
+        self.booking.save()
+        self.assertTrue(vouchers.check_voucher('SALE10', self.user).is_valid)
+
+    def test_unknown_code_cached_until_created(self):
+        self.assertEqual(vouchers.check_voucher('NOPE1', self.user).status, vouchers.NOT_FOUND)
+        with self.assertNumQueries(0):
+            self.assertEqual(vouchers.check_voucher('nope1', self.user).status, vouchers.NOT_FOUND)
+
+        Voucher.objects.create(code='NOPE1', discount_percent=5)
+        self.assertTrue(vouchers.check_voucher('NOPE1', self.user).is_valid)
+
+    def test_ajax_endpoint_uses_shared_check(self):
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('ajax_check_voucher')
+
+        self.assertTrue(self.client.get(url, {'code': 'SALE10'}).json()['valid'])
+        data = self.client.get(url, {'code': 'BAD CODE'}).json()
+        self.assertFalse(data['valid'])
+        self.assertIn('chỉ được chứa', data['message'])
+        self.assertEqual(
+            self.client.get(url, {'code': 'MISSING'}).json()['message'],
+            constants.ERR_VOUCHER_NOT_FOUND)
+
+
+class WriteContentionBenchmarkTests(TransactionTestCase):
+    def test_concurrent_writes_restore_voucher(self):
+        result = benchmark.run_write_contention(workers=2, writes=5)
+
+        self.assertEqual(result['ok'] + result['errors'], 10)
+        self.assertGreater(result['ok'], 0)
+        self.assertEqual(
+            Voucher.objects.get(code=constants.BENCHMARK_VOUCHER_CODE).used_count, 0)
+
+
+class ReplicaRoutingTests(AvailabilityFixtureMixin, TransactionTestCase):
+    """Replica là bản chụp file SQLite của DB test: dữ liệu ghi sau đó chưa có trên replica"""
+
+    replica = 'test_replica'
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        path = f'{self.tmpdir}/replica.sqlite3'
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM INTO %s', [path])
+        connections[self.replica] = connections['default'].__class__(
+            dict(connection.settings_dict, NAME=path), self.replica)
+        override = override_settings(DATABASE_REPLICA_ALIAS=self.replica)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.fresh_pitch = Pitch.objects.create(
+            name='Sân mới chưa sao chép', facility=self.facility, pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('100.00'))
+
+    def tearDown(self):
+        connections[self.replica].close()
+        del connections[self.replica]
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        super().tearDown()
+
+    def _listed_names(self):
+        response = self.client.get(reverse('pitch_list'))
+        return {pitch.name for pitch in response.context['pitches']}
+
+    def test_listing_reads_replica(self):
+        self.assertNotIn(self.fresh_pitch.name, self._listed_names())
+
+    def test_write_pins_session_to_primary(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.post(reverse('toggle_favorite', args=[self.pitch.id]))
+
+        self.assertIn(settings.DATABASE_REPLICA_PIN_COOKIE, response.cookies)
+        self.assertIn(self.fresh_pitch.name, self._listed_names())
+        self.assertTrue(Favorite.objects.filter(user=self.user, pitch=self.pitch).exists())
+
+    def test_cached_slots_built_from_primary(self):
+        cache.clear()
+        Booking.objects.create(
+            user=self.user, pitch=self.pitch, time_slot=self.slots[0],
+            booking_date=self.booking_date)
+        response = self.client.get(
+            reverse('ajax_time_slots', args=[self.pitch.id]),
+            {'date': self.booking_date.isoformat()})
+        taken = [slot['id'] for slot in response.json()['slots'] if not slot['is_available']]
+        self.assertEqual(taken, [self.slots[0].id, self.slots[1].id])
+
+        state, token = db_router.start_request()
+        state.use_replica = True
+        try:
+            data = async_to_sync(availability.abuild_slots_data)(self.pitch.id, self.booking_date)
+        finally:
+            db_router.end_request(token)
+        self.assertEqual(data, response.json())
+
+
+class SlotAjaxCacheTests(AvailabilityFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = reverse('ajax_time_slots', args=[self.pitch.id])
+        self.params = {'date': self.booking_date.isoformat()}
+
+    def _taken(self, response):
+        return [slot['id'] for slot in response.json()['slots'] if not slot['is_available']]
+
+    def test_conditional_poll_costs_no_queries(self):
+        response = self.client.get(self.url, self.params)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, self.params)
+        self.assertEqual(self._taken(response), [self.slots[1].id])
+
+    def test_booking_changes_bump_version(self):
+        etag = self.client.get(self.url, self.params)['ETag']
+
+        self.booking.status = BookingStatus.CANCELLED
+        self.booking.save()
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._taken(response), [])
+
+        pending = Booking.objects.create(
+            user=self.user, pitch=self.pitch, time_slot=self.slots[0],
+            booking_date=self.booking_date)
+        etag = self.client.get(self.url, self.params)['ETag']
+        booking_actions.bulk_update_status(Booking.objects.filter(pk=pending.pk), 'reject')
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._taken(response), [])
+
+    def test_time_slot_change_moves_last_modified(self):
+        response = self.client.get(self.url, self.params)
+        last_modified = response['Last-Modified']
+
+        # Sửa TimeSlot 10 giây sau lần đọc trước
+        with patch.object(refdata.time, 'time', return_value=refdata.time.time() + 10):
+            refdata.invalidate(refdata.TIME_SLOTS)
+
+        response = self.client.get(self.url, self.params, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+    def test_warns_about_process_local_cache_with_many_workers(self):
+        self.assertEqual(checks.shared_cache_check(None), [])
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([w.id for w in checks.shared_cache_check(None)], ['main.W001'])
+
+    def test_no_cache_keys_for_unknown_pitch_or_date(self):
+        missing = self.pitch.id + 100
+        response = self.client.get(reverse('ajax_time_slots', args=[missing]), self.params)
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(cache.get(availability._version_key(missing)))
+
+        past = date.today() - timedelta(days=1)
+        response = self.client.get(self.url, {'date': past.isoformat()})
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(cache.get(availability._version_key(self.pitch.id, past)))
+
+    def test_booking_change_drops_superseded_payload(self):
+        self.client.get(self.url, self.params)
+        data_key = availability._data_key(self.pitch.id, self.booking_date)
+        self.assertIsNotNone(cache.get(data_key))
+
+        self.booking.status = BookingStatus.CANCELLED
+        self.booking.save()
+        self.assertIsNone(cache.get(data_key))
+
+
+class SlotEventsTests(AvailabilityFixtureMixin, TransactionTestCase):
+    """Stream SSE phục vụ thẳng trên ASGI (slot_events.route), DB ghi từ thread khác"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.path = reverse('slot_events_stream', args=[self.pitch.id])
+
+    def _connect(self, headers=(), host=b'testserver'):
+        inbox, sent = asyncio.Queue(), asyncio.Queue()
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': self.path, 'root_path': '',
+            'query_string': f'date={self.booking_date.isoformat()}'.encode(),
+            'headers': [(b'host', host)] + list(headers),
+        }
+        task = asyncio.ensure_future(slot_events.route(None)(scope, inbox.get, sent.put))
+        return task, inbox, sent
+
+    async def _next_event(self, sent):
+        while True:
+            message = await asyncio.wait_for(sent.get(), 5)
+            body = message.get('body', b'').decode()
+            if 'event: slots' in body:
+                fields = dict(line.split(': ', 1) for line in body.strip().splitlines())
+                taken = [s['id'] for s in json.loads(fields['data'])['slots'] if not s['is_available']]
+                return fields['id'], taken
+
+    async def _disconnect(self, task, inbox):
+        await inbox.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, 5)
+
+    def test_pushes_booking_changes(self):
+        def book():
+            Booking.objects.create(
+                user=self.user, pitch=self.pitch, time_slot=self.slots[0],
+                booking_date=self.booking_date)
+
+        async def scenario():
+            task, inbox, sent = self._connect()
+            start = await asyncio.wait_for(sent.get(), 5)
+            initial = await self._next_event(sent)
+            self.assertEqual(slot_events.subscriber_count(self.pitch.id), 1)
+            await sync_to_async(book, thread_sensitive=False)()
+            changed = await self._next_event(sent)
+            await self._disconnect(task, inbox)
+            return start, initial, changed
+
+        start, (etag, taken), (new_etag, new_taken) = async_to_sync(scenario)()
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', slot_events.CONTENT_TYPE.encode()), start['headers'])
+        self.assertEqual(taken, [self.slots[1].id])
+        self.assertEqual(new_taken, [self.slots[0].id, self.slots[1].id])
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual(slot_events.subscriber_count(), 0)
+
+    def test_reconnect_with_current_version_skips_snapshot(self):
+        etag, _ = slot_events.availability.slots_payload(self.pitch.id, self.booking_date)
+
+        async def scenario():
+            task, inbox, sent = self._connect([(b'last-event-id', etag.encode())])
+            await asyncio.wait_for(sent.get(), 5)  # http.response.start
+            retry = await asyncio.wait_for(sent.get(), 5)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(sent.get(), 0.2)
+            await self._disconnect(task, inbox)
+            return retry
+
+        retry = async_to_sync(scenario)()
+        self.assertTrue(retry['body'].startswith(b'retry:'))
+
+    def test_rejects_disallowed_host(self):
+        async def scenario():
+            task, _, sent = self._connect(host=b'evil.example')
+            await asyncio.wait_for(task, 5)
+            return await sent.get()
+
+        self.assertEqual(async_to_sync(scenario)()['status'], 400)
+        self.assertEqual(slot_events.subscriber_count(), 0)
+
+    def test_invalid_requests(self):
+        response = self.client.get(self.path, {'date': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse('slot_events_stream', args=[self.pitch.id + 100]),
+            {'date': self.booking_date.isoformat()})
+        self.assertEqual(response.status_code, 404)
+
+    def test_wsgi_fallback_sends_one_snapshot(self):
+        response = self.client.get(self.path, {'date': self.booking_date.isoformat()})
+        self.assertEqual(response['Content-Type'], slot_events.CONTENT_TYPE)
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith(f'retry: {constants.SLOT_EVENTS_FALLBACK_RETRY_MS}'))
+        self.assertIn('event: slots', body)
+
+        etag = body.split('id: ', 1)[1].split('\n', 1)[0]
+        response = self.client.get(
+            self.path, {'date': self.booking_date.isoformat()}, HTTP_LAST_EVENT_ID=etag)
+        self.assertNotIn('event: slots', b''.join(response.streaming_content).decode())
+
+
+@override_settings(ROOT_URLCONF=benchmark._read_urlconf(async_views))
+class AsyncReadViewsTests(AvailabilityFixtureMixin, TestCase):
+    """main/async_views.py qua AsyncClient (middleware chạy ở chế độ async)"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    async def test_pitch_list_marks_favorites(self):
+        other = await Pitch.objects.acreate(
+            name='Pitch 2', facility=self.facility, pitch_type=self.pitch_type,
+            base_price_per_hour=Decimal('80.00'))
+        await Favorite.objects.acreate(user=self.user, pitch=other)
+        # Backend đầu tiên là GoogleOAuth2: chưa có aget_user, phải fallback
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('pitch_list'), {'page': 'x'})
+        self.assertEqual(response.status_code, 200)
+        page = response.context['pitches']
+        self.assertEqual(page.paginator.count, 2)
+        self.assertEqual(
+            {pitch.name: pitch.is_favorited for pitch in page},
+            {'Pitch 1': False, 'Pitch 2': True})
+
+    async def test_facility_detail(self):
+        response = await self.async_client.get(reverse('facility_detail', args=[self.facility.id]))
+        self.assertContains(response, '1 sân')
+        response = await self.async_client.get(reverse('facility_detail', args=[self.facility.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_slots_payload_matches_sync_builder(self):
+        url = reverse('ajax_time_slots', args=[self.pitch.id])
+        response = await self.async_client.get(url, {'date': self.booking_date.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(availability.build_slots_data)(self.pitch, self.booking_date)
+        self.assertEqual(response.json(), expected)
+
+        response = await self.async_client.get(
+            reverse('ajax_time_slots', args=[self.pitch.id + 100]),
+            {'date': self.booking_date.isoformat()})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_slots_conditional_get(self):
+        url = reverse('ajax_time_slots', args=[self.pitch.id])
+        params = {'date': self.booking_date.isoformat()}
+        response = await self.async_client.get(url, params)
+        etag, _ = await sync_to_async(availability.slots_version)(self.pitch.id, self.booking_date)
+        self.assertEqual(response['ETag'], f'"{etag}"')
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        response = await self.async_client.get(url, params, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_check_voucher_counts_queries(self):
+        await Voucher.objects.acreate(code='ASYNC10', discount_percent=10)
+        metrics.registry.reset()
+        response = await self.async_client.get(reverse('ajax_check_voucher'), {'code': 'async10'})
+        self.assertEqual(response.json()['discount_percent'], 10)
+        self.assertGreater(metrics.registry.queries['ajax_check_voucher'].total, 0)
+
+
+class AsgiBenchmarkTests(AvailabilityFixtureMixin, TransactionTestCase):
+    def test_compares_sync_and_async_views(self):
+        results = benchmark.run_asgi_comparison(requests=10, concurrency=3)
+
+        self.assertEqual(set(results), {'sync', 'async'})
+        for result in results.values():
+            self.assertGreater(result['req_per_s'], 0)
+            self.assertGreater(result['peak_alloc_kb'], 0)
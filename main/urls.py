@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# View chỉ đọc có bản async (main/async_views.py), chọn theo settings
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
 
 urlpatterns = [
     path('', views.home, name='home'),  
@@ -8,10 +12,10 @@ urlpatterns = [
         'activate/<str:token>/',
         views.activate_account,
         name='activate_account'),
-    path('pitches/', views.pitch_list, name='pitch_list'),
+    path('pitches/', read_views.pitch_list, name='pitch_list'),
     path(
         'facility/<int:facility_id>/',
-        views.facility_detail,
+        read_views.facility_detail,
         name='facility_detail'),
     path('favorites/', views.favorite_list, name='favorite_list'),
     path(
@@ -23,8 +27,16 @@ urlpatterns = [
         'dashboard/bookings/',
         views.admin_booking_list,
         name='admin_booking_list'),
+    path(
+        'dashboard/bookings/export/',
+        views.admin_booking_export,
+        name='admin_booking_export'),
     path('dashboard/bookings/<int:booking_id>/update-status/', views.admin_update_booking_status,
          name='admin_update_booking_status'),
+    path('dashboard/bookings/bulk-update/', views.admin_booking_bulk_update,
+         name='admin_booking_bulk_update'),
+    path('dashboard/metrics', views.metrics_view, name='metrics'),
+    path('dashboard/analytics/', views.admin_analytics, name='admin_analytics'),
     # Admin pitch CRUD
     # Admin pitch CRUD (đổi prefix tránh trùng /admin/ của Django admin)
     path('dashboard/pitches/', views.admin_pitch_list, name='admin_pitch_list'),
@@ -67,11 +79,27 @@ urlpatterns = [
     # AJAX
     path(
         'ajax/time-slots/<int:pitch_id>/',
-        views.get_available_time_slots_ajax,
+        read_views.get_available_time_slots_ajax,
         name='ajax_time_slots'),
+    path(
+        'ajax/slots-stream/<int:pitch_id>/',
+        views.slot_events_stream,
+        name='slot_events_stream'),
+    path(
+        'ajax/calendar/<int:pitch_id>/',
+        views.get_pitch_calendar_ajax,
+        name='ajax_pitch_calendar'),
+    path(
+        'ajax/calendar/facility/<int:facility_id>/',
+        views.get_facility_calendar_ajax,
+        name='ajax_facility_calendar'),
+    path(
+        'ajax/reviews/<int:pitch_id>/',
+        views.get_pitch_reviews_ajax,
+        name='ajax_pitch_reviews'),
     path(
         'ajax/check-voucher/',
-        views.check_voucher_ajax,
+        read_views.check_voucher_ajax,
         name='ajax_check_voucher'),
 
     path('pitch/<int:pitch_id>/review/', views.add_review, name='add_review'),
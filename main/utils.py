@@ -1,6 +1,6 @@
 import logging
-from smtplib import SMTPException
 from .constants import (
+    BOOKING_REJECT_DEFAULT_REASON,
     EMAIL_SUBJECT_BOOKING_CONFIRMATION,
     EMAIL_SUBJECT_BOOKING_APPROVED,
     EMAIL_SUBJECT_BOOKING_REJECTION,
@@ -12,6 +12,7 @@ from .constants import (
 )
 from django.core.mail import send_mail
 from django.conf import settings
+from .outbox import enqueue_email
 from datetime import timedelta
 from django.utils import timezone
 import secrets
@@ -94,6 +95,30 @@ def verify_activation_token(token):
 logger = logging.getLogger(__name__)
 
 
+def build_booking_email(
+        booking,
+        subject_template,
+        message_template,
+        extra_context=None):
+    """Dựng (subject, message) cho email thông báo booking."""
+    context = {
+        "user_name": booking.user.get_full_name(),
+        "pitch_name": booking.pitch.name,
+        "booking_date": booking.booking_date.strftime('%d/%m/%Y'),
+        "time_slot_name": booking.time_slot.time_slot.name,
+        "start_time": booking.time_slot.time_slot.start_time.strftime('%H:%M'),
+        "end_time": booking.time_slot.time_slot.end_time.strftime('%H:%M'),
+        "final_price": f"{booking.final_price:,.0f}"}
+
+    if extra_context:
+        context.update(extra_context)
+
+    return (
+        subject_template.format(booking_id=booking.id),
+        message_template.format(**context),
+    )
+
+
 def send_booking_email(
         booking,
         subject_template,
@@ -101,35 +126,21 @@ def send_booking_email(
         extra_context=None):
     """
     Hàm gửi email tái sử dụng cho tất cả loại thông báo booking.
+
+    Email được ghi vào outbox (cùng transaction hiện tại) và gửi bởi
+    worker `manage.py send_queued_emails`, request không chờ SMTP.
     """
     try:
-        context = {
-            "user_name": booking.user.get_full_name(),
-            "pitch_name": booking.pitch.name,
-            "booking_date": booking.booking_date.strftime('%d/%m/%Y'),
-            "time_slot_name": booking.time_slot.time_slot.name,
-            "start_time": booking.time_slot.time_slot.start_time.strftime('%H:%M'),
-            "end_time": booking.time_slot.time_slot.end_time.strftime('%H:%M'),
-            "final_price": f"{booking.final_price:,.0f}"}
-
-        if extra_context:
-            context.update(extra_context)
-
-        subject = subject_template.format(booking_id=booking.id)
-        message = message_template.format(**context)
-
-        send_mail(
+        subject, message = build_booking_email(
+            booking, subject_template, message_template, extra_context)
+
+        enqueue_email(
             subject=subject,
             message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[booking.user.email],
-            fail_silently=False,
         )
         return True
 
-    except SMTPException as e:
-        logger.error(f"Lỗi gửi mail (SMTP): {e}")
-
     except Exception as e:
         logger.error(f"Lỗi không xác định khi gửi mail: {e}", exc_info=True)
 
@@ -154,7 +165,7 @@ def send_booking_approved_email(booking):
 
 def send_booking_rejection_email(
         booking,
-        reason="Khung giờ đã có người đặt hoặc sân không khả dụng."):
+        reason=BOOKING_REJECT_DEFAULT_REASON):
     return send_booking_email(
         booking,
         EMAIL_SUBJECT_BOOKING_REJECTION,
@@ -1,28 +1,27 @@
 # Built-in imports
-import re
+import hmac
 import logging
-from datetime import datetime, date
-from decimal import Decimal
-from smtplib import SMTPException
+from collections import defaultdict
+from datetime import datetime, date, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
 from django.db import transaction
-from django.core.mail import send_mail
 
 # Django imports
-from django.http import BadHeaderError, HttpResponseNotAllowed, JsonResponse, HttpResponseForbidden
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q, Exists, OuterRef
+from django.db.models import F, Q, Exists, Min, OuterRef
 from django.contrib import messages
 from django.utils import timezone
-from django.core.files.storage import default_storage
-from django.views.decorators.http import require_http_methods, require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods, require_POST
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 
 # Third-party imports
 from django_ratelimit.decorators import ratelimit
 
-from PitchManager import settings
-
 # Local imports
 from .utils import (
     send_booking_confirmation_email,
@@ -32,33 +31,26 @@ from .utils import (
     send_activation_email,
     verify_activation_token
 )
-from .decorators import user_or_admin_required
+from .availability import (
+    build_occupancy_bitmap, build_slots_data, get_cached_slots, get_slot_availability,
+    in_booking_window, pitch_exists, set_cached_slots, slots_version,
+)
+from .decorators import replica_reads, user_or_admin_required
+from .outbox import enqueue_email
+from .pagination import KeysetPaginator
+from .search import search_facilities, search_pitches
 from .forms import SignUpForm, BookingForm, DateSelectionForm, ReviewForm, PitchForm, VoucherForm
 from .models import Booking, Facility, Pitch, PitchTimeSlot, PitchType, Voucher, BookingStatus, Favorite, Role, Review
-from . import constants
+from . import analytics, booking_actions, constants, exports, image_jobs, metrics, refdata, slot_events
+from .images import save_pitch_images
+from .reviews import review_page, serialize_review
+from .vouchers import INVALID_FORMAT, check_voucher, validate_voucher_code
 from django.core.exceptions import ValidationError
 
 
 logger = logging.getLogger(__name__)
 
 
-def save_pitch_images(files):
-    """
-    Save pitch images with sanitized filenames to prevent security issues.
-    """
-    from django.utils.text import get_valid_filename
-    import uuid
-    import os
-    
-    saved_paths = []
-    for f in files:
-        # Generate unique filename to prevent collisions
-        ext = os.path.splitext(f.name)[1]
-        unique_name = f"{uuid.uuid4()}{ext}"
-        path = default_storage.save(f"pitches/{unique_name}", f)
-        saved_paths.append(path)
-    return saved_paths
-
 def home(request): 
     q = request.GET.get("q", "") 
     facilities = Facility.objects.all() 
@@ -148,16 +140,6 @@ def facility_detail(request, facility_id):
     } 
     return render(request, 'user/facility_detail.html', context)
 
-def validate_voucher_code(code): 
-    if not code: 
-        return False, "Mã giảm giá không được để trống" 
-    code = code.strip() 
-    if len(code) > constants.VOUCHER_CODE_MAX_LENGTH: 
-        return False, f"Mã giảm giá không được vượt quá {constants.VOUCHER_CODE_MAX_LENGTH} ký tự" 
-    if not re.match(constants.VOUCHER_CODE_PATTERN, code): 
-        return False, "Mã giảm giá chỉ được chứa chữ cái, số, dấu gạch ngang và gạch dưới" 
-    return True, "" 
-
 def pitch_list(request): 
     pitches = Pitch.objects.select_related('pitch_type', 'facility').all() 
     search_query = request.GET.get('q', '') 
@@ -289,7 +271,7 @@ def book_pitch(request, pitch_id):
                     slot_data = { 
                         'id': pitch_time_slot.id, 
                         'time_slot': pitch_time_slot.time_slot, 
-                        'duration_hours': pitch_time_slot.time_slot.duration_hours(), 
+                        'duration_hours': pitch_time_slot.time_slot.duration_hours, 
                         'price': price 
                     } 
                     available_time_slots.append(slot_data) 
@@ -439,10 +421,14 @@ def admin_pitch_create(request):
     form = PitchForm(request.POST or None, request.FILES or None)
     if request.method == "POST" and form.is_valid():
         pitch = form.save(commit=False)
-        images = form.clean_multiple_images()
+        images = form.cleaned_data.get("multiple_images")
         if images:
+            # Chỉ lưu file gốc, thumbnail/WebP do worker process_image_jobs sinh sau
             pitch.images = save_pitch_images(images)
-        pitch.save()
+        with transaction.atomic():
+            pitch.save()
+            if images:
+                image_jobs.enqueue_for_pitch(pitch)
         messages.success(request, "Tạo sân thành công.")
         return redirect("admin_pitch_list")
 
@@ -459,10 +445,14 @@ def admin_pitch_update(request, pitch_id):
 
     if request.method == "POST" and form.is_valid():
         pitch = form.save(commit=False)
-        images = form.clean_multiple_images()
+        images = form.cleaned_data.get("multiple_images")
         if images:
+            # Chỉ lưu file gốc, thumbnail/WebP do worker process_image_jobs sinh sau
             pitch.images = save_pitch_images(images)
-        pitch.save()
+        with transaction.atomic():
+            pitch.save()
+            if images:
+                image_jobs.enqueue_for_pitch(pitch)
         messages.success(request, "Cập nhật sân thành công.")
         return redirect("admin_pitch_list")
 
@@ -551,11 +541,14 @@ def admin_voucher_delete(request, voucher_id):
     return redirect("admin_voucher_list")
 
 
+@replica_reads
 def home(request):
     q = request.GET.get("q", "")
-    facilities = Facility.objects.all()
     if q:
-        facilities = facilities.filter(name__icontains=q)
+        facilities = search_facilities(
+            Facility.objects.all(), q).order_by('-search_rank', 'name')
+    else:
+        facilities = refdata.get_facilities()
     context = {
         'facilities': facilities,
         'default_facility_image': constants.DEFAULT_FACILITY_IMAGE,
@@ -568,23 +561,68 @@ def home(request):
     return render(request, 'main/home.html', context)
 
 
+def metrics_view(request):
+    """Prometheus text: latency / query count / DB + template time theo view"""
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if (request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS
+            or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())):
+        return HttpResponseForbidden("Metrics chỉ cho phép truy cập nội bộ.")
+    return HttpResponse(
+        metrics.registry.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required(login_url='login')
-def admin_booking_list(request):
-    """Trang admin: xem + filter đơn đặt sân, kèm nút approve/reject."""
+def admin_analytics(request):
+    """Trang admin: doanh thu / công suất theo cơ sở, sân, khung giờ (đọc từ rollup)."""
     if request.user.role != constants.ROLE_ADMIN:
         return HttpResponseForbidden(
-            "Bạn không có quyền truy cập trang quản lý đơn đặt sân.")
+            "Bạn không có quyền truy cập trang thống kê.")
+
+    date_to = date.today()
+    date_from = date_to - timedelta(days=constants.ANALYTICS_DEFAULT_DAYS - 1)
+    try:
+        if request.GET.get("date_from"):
+            date_from = datetime.strptime(request.GET["date_from"], "%Y-%m-%d").date()
+        if request.GET.get("date_to"):
+            date_to = datetime.strptime(request.GET["date_to"], "%Y-%m-%d").date()
+    except ValueError:
+        messages.warning(request, "Định dạng ngày không hợp lệ.")
+    if date_from > date_to:
+        date_from, date_to = date_to, date_from
+    if (date_to - date_from).days >= constants.ANALYTICS_MAX_DAYS:
+        date_from = date_to - timedelta(days=constants.ANALYTICS_MAX_DAYS - 1)
+        messages.warning(
+            request, f"Chỉ xem được tối đa {constants.ANALYTICS_MAX_DAYS} ngày một lần.")
+
+    facility_id = request.GET.get("facility", "")
+    if not facility_id.isdigit():
+        facility_id = ""
+
+    context = {
+        "summary": analytics.dashboard_summary(
+            date_from, date_to, int(facility_id) if facility_id else None),
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "facility_filter": facility_id,
+        "facilities": refdata.get_facilities(),
+    }
+    return render(request, "host/analytics.html", context)
 
+
+def _filter_admin_bookings(request, bookings):
+    """
+    Áp filter status / date_from / date_to / facility của trang quản lý đơn.
+
+    Returns:
+        tuple: (queryset đã lọc, dict giá trị filter hợp lệ cho template)
+    """
     status_filter = request.GET.get("status", "")
     date_from = request.GET.get("date_from", "")
     date_to = request.GET.get("date_to", "")
-
-    bookings = (
-        Booking.objects
-        .select_related("user", "pitch", "pitch__facility")
-        .all()
-        .order_by("-created_at")
-    )
+    facility_filter = request.GET.get("facility", "")
 
     if status_filter:
         bookings = bookings.filter(status=status_filter)
@@ -606,27 +644,82 @@ def admin_booking_list(request):
                 request, "Định dạng ngày 'đến ngày' không hợp lệ.")
             date_to = ""
 
-    paginator = Paginator(bookings, constants.ADMIN_LIST_PER_PAGE)
-    page_number = request.GET.get("page")
-
-    try:
-        bookings_page = paginator.page(page_number)
-    except PageNotAnInteger:
-        bookings_page = paginator.page(1)
-    except EmptyPage:
-        bookings_page = paginator.page(paginator.num_pages)
+    if facility_filter.isdigit():
+        bookings = bookings.filter(pitch__facility_id=facility_filter)
+    else:
+        facility_filter = ""
 
-    context = {
-        "bookings": bookings_page,
+    return bookings, {
         "status_filter": status_filter,
         "date_from": date_from,
         "date_to": date_to,
+        "facility_filter": facility_filter,
+    }
+
+
+@login_required(login_url='login')
+def admin_booking_list(request):
+    """Trang admin: xem + filter đơn đặt sân, kèm nút approve/reject."""
+    if request.user.role != constants.ROLE_ADMIN:
+        return HttpResponseForbidden(
+            "Bạn không có quyền truy cập trang quản lý đơn đặt sân.")
+
+    bookings, filters = _filter_admin_bookings(
+        request,
+        Booking.objects
+        .select_related("user", "pitch", "pitch__facility")
+        .all()
+        .order_by("-created_at")
+    )
+
+    page_number = request.GET.get("page")
+    use_keyset = not page_number
+
+    if use_keyset:
+        # Mặc định dùng cursor: không COUNT(*), không OFFSET
+        paginator = KeysetPaginator(
+            bookings,
+            constants.ADMIN_BOOKING_KEYSET_ORDER,
+            constants.ADMIN_LIST_PER_PAGE)
+        bookings_page = paginator.page(request.GET.get("cursor"))
+    else:
+        paginator = Paginator(bookings, constants.ADMIN_LIST_PER_PAGE)
+        try:
+            bookings_page = paginator.page(page_number)
+        except PageNotAnInteger:
+            bookings_page = paginator.page(1)
+        except EmptyPage:
+            bookings_page = paginator.page(paginator.num_pages)
+
+    context = {
+        "bookings": bookings_page,
+        "use_keyset": use_keyset,
+        **filters,
+        "facilities": refdata.get_facilities(),
         "status_choices": BookingStatus.choices,
         "booking_status": BookingStatus,
     }
     return render(request, "host/pitch_manage.html", context)
 
 
+@login_required(login_url='login')
+def admin_booking_export(request):
+    """Xuất CSV đơn đặt sân (cùng filter với trang quản lý), stream từng dòng."""
+    if request.user.role != constants.ROLE_ADMIN:
+        return HttpResponseForbidden(
+            "Bạn không có quyền xuất dữ liệu đơn đặt sân.")
+
+    bookings, _ = _filter_admin_bookings(request, Booking.objects.all())
+    # Dưới ASGI chỉ async iterator mới được stream thật (xem main/exports.py)
+    rows = exports.abooking_csv_rows if isinstance(request, ASGIRequest) else exports.booking_csv_rows
+    response = StreamingHttpResponse(
+        rows(bookings),
+        content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = (
+        f'attachment; filename="bookings-{date.today().isoformat()}.csv"')
+    return response
+
+
 @login_required(login_url='login')
 def admin_update_booking_status(request, booking_id):
     """Admin approve/reject đơn và gửi email cho user."""
@@ -669,43 +762,100 @@ def admin_update_booking_status(request, booking_id):
         return redirect("admin_booking_list")
 
     old_status = booking.status
-    booking.status = new_status
-    booking.save(update_fields=["status"])
 
-    if (
-        booking.voucher
-        and old_status == BookingStatus.PENDING
-        and new_status == BookingStatus.CONFIRMED
-    ):
-        booking.voucher.used_count += 1
-        booking.voucher.save(update_fields=["used_count"])
+    with transaction.atomic():
+        booking.status = new_status
+        booking.save(update_fields=["status"])
 
-    if booking.user.email:
-        try:
-            send_mail(
+        if (
+            booking.voucher
+            and old_status == BookingStatus.PENDING
+            and new_status == BookingStatus.CONFIRMED
+        ):
+            Voucher.objects.filter(pk=booking.voucher_id).update(
+                used_count=F("used_count") + 1)
+
+        conflicts = []
+        if new_status == BookingStatus.CONFIRMED:
+            conflicts = booking_actions.reject_conflicting_bookings([booking])
+
+        if booking.user.email:
+            enqueue_email(
                 subject=subject,
                 message=message,
-                from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
                 recipient_list=[booking.user.email],
-                fail_silently=True,
             )
-        except (BadHeaderError, SMTPException):
-            messages.warning(
-                request, "Cập nhật trạng thái thành công nhưng gửi email thất bại.")
-        else:
-            messages.success(
-                request, f"{success_msg} Email thông báo đã được gửi.")
+
+    if booking.user.email:
+        messages.success(
+            request, f"{success_msg} Email thông báo sẽ được gửi trong giây lát.")
     else:
         messages.success(
             request,
             f"{success_msg} (User không có email để gửi thông báo).")
+    if conflicts:
+        messages.info(
+            request, constants.MSG_BOOKING_CONFLICTS_REJECTED.format(count=len(conflicts)))
 
     return redirect("admin_booking_list")
 
 
+@login_required(login_url='login')
+def admin_booking_bulk_update(request):
+    """Admin duyệt / từ chối nhiều đơn đang chờ trong một lần submit."""
+    if request.user.role != constants.ROLE_ADMIN:
+        return HttpResponseForbidden(
+            "Bạn không có quyền cập nhật đơn đặt sân.")
+
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    action = request.POST.get("action")
+    if action not in booking_actions.BULK_ACTIONS:
+        messages.error(request, "Hành động không hợp lệ.")
+        return redirect("admin_booking_list")
+
+    booking_ids = {
+        int(value) for value in request.POST.getlist("booking_ids") if value.isdigit()}
+    if not booking_ids:
+        messages.error(request, constants.ERR_BOOKING_BULK_EMPTY)
+        return redirect("admin_booking_list")
+
+    changed, conflicts = booking_actions.bulk_update_status(
+        Booking.objects.filter(id__in=booking_ids),
+        action,
+        reason=request.POST.get("reason", "").strip(),
+    )
+
+    success_msg = (
+        constants.MSG_BOOKING_BULK_APPROVED if action == "approve"
+        else constants.MSG_BOOKING_BULK_REJECTED)
+    messages.success(request, success_msg.format(count=len(changed)))
+    if conflicts:
+        messages.info(
+            request, constants.MSG_BOOKING_CONFLICTS_REJECTED.format(count=len(conflicts)))
+    # Đơn được chọn nhưng không đổi trạng thái: trùng giờ với đơn khác trong
+    # lô (vẫn chờ khi tắt tự từ chối) hoặc đã được xử lý trước đó
+    remaining = booking_ids - {b.id for b in changed} - {b.id for b in conflicts}
+    if remaining:
+        held = 0
+        if action == "approve":
+            held = Booking.objects.filter(
+                id__in=remaining, status=BookingStatus.PENDING).count()
+        if held:
+            messages.warning(
+                request, constants.MSG_BOOKING_BULK_OVERLAP_PENDING.format(count=held))
+        if len(remaining) > held:
+            messages.warning(
+                request, constants.MSG_BOOKING_BULK_SKIPPED.format(count=len(remaining) - held))
+
+    return redirect("admin_booking_list")
+
+
+@replica_reads
 def facility_detail(request, facility_id):
     facility = get_object_or_404(Facility, id=facility_id)
-    pitches = facility.pitches.filter(is_available=True)
+    pitches = facility.pitches.filter(is_available=True).select_related('pitch_type')
 
     context = {
         'facility': facility,
@@ -718,44 +868,27 @@ def facility_detail(request, facility_id):
     return render(request, 'user/facility_detail.html', context)
 
 
-def validate_voucher_code(code):
+def _pitch_list_queryset(params):
     """
-    Validate voucher code format
-    Returns: (is_valid, error_message)
-    """
-    if not code:
-        return False, "Mã giảm giá không được để trống"
-
-    # Remove whitespace
-    code = code.strip()
-
-    # Check length
-    if len(code) > constants.VOUCHER_CODE_MAX_LENGTH:
-        return False, f"Mã giảm giá không được vượt quá {constants.VOUCHER_CODE_MAX_LENGTH} ký tự"
-
-    # Check for valid characters
-    if not re.match(constants.VOUCHER_CODE_PATTERN, code):
-        return False, "Mã giảm giá chỉ được chứa chữ cái, số, dấu gạch ngang và gạch dưới"
-
-    return True, ""
+    Queryset Pitch theo filter / sort của trang danh sách sân (chưa query),
+    dùng chung cho pitch_list và bản async.
 
-
-def pitch_list(request):
+    Returns:
+        tuple: (pitches, has_filters)
+    """
     pitches = Pitch.objects.select_related('pitch_type', 'facility').all()
 
-    search_query = request.GET.get('q', '')
-    pitch_type_filter = request.GET.get('pitch_type', '')
-    price_range_filter = request.GET.get('price_range', '')
-    booking_date_filter = request.GET.get('booking_date', '')
-    sort_by = request.GET.get('sort', 'name')
+    search_query = params.get('q', '')
+    pitch_type_filter = params.get('pitch_type', '')
+    price_range_filter = params.get('price_range', '')
+    booking_date_filter = params.get('booking_date', '')
+    slot_price_max_filter = params.get('slot_price_max', '')
+    sort_by = params.get(
+        'sort', 'relevance' if search_query else 'name')
 
-    # Filter by search query
+    # Filter by search query (không dấu, prefix, xếp hạng theo độ liên quan)
     if search_query:
-        pitches = pitches.filter(
-            Q(name__icontains=search_query) |
-            Q(facility__name__icontains=search_query) |
-            Q(facility__address__icontains=search_query)
-        )
+        pitches = search_pitches(pitches, search_query)
 
     # Filter by pitch type
     if pitch_type_filter:
@@ -793,8 +926,33 @@ def pitch_list(request):
         except ValueError:
             pass
 
+    # Filter theo giá thực của slot (PitchTimeSlot.price, đã lưu sẵn + index)
+    if slot_price_max_filter:
+        try:
+            slot_price_max = Decimal(slot_price_max_filter)
+        except (InvalidOperation, ValueError):
+            slot_price_max = None
+        # Decimal nhận cả NaN / Infinity, lỗi chỉ nổ lúc query chạy
+        if slot_price_max is not None and slot_price_max.is_finite():
+            pitches = pitches.filter(Exists(PitchTimeSlot.objects.filter(
+                pitch=OuterRef('pk'), is_available=True,
+                price__lte=slot_price_max)))
+
     # Sorting
-    if sort_by == 'name':
+    if sort_by in ('slot_price', '-slot_price'):
+        pitches = pitches.annotate(min_slot_price=Min(
+            'time_slots__price', filter=Q(time_slots__is_available=True)))
+
+    if sort_by == 'relevance' and search_query:
+        pitches = pitches.order_by('-search_rank', 'name')
+    elif sort_by == 'slot_price':
+        pitches = pitches.order_by(F('min_slot_price').asc(nulls_last=True), 'name')
+    elif sort_by == '-slot_price':
+        pitches = pitches.order_by(F('min_slot_price').desc(nulls_last=True), 'name')
+    elif sort_by == 'rating':
+        # Khớp index pitch_rating_idx (id = rowid đi kèm index)
+        pitches = pitches.order_by('-rating_avg', '-review_count', 'id')
+    elif sort_by == 'name':
         pitches = pitches.order_by('name')
     elif sort_by == '-name':
         pitches = pitches.order_by('-name')
@@ -806,9 +964,33 @@ def pitch_list(request):
         pitches = pitches.order_by('name')
 
     has_filters = any([search_query, pitch_type_filter,
-                      price_range_filter, booking_date_filter])
+                      price_range_filter, booking_date_filter,
+                      slot_price_max_filter])
 
-    pitch_types = PitchType.objects.all()
+    return pitches, has_filters
+
+
+def _mark_favorites(pitches, favorite_pitch_ids):
+    for pitch in pitches:
+        pitch.is_favorited = pitch.id in favorite_pitch_ids
+
+
+def _pitch_list_context(request, pitches_page, pitch_types, has_filters):
+    return {
+        'pitches': pitches_page,
+        'pitch_types': pitch_types,
+        'has_filters': has_filters,
+        # Convert request.GET to dict for template
+        'request_get': dict(request.GET.items()),
+        'selected_booking_date': request.GET.get('booking_date', ''),
+        'default_pitch_image': constants.DEFAULT_PITCH_IMAGE,
+    }
+
+
+@replica_reads
+def pitch_list(request):
+    pitches, has_filters = _pitch_list_queryset(request.GET)
+    pitch_types = refdata.get_pitch_types()
 
     # Pagination using constant
     paginator = Paginator(pitches, constants.ITEMS_PER_PAGE)
@@ -821,20 +1003,13 @@ def pitch_list(request):
     except EmptyPage:
         pitches_page = paginator.page(paginator.num_pages)
 
-    # Convert request.GET to dict for template
-    request_get_dict = {}
-    for key, value in request.GET.items():
-        request_get_dict[key] = value
-
-    context = {
-        'pitches': pitches_page,
-        'pitch_types': pitch_types,
-        'has_filters': has_filters,
-        'request_get': request_get_dict,
-        'selected_booking_date': booking_date_filter,
-        'default_pitch_image': constants.DEFAULT_PITCH_IMAGE,
-    }
+    if request.user.is_authenticated:
+        _mark_favorites(pitches_page, set(Favorite.objects.filter(
+            user=request.user,
+            pitch_id__in=[pitch.id for pitch in pitches_page]
+        ).values_list('pitch_id', flat=True)))
 
+    context = _pitch_list_context(request, pitches_page, pitch_types, has_filters)
     return render(request, 'user/pitch_list.html', context)
 
 
@@ -843,41 +1018,21 @@ def _apply_voucher_to_booking(booking, voucher_code, request):
     if not voucher_code:
         return False
 
-    is_valid_format, error_message = validate_voucher_code(voucher_code)
-
-    if not is_valid_format:
+    result = check_voucher(voucher_code, request.user)
+    if result.status == INVALID_FORMAT:
         messages.warning(
             request,
-            f'{error_message}, đặt sân không áp dụng giảm giá.')
+            f'{result.message}, đặt sân không áp dụng giảm giá.')
         return False
-
-    voucher_code_clean = voucher_code.strip().upper()
-    try:
-        voucher = Voucher.objects.get(code=voucher_code_clean)
-        if not voucher.is_valid():
-            messages.warning(request, constants.ERR_VOUCHER_INVALID)
-            return False
-
-        # Ensure a user only uses a voucher once (excluding rejected bookings)
-        already_used = Booking.objects.filter(
-            user=request.user,
-            voucher=voucher
-        ).exclude(status=BookingStatus.REJECTED).exists()
-
-        if already_used:
-            messages.warning(
-                request,
-                "Bạn đã sử dụng voucher này trước đó. Mỗi người chỉ dùng 1 lần.")
-            return False
-
-        booking.voucher = voucher
-        messages.success(
-            request, f'Đã áp dụng mã giảm giá {voucher.discount_percent}%!')
-        return True
-    except Voucher.DoesNotExist:
-        messages.warning(request, constants.ERR_VOUCHER_NOT_FOUND)
+    if not result.is_valid:
+        messages.warning(request, result.message)
         return False
 
+    booking.voucher = result.voucher
+    messages.success(
+        request, f'Đã áp dụng mã giảm giá {result.voucher.discount_percent}%!')
+    return True
+
 
 # ============= USER BOOKING VIEWS =============
 
@@ -914,9 +1069,8 @@ def user_booking_create(request, pitch_id):
     available_time_slots = []
     time_slot_choices = []
 
-    # Get reviews
-    reviews = Review.objects.filter(pitch=pitch).select_related(
-        'user').order_by('-created_at')
+    # Trang review đầu tiên, các trang sau tải bằng ajax_pitch_reviews
+    reviews = review_page(pitch)
 
     # Check if user can review
     can_review = False
@@ -935,21 +1089,21 @@ def user_booking_create(request, pitch_id):
     applied_discount_percent = None
 
     if booking_date:
-        all_time_slots = PitchTimeSlot.objects.filter(
+        all_time_slots = refdata.with_time_slots(PitchTimeSlot.objects.filter(
             pitch=pitch,
             is_available=True
-        ).select_related('time_slot').order_by('time_slot__start_time')
+        ))
 
-        for pts in all_time_slots:
-            is_available = pts.is_available_on_date(booking_date)
+        availability = get_slot_availability(pitch, booking_date, all_time_slots)
 
+        for pts, is_available in availability.items():
             # Prepare data for template
             slot_data = {
                 'id': pts.id,
                 'name': pts.time_slot.name,
                 'start_time': pts.time_slot.start_time,
                 'end_time': pts.time_slot.end_time,
-                'duration': pts.time_slot.duration_hours(),
+                'duration': pts.time_slot.duration_hours,
                 'price': pts.get_price(),
                 'is_available': is_available
             }
@@ -963,20 +1117,8 @@ def user_booking_create(request, pitch_id):
 
         # Apply voucher preview for display if voucher_code provided
         if voucher_code:
-            is_valid_format, error_message = validate_voucher_code(voucher_code)
-            if is_valid_format:
-                try:
-                    voucher_obj = Voucher.objects.get(code=voucher_code.strip().upper())
-                    if voucher_obj.is_valid():
-                        already_used = Booking.objects.filter(
-                            user=request.user,
-                            voucher=voucher_obj
-                        ).exclude(status=BookingStatus.REJECTED).exists() if request.user.is_authenticated else False
-                        if not already_used:
-                            applied_discount_percent = voucher_obj.discount_percent
-                except Voucher.DoesNotExist:
-                    pass
             # If voucher invalid, just ignore for preview
+            applied_discount_percent = check_voucher(voucher_code, request.user).discount_percent
         if applied_discount_percent:
             for slot in available_time_slots:
                 discounted = (slot['price'] * (Decimal(100) - Decimal(applied_discount_percent)) / Decimal(100)).quantize(Decimal('0.01'))
@@ -1010,11 +1152,12 @@ def user_booking_create(request, pitch_id):
                 # Apply voucher if provided
                 _apply_voucher_to_booking(booking, voucher_code, request)
 
-                # Save booking (auto-calculate duration & price in model)
-                booking.save()
+                with transaction.atomic():
+                    # Save booking (auto-calculate duration & price in model)
+                    booking.save()
 
-                # Send confirmation email
-                send_booking_confirmation_email(booking)
+                    # Queue confirmation email (gửi bởi worker outbox)
+                    send_booking_confirmation_email(booking)
 
                 messages.success(request, constants.MSG_BOOKING_CREATED)
                 return redirect('user_booking_detail', booking_id=booking.id)
@@ -1058,19 +1201,29 @@ def user_booking_list(request):
 
     bookings = bookings.select_related(
         'pitch', 'time_slot__time_slot', 'voucher'
-    ).order_by('-booking_date', '-created_at')
+    ).order_by('-booking_date', '-created_at', '-id')
 
     # Filter by status
     status_filter = request.GET.get('status')
     if status_filter:
         bookings = bookings.filter(status=status_filter)
 
-    # Pagination
-    paginator = Paginator(bookings, constants.BOOKINGS_PER_PAGE)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    # Pagination: cursor mặc định, ?page= để dùng phân trang theo số trang
+    page_number = request.GET.get('page')
+    use_keyset = not page_number
+    if use_keyset:
+        paginator = KeysetPaginator(
+            bookings,
+            constants.USER_BOOKING_KEYSET_ORDER,
+            constants.BOOKINGS_PER_PAGE)
+        page_obj = paginator.page(request.GET.get('cursor'))
+    else:
+        paginator = Paginator(bookings, constants.BOOKINGS_PER_PAGE)
+        page_obj = paginator.get_page(page_number)
 
     context = {
         'page_obj': page_obj,
+        'use_keyset': use_keyset,
         'status_filter': status_filter,
         'booking_statuses': BookingStatus.choices,
         'is_admin': request.user.role == Role.ADMIN,
@@ -1111,11 +1264,12 @@ def user_booking_cancel(request, booking_id):
 
     if request.method == 'POST':
 
-        booking.status = BookingStatus.CANCELLED
-        booking.save(update_fields=['status'])
+        with transaction.atomic():
+            booking.status = BookingStatus.CANCELLED
+            booking.save(update_fields=['status'])
 
-        # Send cancellation email
-        send_booking_cancellation_email(booking)
+            # Queue cancellation email
+            send_booking_cancellation_email(booking)
 
         messages.success(request, constants.MSG_BOOKING_CANCELLED)
         return redirect('user_booking_list')
@@ -1142,16 +1296,22 @@ def admin_booking_approve(request, booking_id):
         messages.error(request, constants.ERR_BOOKING_ONLY_APPROVE_PENDING)
         return redirect('user_booking_detail', booking_id=booking_id)
 
-    booking.status = BookingStatus.CONFIRMED
-    booking.save()
+    with transaction.atomic():
+        booking.status = BookingStatus.CONFIRMED
+        booking.save()
 
-    # Send approval email to user
-    send_booking_approved_email(booking)
+        # Queue approval email to user
+        send_booking_approved_email(booking)
+
+        conflicts = booking_actions.reject_conflicting_bookings([booking])
 
     messages.success(
         request,
         constants.MSG_BOOKING_APPROVED.format(
             booking_id=booking.id))
+    if conflicts:
+        messages.info(
+            request, constants.MSG_BOOKING_CONFLICTS_REJECTED.format(count=len(conflicts)))
     return redirect('user_booking_list')
 
 
@@ -1171,11 +1331,12 @@ def admin_booking_reject(request, booking_id):
     # Get rejection reason from POST if available
     reason = request.POST.get('reason', '') if request.method == 'POST' else ''
 
-    booking.status = BookingStatus.REJECTED
-    booking.save()
+    with transaction.atomic():
+        booking.status = BookingStatus.REJECTED
+        booking.save()
 
-    # Send rejection email to user
-    send_booking_rejection_email(booking, reason=reason)
+        # Queue rejection email to user
+        send_booking_rejection_email(booking, reason=reason)
 
     messages.warning(
         request,
@@ -1184,77 +1345,194 @@ def admin_booking_reject(request, booking_id):
     return redirect('user_booking_list')
 
 
+def _slots_version(request, pitch_id):
+    """
+    (booking_date, etag, last_modified) của AJAX khung giờ, None nếu ngày
+    không hợp lệ / ngoài cửa sổ đặt sân. Sân không tồn tại -> 404 trước khi
+    tạo key version trong cache.
+    """
+    if not hasattr(request, '_slots_version'):
+        try:
+            booking_date = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            booking_date = None
+        if booking_date is None or not in_booking_window(booking_date):
+            request._slots_version = None
+        elif not pitch_exists(pitch_id):
+            raise Http404
+        else:
+            request._slots_version = (booking_date, *slots_version(pitch_id, booking_date))
+    return request._slots_version
+
+
+def _slots_etag(request, pitch_id):
+    version = _slots_version(request, pitch_id)
+    return version[1] if version else None
+
+
+def _slots_last_modified(request, pitch_id):
+    version = _slots_version(request, pitch_id)
+    return datetime.fromtimestamp(version[2], tz=dt_timezone.utc) if version else None
+
+
+@replica_reads
+@cache_control(no_cache=True)
+@condition(etag_func=_slots_etag, last_modified_func=_slots_last_modified)
 def get_available_time_slots_ajax(request, pitch_id):
-    """AJAX: Lấy available time slots cho ngày cụ thể"""
-    pitch = get_object_or_404(Pitch, id=pitch_id)
+    """
+    AJAX: Lấy available time slots cho ngày cụ thể
+
+    Kết quả cache theo version (sân, ngày) (main/availability.py), client
+    poll lại với If-None-Match nhận 304 mà không tốn query nào.
+    """
     date_str = request.GET.get('date')
 
     if not date_str:
         return JsonResponse({'error': 'Missing date parameter'}, status=400)
 
-    try:
-        booking_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    except ValueError:
-        return JsonResponse({'error': 'Invalid date format'}, status=400)
+    version = _slots_version(request, pitch_id)
+    if version is None:
+        return JsonResponse({'error': 'Invalid or out-of-range date'}, status=400)
+    booking_date, etag, _ = version
 
-    all_time_slots = PitchTimeSlot.objects.filter(
-        pitch=pitch,
-        is_available=True
-    ).select_related('time_slot').order_by('time_slot__start_time')
+    data = get_cached_slots(pitch_id, booking_date, etag)
+    if data is not None:
+        return JsonResponse(data)
+
+    pitch = get_object_or_404(Pitch, id=pitch_id)
+    data = build_slots_data(pitch, booking_date)
+    set_cached_slots(pitch_id, booking_date, etag, data)
+    return JsonResponse(data)
+
+
+def slot_events_stream(request, pitch_id):
+    """
+    SSE khung giờ khi không chạy ASGI (runserver / WSGI).
+
+    Dưới ASGI URL này do slot_events.route() phục vụ trực tiếp. Ở đây không
+    giữ kết nối (mỗi client sẽ chiếm một thread / worker): trả trạng thái
+    hiện tại rồi đóng, EventSource tự kết nối lại sau
+    SLOT_EVENTS_FALLBACK_RETRY_MS, tức là poll.
+    """
+    booking_date = slot_events.parse_date(request.GET.get('date'))
+    if booking_date is None:
+        return JsonResponse({'error': 'Invalid or out-of-range date'}, status=400)
+    get_object_or_404(Pitch, id=pitch_id)
+    return StreamingHttpResponse(
+        slot_events.snapshot(pitch_id, booking_date, request.headers.get('Last-Event-ID')),
+        content_type=slot_events.CONTENT_TYPE,
+        headers=slot_events.HEADERS,
+    )
+
+
+@replica_reads
+def get_pitch_reviews_ajax(request, pitch_id):
+    """AJAX: trang review tiếp theo (kèm bình luận) theo cursor"""
+    pitch = get_object_or_404(Pitch, id=pitch_id)
+    page = review_page(pitch, request.GET.get('cursor'))
+    return JsonResponse({
+        'reviews': [serialize_review(review) for review in page],
+        'next_cursor': page.next_cursor,
+    })
 
-    slots_data = []
-    for pts in all_time_slots:
-        slots_data.append({
+
+def _build_availability_calendar(pitch_time_slots):
+    """
+    Dựng payload lịch trống cho cả cửa sổ đặt sân
+    (MIN_BOOKING_ADVANCE_DAYS → MAX_BOOKING_ADVANCE_DAYS).
+
+    Mỗi sân trả về danh sách slot và một mảng occupancy song song với
+    `dates`: bit thứ i của occupancy[d] = 1 nghĩa là slots[i] đã bị đặt.
+    """
+    today = date.today()
+    date_from = today + timedelta(days=constants.MIN_BOOKING_ADVANCE_DAYS)
+    date_to = today + timedelta(days=constants.MAX_BOOKING_ADVANCE_DAYS)
+    dates = [
+        date_from + timedelta(days=offset)
+        for offset in range((date_to - date_from).days + 1)
+    ]
+
+    bitmap = build_occupancy_bitmap(pitch_time_slots, date_from, date_to)
+
+    pitches = {}
+    slots_by_pitch = defaultdict(list)
+    for pts in pitch_time_slots:
+        pitches.setdefault(pts.pitch_id, pts.pitch)
+        slots_by_pitch[pts.pitch_id].append({
             'id': pts.id,
             'name': pts.time_slot.name,
             'start_time': pts.time_slot.start_time.strftime('%H:%M'),
             'end_time': pts.time_slot.end_time.strftime('%H:%M'),
-            'duration': float(pts.time_slot.duration_hours()),
-            'price': float(pts.get_price()),
-            'is_available': pts.is_available_on_date(booking_date)
         })
 
-    return JsonResponse({'date': date_str, 'slots': slots_data})
+    pitches_data = []
+    for pitch_id, pitch in pitches.items():
+        masks = bitmap.get(pitch_id, {})
+        pitches_data.append({
+            'id': pitch_id,
+            'name': pitch.name,
+            'slots': slots_by_pitch[pitch_id],
+            'occupancy': [masks.get(day, 0) for day in dates],
+        })
 
+    return {
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'dates': [day.isoformat() for day in dates],
+        'pitches': pitches_data,
+    }
 
-def check_voucher_ajax(request):
-    """AJAX: Kiểm tra mã giảm giá"""
-    code = request.GET.get('code', '')
 
-    if not code:
-        return JsonResponse(
-            {'valid': False, 'message': 'Vui lòng nhập mã giảm giá'})
+def get_pitch_calendar_ajax(request, pitch_id):
+    """AJAX: Lịch trống của một sân cho toàn bộ cửa sổ đặt sân"""
+    pitch = get_object_or_404(Pitch, id=pitch_id)
 
-    is_valid_format, error_message = validate_voucher_code(code)
+    pitch_time_slots = refdata.with_time_slots(PitchTimeSlot.objects.filter(
+        pitch=pitch,
+        is_available=True
+    ).select_related('pitch'))
 
-    if not is_valid_format:
-        return JsonResponse({'valid': False, 'message': error_message})
+    return JsonResponse(_build_availability_calendar(pitch_time_slots))
 
-    code_clean = code.strip().upper()
 
-    try:
-        voucher = Voucher.objects.get(code=code_clean)
-        if voucher.is_valid():
-            if request.user.is_authenticated:
-                has_used = Booking.objects.filter(
-                    user=request.user,
-                    voucher=voucher
-                ).exclude(status=BookingStatus.REJECTED).exists()
-                if has_used:
-                    return JsonResponse(
-                        {'valid': False, 'message': 'Bạn đã sử dụng voucher này rồi.'})
-            return JsonResponse({
-                'valid': True,
-                'message': f'Mã giảm {voucher.discount_percent}% có hiệu lực!',
-                'discount_percent': voucher.discount_percent,
-                'min_order_value': float(voucher.min_order_value) if voucher.min_order_value else None,
-            })
-        else:
-            return JsonResponse(
-                {'valid': False, 'message': 'Mã giảm giá đã hết hạn'})
-    except Voucher.DoesNotExist:
+def get_facility_calendar_ajax(request, facility_id):
+    """AJAX: Lịch trống của tất cả sân thuộc một cơ sở"""
+    facility = get_object_or_404(Facility, id=facility_id)
+
+    pitch_time_slots = refdata.with_time_slots(
+        PitchTimeSlot.objects.filter(
+            pitch__facility=facility,
+            pitch__is_available=True,
+            is_available=True
+        ).select_related('pitch'),
+        key=lambda pts: (pts.pitch.name, pts.pitch_id, pts.time_slot.start_time))
+
+    data = _build_availability_calendar(pitch_time_slots)
+    data['facility'] = {'id': facility.id, 'name': facility.name}
+    return JsonResponse(data)
+
+
+def _voucher_response(result):
+    """JsonResponse của AJAX voucher từ VoucherCheck (dùng chung với bản async)"""
+    if result is None:
         return JsonResponse(
-            {'valid': False, 'message': 'Mã giảm giá không tồn tại'})
+            {'valid': False, 'message': 'Vui lòng nhập mã giảm giá'})
+    if not result.is_valid:
+        return JsonResponse({'valid': False, 'message': result.message})
+
+    voucher = result.voucher
+    return JsonResponse({
+        'valid': True,
+        'message': f'Mã giảm {voucher.discount_percent}% có hiệu lực!',
+        'discount_percent': voucher.discount_percent,
+        'min_order_value': float(voucher.min_order_value) if voucher.min_order_value else None,
+    })
+
+
+def check_voucher_ajax(request):
+    """AJAX: Kiểm tra mã giảm giá"""
+    code = request.GET.get('code', '')
+    return _voucher_response(check_voucher(code, request.user) if code else None)
 
 
 @user_or_admin_required
@@ -1318,25 +1596,25 @@ def book_pitch(request, pitch_id):
     if selected_date:
         try:
             booking_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            all_pitch_time_slots = PitchTimeSlot.objects.filter(
+            all_pitch_time_slots = refdata.with_time_slots(PitchTimeSlot.objects.filter(
                 pitch=pitch,
                 is_available=True
-            ).select_related('time_slot')
+            ))
 
-            if all_pitch_time_slots.count() == 0:
+            availability = get_slot_availability(
+                pitch, booking_date, all_pitch_time_slots)
+
+            if not availability:
                 logger.warning(
                     f"No PitchTimeSlots available for pitch {pitch.id}")
 
-            for pitch_time_slot in all_pitch_time_slots:
-                is_available = pitch_time_slot.is_available_on_date(
-                    booking_date)
-
+            for pitch_time_slot, is_available in availability.items():
                 if is_available:
                     price = pitch_time_slot.get_price()
                     slot_data = {
                         'id': pitch_time_slot.id,
                         'time_slot': pitch_time_slot.time_slot,
-                        'duration_hours': pitch_time_slot.time_slot.duration_hours(),
+                        'duration_hours': pitch_time_slot.time_slot.duration_hours,
                         'price': price}
                     available_time_slots.append(slot_data)
                     time_slot_choices.append((pitch_time_slot.id, slot_data))
@@ -1350,35 +1628,14 @@ def book_pitch(request, pitch_id):
     voucher_message = ''
     voucher_message_type = 'text-muted'
     if voucher_code:
-        is_valid_format, error_message = validate_voucher_code(voucher_code)
-
-        if not is_valid_format:
-            voucher_message = error_message
-            voucher_message_type = 'text-danger'
+        result = check_voucher(voucher_code, request.user)
+        if result.is_valid:
+            applied_discount_percent = result.discount_percent
+            voucher_message = f'Mã giảm giá {applied_discount_percent}% có hiệu lực'
+            voucher_message_type = 'text-success'
         else:
-            voucher_code_clean = voucher_code.strip().upper()
-
-            try:
-                voucher = Voucher.objects.get(code=voucher_code_clean)
-                if voucher.is_valid():
-                    already_used = Booking.objects.filter(
-                        user=request.user,
-                        voucher=voucher
-                    ).exclude(status=BookingStatus.REJECTED).exists()
-
-                    if already_used:
-                        voucher_message = 'Bạn đã sử dụng voucher này rồi. Mỗi người chỉ dùng 1 lần.'
-                        voucher_message_type = 'text-danger'
-                    else:
-                        applied_discount_percent = voucher.discount_percent
-                        voucher_message = f'Mã giảm giá {voucher.discount_percent}% có hiệu lực'
-                        voucher_message_type = 'text-success'
-                else:
-                    voucher_message = 'Mã giảm giá không hợp lệ hoặc đã hết hạn'
-                    voucher_message_type = 'text-danger'
-            except Voucher.DoesNotExist:
-                voucher_message = 'Mã giảm giá không tồn tại'
-                voucher_message_type = 'text-danger'
+            voucher_message = result.message
+            voucher_message_type = 'text-danger'
 
     if applied_discount_percent and available_time_slots:
         for slot in available_time_slots:
@@ -1419,34 +1676,12 @@ def book_pitch(request, pitch_id):
                 )
 
                 if voucher_code:
-                    is_valid_format, error_message = validate_voucher_code(
-                        voucher_code)
-
-                    if is_valid_format:
-                        voucher_code_clean = voucher_code.strip().upper()
-                        try:
-                            voucher = Voucher.objects.get(
-                                code=voucher_code_clean)
-                            if voucher.is_valid():
-                                already_used = Booking.objects.filter(
-                                    user=request.user,
-                                    voucher=voucher
-                                ).exclude(status=BookingStatus.REJECTED).exists()
-                                if already_used:
-                                    messages.warning(
-                                        request,
-                                        "Bạn đã sử dụng voucher này trước đó. Mỗi người chỉ dùng 1 lần.")
-                                else:
-                                    booking.voucher = voucher
-                            else:
-                                messages.warning(
-                                    request, 'Mã giảm giá không hợp lệ, đặt sân không áp dụng giảm giá.')
-                        except Voucher.DoesNotExist:
-                            messages.warning(
-                                request, 'Mã giảm giá không tồn tại, đặt sân không áp dụng giảm giá.')
+                    result = check_voucher(voucher_code, request.user)
+                    if result.is_valid:
+                        booking.voucher = result.voucher
                     else:
                         messages.warning(
-                            request, f'{error_message}, đặt sân không áp dụng giảm giá.')
+                            request, f'{result.message.rstrip(".")}, đặt sân không áp dụng giảm giá.')
 
                 booking.save()
                 messages.success(
@@ -1455,6 +1690,11 @@ def book_pitch(request, pitch_id):
                     f"Booking created: #{booking.id} by user {request.user.username}")
                 return redirect('pitch_list')
 
+            except ValidationError as e:
+                # Slot vừa bị người khác đặt hoặc voucher vừa hết lượt
+                for error_messages in e.message_dict.values():
+                    for error_message in error_messages:
+                        messages.error(request, error_message)
             except (PitchTimeSlot.DoesNotExist, ValueError) as e:
                 logger.error(f"Error creating booking", exc_info=True)
                 messages.error(
@@ -0,0 +1,129 @@
+"""
+Kiểm tra voucher cho một user: dùng chung cho check_voucher_ajax, trang
+đặt sân (user_booking_create, book_pitch) và lúc tạo booking.
+
+Một query duy nhất: Voucher theo code kèm cột Exists "user đã dùng voucher
+này chưa" (không tính đơn bị từ chối). Code không tồn tại được nhớ trong
+cache một lúc (VOUCHER_MISSING_CACHE_SECONDS) nên gõ/dò mã liên tục không
+chạm DB; tạo voucher mới xoá key đó (signal).
+"""
+import re
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Value
+
+from . import constants
+from .models import Booking, BookingStatus, Voucher
+
+VALID = 'valid'
+INVALID_FORMAT = 'invalid_format'
+NOT_FOUND = 'not_found'
+EXPIRED = 'expired'
+ALREADY_USED = 'already_used'
+
+MESSAGES = {
+    NOT_FOUND: constants.ERR_VOUCHER_NOT_FOUND,
+    EXPIRED: constants.ERR_VOUCHER_INVALID,
+    ALREADY_USED: constants.ERR_VOUCHER_ALREADY_USED,
+}
+
+
+class VoucherCheck:
+    def __init__(self, status, voucher=None, message=''):
+        self.status = status
+        self.voucher = voucher
+        self.message = message or MESSAGES.get(status, '')
+
+    @property
+    def is_valid(self):
+        return self.status == VALID
+
+    @property
+    def discount_percent(self):
+        return self.voucher.discount_percent if self.is_valid else None
+
+
+def validate_voucher_code(code):
+    """
+    Validate voucher code format
+    Returns: (is_valid, error_message)
+    """
+    if not code:
+        return False, "Mã giảm giá không được để trống"
+
+    code = code.strip()
+    if len(code) > constants.VOUCHER_CODE_MAX_LENGTH:
+        return False, f"Mã giảm giá không được vượt quá {constants.VOUCHER_CODE_MAX_LENGTH} ký tự"
+    if not re.match(constants.VOUCHER_CODE_PATTERN, code):
+        return False, "Mã giảm giá chỉ được chứa chữ cái, số, dấu gạch ngang và gạch dưới"
+    return True, ""
+
+
+def _missing_key(code):
+    return f'{constants.VOUCHER_MISSING_CACHE_PREFIX}:{code}'
+
+
+def forget_missing(code):
+    """Gọi khi voucher được tạo / đổi code"""
+    cache.delete(_missing_key(code.strip().upper()))
+
+
+def _voucher_query(code, user):
+    if user is not None and user.is_authenticated:
+        already_used = Exists(
+            Booking.objects.filter(user=user, voucher=OuterRef('pk'))
+            .exclude(status=BookingStatus.REJECTED))
+    else:
+        already_used = Value(False)
+    return Voucher.objects.annotate(already_used=already_used).filter(code=code)
+
+
+def _result(voucher):
+    if not voucher.is_valid():
+        return VoucherCheck(EXPIRED, voucher)
+    if voucher.already_used:
+        return VoucherCheck(ALREADY_USED, voucher)
+    return VoucherCheck(VALID, voucher)
+
+
+def check_voucher(code, user=None):
+    """
+    Voucher có dùng được cho user không.
+
+    Args:
+        code: mã người dùng nhập (chưa chuẩn hoá)
+        user: None / AnonymousUser thì bỏ qua kiểm tra đã dùng
+
+    Returns:
+        VoucherCheck
+    """
+    is_valid_format, error_message = validate_voucher_code(code)
+    if not is_valid_format:
+        return VoucherCheck(INVALID_FORMAT, message=error_message)
+
+    code = code.strip().upper()
+    if cache.get(_missing_key(code)):
+        return VoucherCheck(NOT_FOUND)
+
+    voucher = _voucher_query(code, user).first()
+    if voucher is None:
+        cache.set(_missing_key(code), True, timeout=constants.VOUCHER_MISSING_CACHE_SECONDS)
+        return VoucherCheck(NOT_FOUND)
+    return _result(voucher)
+
+
+async def acheck_voucher(code, user=None):
+    """Bản async của check_voucher (user đã resolve, vd. await request.auser())"""
+    is_valid_format, error_message = validate_voucher_code(code)
+    if not is_valid_format:
+        return VoucherCheck(INVALID_FORMAT, message=error_message)
+
+    code = code.strip().upper()
+    if await cache.aget(_missing_key(code)):
+        return VoucherCheck(NOT_FOUND)
+
+    voucher = await _voucher_query(code, user).afirst()
+    if voucher is None:
+        await cache.aset(_missing_key(code), True, timeout=constants.VOUCHER_MISSING_CACHE_SECONDS)
+        return VoucherCheck(NOT_FOUND)
+    return _result(voucher)